@@ -1,6 +1,12 @@
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
 
+# Histogramas e box plots resumidos no servidor (ver services/resumos.py) e mapas agregados
+# em grade (services/espacial.py)
+import espacial
+import resumos
+
 PALETA_PICMONEY = {
     "primaria": "#04237D",
     "secundaria": "#44A427",
@@ -22,13 +28,92 @@ SEQUENCIA_PICMONEY = [
     PALETA_PICMONEY["terciaria"]
 ]
 
+# Colunas usadas por cada gráfico: as visões filtradas (filtros.Visao) são materializadas só
+# com essas colunas (ver figuras.exibir)
+COLUNAS_GRAFICOS = {
+    "grafico_usuarios_por_idade": ["idade"],
+    "grafico_usuarios_por_genero": ["sexo"],
+    "grafico_distribuicao_por_horario": ["hora"],
+    "grafico_usuarios_por_modelo": ["modelo_celular"],
+    "grafico_tipo_celular": ["tipo_celular"],
+    "grafico_usuarios_com_app": ["possui_app_picmoney"],
+    "grafico_tipo_celular_por_idade": ["idade", "tipo_celular"],
+    "grafico_modelo_vs_engajamento": ["modelo_celular", "ultimo_valor_capturado"],
+    "grafico_distribuicao_local": ["latitude", "longitude", "local"],
+    "grafico_mapa_clusters": ["latitude", "longitude", "local"],
+    "grafico_locais_frequentes": ["local"],
+    "grafico_heatmap_localizacao": ["latitude", "longitude"],
+    "grafico_horario_por_local": ["hora", "local"],
+    "grafico_valor_capturado_por_idade": ["idade", "ultimo_valor_capturado"],
+    "grafico_valor_por_tipo_cupom": ["ultimo_tipo_cupom", "ultimo_valor_capturado"],
+    "grafico_ticket_medio_por_faixa_etaria": ["faixa_etaria", "ultimo_valor_capturado"],
+    "grafico_categorias_frequentes": ["categoria_frequentada"],
+    "grafico_campanhas_por_cidade": ["nome_campanha", "cidade_residencial"],
+    "mapa_calor_por_categoria": ["latitude", "longitude", "ultimo_tipo_loja"],
+    "grafico_cupom_x_loja": ["ultimo_tipo_cupom", "ultimo_tipo_loja"],
+}
+
+# Contagem por valor sem as categorias vazias (colunas categóricas listam todas no value_counts)
+def _contar(serie):
+    contagem = serie.value_counts()
+    return contagem[contagem > 0]
+
+# Box plot a partir dos resumos por grupo (resumos.caixas): o navegador recebe só quartis,
+# bigodes e uma amostra dos pontos atípicos, não todos os valores. Com uma cor, todos os
+# grupos vão em um único trace; com várias, um trace por grupo (como o px.box com color).
+def _grafico_caixas(resumo, coluna, title, cores):
+    fig = go.Figure()
+    partes = [(None, resumo)] if len(cores) == 1 else [
+        (str(nome), resumo.iloc[[i]]) for i, nome in enumerate(resumo[coluna])
+    ]
+    for i, (nome, parte) in enumerate(partes):
+        cor = cores[i % len(cores)]
+        fig.add_trace(go.Box(
+            x=parte[coluna], q1=parte["q1"], median=parte["mediana"], q3=parte["q3"],
+            lowerfence=parte["inferior"], upperfence=parte["superior"],
+            name=nome, legendgroup=nome, marker_color=cor
+        ))
+        atipicos = parte["atipicos"]
+        if atipicos.map(len).sum():
+            fig.add_trace(go.Scatter(
+                x=parte[coluna].repeat(atipicos.map(len)), y=pd.Series(atipicos.explode(), dtype=float),
+                mode="markers", name=nome, legendgroup=nome, showlegend=False, marker_color=cor
+            ))
+    fig.update_layout(title=title)
+    return fig
+
+# Mapas: até espacial.LIMITE_PONTOS os pontos vão individualmente (o scattermapbox é desenhado
+# em WebGL); acima disso, um marcador por célula da grade, com tamanho proporcional à contagem
+# e a composição por local no hover.
+ZOOM_MAPAS = 14.4
+
+def _mapa_agrupado(df, title, color_discrete_sequence=None):
+    categoria = "local" if "local" in df.columns else None
+    grade = espacial.agrupar_em_grade(df, ZOOM_MAPAS, categoria)
+    return px.scatter_mapbox(
+        grade,
+        lat="latitude",
+        lon="longitude",
+        size="contagem",
+        size_max=30,
+        color=categoria,
+        hover_name=categoria,
+        hover_data={"contagem": True, "composicao": True} if categoria else {"contagem": True},
+        labels={"contagem": "Pontos", "composicao": "Composição"},
+        zoom=ZOOM_MAPAS,
+        title=title,
+        color_discrete_sequence=color_discrete_sequence
+    )
+
 #=========================PRIMEIRA ABA CEO=========================#
 # Distribuição por idade
 def grafico_usuarios_por_idade(df):
-    fig = px.histogram(
-        df,
-        x="idade",
-        nbins=10,
+    fig = px.bar(
+        resumos.histograma(df, "idade", nbins=10),
+        x="centro",
+        y="contagem",
+        hover_data={"faixa": True, "centro": False},
+        labels={"faixa": "Faixa", "contagem": "Usuários"},
         title="Distribuição de Idade dos Usuários",
         color_discrete_sequence=[PALETA_PICMONEY["secundaria"]]
     )
@@ -69,24 +154,21 @@ def grafico_usuarios_por_genero(df):
 
 # Distribuição por horário
 def grafico_distribuicao_por_horario(df):
-    # Tenta converter para datetime, extrai a hora e remove NaNs
-    df_temp = df.copy()
-    
-    # Tenta converter com formato HH:MM:SS, se falhar, tenta sem formato
-    try:
-        df_temp["horario"] = pd.to_datetime(df_temp["horario"], format="%H:%M:%S", errors="coerce").dt.hour
-    except:
-        df_temp["horario"] = pd.to_datetime(df_temp["horario"], errors="coerce").dt.hour
-        
-    df_temp.dropna(subset=["horario"], inplace=True)
+    # Usa a hora já extraída no carregamento (coluna 'hora') e remove NaNs
+    if "hora" not in df.columns:
+        return px.bar(title="Coluna 'hora' não encontrada.")
+
+    df_temp = df.dropna(subset=["hora"])
     
     if df_temp.empty:
         return px.bar(title="Dados de horário insuficientes para o gráfico.")
 
-    fig = px.histogram(
-        df_temp,
-        x="horario",
-        nbins=24,
+    fig = px.bar(
+        resumos.histograma(df_temp, "hora", nbins=24),
+        x="centro",
+        y="contagem",
+        hover_data={"faixa": True, "centro": False},
+        labels={"faixa": "Faixa", "contagem": "Usuários"},
         title="Distribuição de Horários de Uso",
         color_discrete_sequence=[PALETA_PICMONEY["secundaria"]]
     )
@@ -114,7 +196,7 @@ def grafico_distribuicao_por_horario(df):
 
 # Modelos de celular
 def grafico_usuarios_por_modelo(df):
-    dados = df["modelo_celular"].value_counts().reset_index()
+    dados = _contar(df["modelo_celular"]).reset_index()
     dados.columns = ["modelo_celular", "quantidade"]
 
     fig = px.bar(
@@ -166,7 +248,7 @@ def grafico_usuarios_com_app(df):
     if "possui_app_picmoney" not in df.columns:
         return px.bar(title="Coluna 'possui_app_picmoney' não encontrada.")
 
-    dados = df["possui_app_picmoney"].value_counts().reset_index()
+    dados = _contar(df["possui_app_picmoney"]).reset_index()
     dados.columns = ["Possui App", "Quantidade"]
 
     fig = px.pie(
@@ -188,10 +270,13 @@ def grafico_usuarios_com_app(df):
 
 def grafico_tipo_celular_por_idade(df):
     if {"idade", "tipo_celular"}.issubset(df.columns):
-        fig = px.histogram(
-            df,
-            x="idade",
+        fig = px.bar(
+            resumos.histograma(df, "idade", cor="tipo_celular"),
+            x="centro",
+            y="contagem",
             color="tipo_celular",
+            hover_data={"faixa": True, "centro": False},
+            labels={"faixa": "Faixa", "contagem": "Usuários", "tipo_celular": "Tipo de Celular"},
             barmode="stack",
             title="Distribuição do Tipo de Celular por Idade",
             color_discrete_sequence=[
@@ -213,13 +298,11 @@ def grafico_tipo_celular_por_idade(df):
 # Modelo de celular vs engajamento (valor capturado)
 def grafico_modelo_vs_engajamento(df):
     if {"modelo_celular", "ultimo_valor_capturado"}.issubset(df.columns):
-        fig = px.box(
-            df,
-            x="modelo_celular",
-            y="ultimo_valor_capturado",
+        fig = _grafico_caixas(
+            resumos.caixas(df, "modelo_celular", "ultimo_valor_capturado"),
+            "modelo_celular",
             title="Engajamento por Modelo de Celular (Valor Capturado)",
-            color="modelo_celular",
-            color_discrete_sequence=px.colors.qualitative.Vivid
+            cores=px.colors.qualitative.Vivid
         )
 
         fig.update_layout(
@@ -241,16 +324,23 @@ def grafico_modelo_vs_engajamento(df):
 # Localização (simplificado)
 def grafico_distribuicao_local(df_mapa):
     if {"latitude", "longitude"}.issubset(df_mapa.columns):
-        fig = px.scatter_mapbox(
-            df_mapa,
-            lat="latitude",
-            lon="longitude",
-            color="local",
-            hover_name="local",
-            zoom=14.4,
-            title="Distribuição Geográfica dos Usuários e Capturas",
-            color_discrete_sequence=["#23EB05", "#0000FF"]
-        )
+        if len(df_mapa) > espacial.LIMITE_PONTOS:
+            fig = _mapa_agrupado(
+                df_mapa,
+                title="Distribuição Geográfica dos Usuários e Capturas",
+                color_discrete_sequence=["#23EB05", "#0000FF"]
+            )
+        else:
+            fig = px.scatter_mapbox(
+                df_mapa,
+                lat="latitude",
+                lon="longitude",
+                color="local",
+                hover_name="local",
+                zoom=ZOOM_MAPAS,
+                title="Distribuição Geográfica dos Usuários e Capturas",
+                color_discrete_sequence=["#23EB05", "#0000FF"]
+            )
 
         fig.update_layout(
             mapbox_style="carto-darkmatter",
@@ -268,7 +358,7 @@ def grafico_locais_frequentes(df):
     if "local" not in df.columns:
         return px.bar(title="A coluna 'local' não foi encontrada.")
 
-    locais = df["local"].value_counts().reset_index()
+    locais = _contar(df["local"]).reset_index()
     locais.columns = ["Local", "Frequência"]
 
     fig = px.bar(
@@ -298,26 +388,44 @@ def grafico_locais_frequentes(df):
 
     return fig
 
+# Mapas de calor a partir do raster (espacial.raster): o density_mapbox usa como peso de cada
+# célula (z - zmin) / (zmax - zmin), limitado a [0, 1]. Com a faixa fixa (0, PONTOS_PESO_MAXIMO)
+# cada ponto pesa 1 / PONTOS_PESO_MAXIMO, qualquer que seja o filtro, e a escala de cores é
+# comprimida pelo mesmo fator: o desenho é o de um ponto por linha (peso 1) e só células com
+# mais de PONTOS_PESO_MAXIMO pontos saturam o peso. A barra de cores fica oculta, já que mostraria
+# a escala comprimida.
+PONTOS_PESO_MAXIMO = 8
+
+def _escala_densidade(escala, pontos=PONTOS_PESO_MAXIMO):
+    escala = px.colors.get_colorscale(escala) if isinstance(escala, str) else escala
+    return [[posicao / pontos, cor] for posicao, cor in escala] + [[1.0, escala[-1][1]]]
+
 # Heatmap de densidade geográfica
 def grafico_heatmap_localizacao(df):
     if {"latitude", "longitude"}.issubset(df.columns):
+        # Raster no servidor: uma célula ponderada pela contagem em vez de um ponto por linha
+        grade = espacial.raster(df, zoom=11)
+        if grade.empty:
+            return px.bar(title="Nenhuma coordenada encontrada.")
+
         fig = px.density_mapbox(
-            df,
+            grade,
             lat="latitude",
             lon="longitude",
+            z="contagem",
             radius=25,  # tamanho do raio da "mancha" de calor
-            center=dict(lat=df["latitude"].mean(), lon=df["longitude"].mean()),
+            center=espacial.centro(grade),
             zoom=11,
             mapbox_style="carto-darkmatter",
             title="Heatmap de Concentração Geográfica",
-            color_continuous_scale=picmoney_scale
+            range_color=(0, PONTOS_PESO_MAXIMO),
+            color_continuous_scale=_escala_densidade(picmoney_scale)
         )
 
         fig.update_layout(
             template="plotly_dark",
             height=750,
-            color_continuous_scale=picmoney_scale
-
+            coloraxis_showscale=False
         )
         return fig
     else:
@@ -326,30 +434,21 @@ def grafico_heatmap_localizacao(df):
 
 # Horário x Local (Heatmap)
 def grafico_horario_por_local(df):
-    if not {"horario", "local"}.issubset(df.columns):
-        return px.bar(title="Colunas necessárias ('horario', 'local') não encontradas.")
+    if not {"hora", "local"}.issubset(df.columns):
+        return px.bar(title="Colunas necessárias ('hora', 'local') não encontradas.")
 
-    # Conversão do horário para hora (0–23)
-    df_temp = df.copy()
-    
-    # Tenta converter com formato HH:MM:SS, se falhar, tenta sem formato
-    try:
-        df_temp["horario"] = pd.to_datetime(df_temp["horario"], format="%H:%M:%S", errors="coerce").dt.hour
-    except:
-        df_temp["horario"] = pd.to_datetime(df_temp["horario"], errors="coerce").dt.hour
-        
-    # Remove linhas onde a conversão falhou (NaN)
-    df_temp.dropna(subset=["horario", "local"], inplace=True)
+    # Remove linhas sem hora (horário inválido) ou sem local
+    df_temp = df.dropna(subset=["hora", "local"])
     
     if df_temp.empty:
         return px.bar(title="Dados insuficientes para o gráfico de Horário por Local.")
 
     # Agrupar
-    matriz = df_temp.groupby(["local", "horario"]).size().reset_index(name="contagem")
+    matriz = df_temp.groupby(["local", "hora"], observed=True).size().reset_index(name="contagem")
 
     fig = px.density_heatmap(
         matriz,
-        x="horario",
+        x="hora",
         y="local",
         z="contagem",
         color_continuous_scale="Viridis",
@@ -370,17 +469,21 @@ def grafico_mapa_clusters(df):
     if not {"latitude", "longitude"}.issubset(df.columns):
         return px.scatter_mapbox(title="Coordenadas não encontradas.")
 
-    fig = px.scatter_mapbox(
-        df,
-        lat="latitude",
-        lon="longitude",
-        color="local" if "local" in df.columns else None,
-        hover_name="local" if "local" in df.columns else None,
-        zoom=14.4,
-        title="Mapa com Agrupamento de Pontos (Cluster)"
-    )
+    if len(df) > espacial.LIMITE_PONTOS:
+        # Agrupamento feito no servidor (grade), sem o cluster do navegador
+        fig = _mapa_agrupado(df, title="Mapa com Agrupamento de Pontos (Cluster)")
+    else:
+        fig = px.scatter_mapbox(
+            df,
+            lat="latitude",
+            lon="longitude",
+            color="local" if "local" in df.columns else None,
+            hover_name="local" if "local" in df.columns else None,
+            zoom=ZOOM_MAPAS,
+            title="Mapa com Agrupamento de Pontos (Cluster)"
+        )
 
-    fig.update_traces(cluster=dict(enabled=True))
+        fig.update_traces(cluster=dict(enabled=True))
 
     fig.update_layout(
         mapbox_style="carto-darkmatter",
@@ -396,12 +499,11 @@ def grafico_mapa_clusters(df):
 # Valor capturado por idade
 def grafico_valor_capturado_por_idade(df):
     if {"idade", "ultimo_valor_capturado"}.issubset(df.columns):
-        fig = px.box(
-            df,
-            x="idade",
-            y="ultimo_valor_capturado",
+        fig = _grafico_caixas(
+            resumos.caixas(df, "idade", "ultimo_valor_capturado"),
+            "idade",
             title="Relação entre Idade e Valor Capturado",
-            color_discrete_sequence=["#0A2E9C"]
+            cores=["#0A2E9C"]
         )
 
         fig.update_traces(
@@ -426,15 +528,12 @@ def grafico_valor_capturado_por_idade(df):
 # Valor capturado por tipo de cupom
 def grafico_valor_por_tipo_cupom(df):
     if {"ultimo_tipo_cupom", "ultimo_valor_capturado"}.issubset(df.columns):
-        dados = df.dropna(subset=["ultimo_tipo_cupom", "ultimo_valor_capturado"])
-
-        fig = px.box(
-            dados,
-            x="ultimo_tipo_cupom",
-            y="ultimo_valor_capturado",
+        # resumos.caixas já ignora tipos de cupom e valores ausentes
+        fig = _grafico_caixas(
+            resumos.caixas(df, "ultimo_tipo_cupom", "ultimo_valor_capturado"),
+            "ultimo_tipo_cupom",
             title="Valor Capturado por Tipo de Cupom",
-            color="ultimo_tipo_cupom",
-            color_discrete_sequence=px.colors.qualitative.Set2
+            cores=px.colors.qualitative.Set2
         )
 
         fig.update_layout(
@@ -449,15 +548,10 @@ def grafico_valor_por_tipo_cupom(df):
 
 # Ticket médio por faixa etária
 def grafico_ticket_medio_por_faixa_etaria(df):
-    if {"idade", "ultimo_valor_capturado"}.issubset(df.columns):
-        df = df.dropna(subset=["idade", "ultimo_valor_capturado"])
-
-        bins = [0, 20, 30, 40, 50, 60, 200]
-        labels = ["15–20", "21–30", "31–40", "41–50", "51–60", "60+"]
-
-        df["faixa_etaria"] = pd.cut(df["idade"], bins=bins, labels=labels, right=False)
+    if {"faixa_etaria", "ultimo_valor_capturado"}.issubset(df.columns):
+        df = df.dropna(subset=["faixa_etaria", "ultimo_valor_capturado"])
 
-        ticket = df.groupby("faixa_etaria")["ultimo_valor_capturado"].mean().reset_index()
+        ticket = df.groupby("faixa_etaria", observed=True)["ultimo_valor_capturado"].mean().reset_index()
         ticket.columns = ["Faixa Etária", "Ticket Médio"]
 
         fig = px.bar(
@@ -489,7 +583,7 @@ def grafico_ticket_medio_por_faixa_etaria(df):
 def grafico_categorias_frequentes(df_teste_em_massa):
     if "categoria_frequentada" in df_teste_em_massa.columns:
         # Contar as categorias mais frequentes
-        categorias = df_teste_em_massa["categoria_frequentada"].value_counts().reset_index()
+        categorias = _contar(df_teste_em_massa["categoria_frequentada"]).reset_index()
         categorias.columns = ["Categoria", "Frequência"]
 
         fig = px.bar(
@@ -524,7 +618,7 @@ def grafico_campanhas_por_cidade(df):
     if {"nome_campanha", "cidade_residencial"}.issubset(df.columns):
         dados = df.dropna(subset=["nome_campanha", "cidade_residencial"])
 
-        agrupado = dados.groupby(["cidade_residencial", "nome_campanha"]).size().reset_index(name="Quantidade")
+        agrupado = dados.groupby(["cidade_residencial", "nome_campanha"], observed=True).size().reset_index(name="Quantidade")
 
         fig = px.bar(
             agrupado,
@@ -549,23 +643,27 @@ def grafico_campanhas_por_cidade(df):
 # Mapa de calor por categoria de loja
 def mapa_calor_por_categoria(df):
     if {"latitude", "longitude", "ultimo_tipo_loja"}.issubset(df.columns):
-        df = df.dropna(subset=["latitude", "longitude", "ultimo_tipo_loja"])
+        # Raster por tipo de loja no servidor (linhas sem coordenadas ou tipo são ignoradas)
+        grade = espacial.raster(df, zoom=11, grupo="ultimo_tipo_loja")
+        if grade.empty:
+            return px.bar(title="Dados insuficientes para gerar o mapa de calor.")
 
         fig = px.density_mapbox(
-            df,
+            grade,
             lat="latitude",
             lon="longitude",
-            z=None,
+            z="contagem",
             radius=25,
-            center=dict(lat=df["latitude"].mean(), lon=df["longitude"].mean()),
+            center=espacial.centro(grade),
             zoom=11,
             mapbox_style="carto-darkmatter",
-            color_continuous_scale="Viridis",
+            range_color=(0, PONTOS_PESO_MAXIMO),
+            color_continuous_scale=_escala_densidade("Viridis"),
             title="Mapa de Calor por Categoria de Loja",
             hover_data=["ultimo_tipo_loja"]
         )
 
-        fig.update_layout(template="plotly_dark")
+        fig.update_layout(template="plotly_dark", coloraxis_showscale=False)
         return fig
 
     return px.bar(title="Dados insuficientes para gerar o mapa de calor.")
@@ -575,7 +673,7 @@ def grafico_cupom_x_loja(df):
     if {"ultimo_tipo_cupom", "ultimo_tipo_loja"}.issubset(df.columns):
         dados = df.dropna(subset=["ultimo_tipo_cupom", "ultimo_tipo_loja"])
 
-        agrupado = dados.groupby(["ultimo_tipo_cupom", "ultimo_tipo_loja"]).size().reset_index(name="Frequência")
+        agrupado = dados.groupby(["ultimo_tipo_cupom", "ultimo_tipo_loja"], observed=True).size().reset_index(name="Frequência")
 
         fig = px.treemap(
             agrupado,
@@ -3,23 +3,49 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+# Os gráficos aceitam tanto as linhas de capturas quanto o cubo diário (services/cubo.py);
+# cubo.agregar faz o groupby correspondente em cada caso.
+import cubo
+import indicadores
+import resumos
+
+# Colunas usadas pelos gráficos que recebem as linhas filtradas (filtros.Visao); as visões são
+# materializadas só com essas colunas (ver figuras.exibir)
+COLUNAS_GRAFICOS = {
+    "plot_top_categories": ["categoria_frequentada", "valor_liquido"],
+    "summarize_users": ["chave_celular", "valor_compra", "valor_cupom", "valor_liquido",
+                        "idade", "sexo", "cidade_residencial"],
+}
+COLUNAS_GRAFICOS["plot_user_age_gender_distribution"] = COLUNAS_GRAFICOS["summarize_users"]
+
 # --- Funções de Visualização ---
 
 def create_kpi_card(title, value, delta=None, help_text=None):
     """Cria um cartão KPI."""
-    # Formatação para moeda brasileira (R$ X.XXX,XX)
-    formatted_value = f"R$ {value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    
-    if delta is not None:
-        # Formatação para porcentagem
-        formatted_delta = f"{delta:,.2f}%".replace(",", "X").replace(".", ",").replace("X", ".")
-        st.metric(label=title, value=formatted_value, delta=formatted_delta, help=help_text)
-    else:
-        st.metric(label=title, value=formatted_value, help=help_text)
+    # Formatação para moeda brasileira (R$ X.XXX,XX) e porcentagem (ver indicadores.py)
+    st.metric(label=title, value=indicadores.formatar_moeda(value),
+              delta=indicadores.formatar_variacao(delta), help=help_text)
 
-def plot_time_series(df, y_col, title):
+# Séries temporais: `granularidade` ('dia', 'semana', 'mes'; ver cubo.granularidade_para) define o
+# período de cada ponto e, se ainda assim a série passar de resumos.MAX_PONTOS_SERIE pontos por
+# linha, os pontos enviados ao navegador são escolhidos por LTTB (picos e vales preservados).
+
+def _reduzir_serie(df_plot, y_col, color=None):
+    """Pontos da série mantidos pelo LTTB (uma redução por linha de `color`)."""
+    grupos = None if color is None else df_plot[color]
+    manter = resumos.mascara_lttb(df_plot['data_captura'].astype('int64'), df_plot[y_col], grupos)
+    return df_plot[manter]
+
+def _reduzir_empilhada(df_plot, y_col):
+    """Datas mantidas pelo LTTB sobre o total empilhado, as mesmas em todas as camadas."""
+    total = df_plot.groupby('data_captura', observed=True)[y_col].sum()
+    datas = total.index[resumos.lttb(total.index.astype('int64'), total.to_numpy())]
+    return df_plot[df_plot['data_captura'].isin(datas)]
+
+def plot_time_series(df, y_col, title, granularidade=None):
     """Plota série temporal de uma métrica."""
-    df_plot = df.groupby('data_captura')[y_col].sum().reset_index()
+    df = cubo.por_periodo(df, granularidade)
+    df_plot = _reduzir_serie(cubo.agregar(df, 'data_captura', y_col).reset_index(), y_col)
     fig = px.line(df_plot, x='data_captura', y=y_col, title=title,
                   labels={'data_captura': 'Data', y_col: 'Valor (R$)'},
                   template='plotly_white')
@@ -28,7 +54,7 @@ def plot_time_series(df, y_col, title):
 
 def plot_bar_chart(df, x_col, y_col, title, n_top=10):
     """Plota gráfico de barras para as top N categorias."""
-    df_plot = df.groupby(x_col)[y_col].sum().nlargest(n_top).reset_index()
+    df_plot = cubo.agregar(df, x_col, y_col).nlargest(n_top).reset_index()
     df_plot = df_plot.sort_values(y_col, ascending=True)
     
     fig = px.bar(df_plot, x=y_col, y=x_col, orientation='h', title=title,
@@ -39,23 +65,43 @@ def plot_bar_chart(df, x_col, y_col, title, n_top=10):
 
 def plot_pie_chart(df, names_col, values_col, title):
     """Plota gráfico de pizza para distribuição."""
-    df_plot = df.groupby(names_col)[values_col].sum().reset_index()
+    df_plot = cubo.agregar(df, names_col, values_col).reset_index()
     fig = px.pie(df_plot, names=names_col, values=values_col, title=title,
                  hole=.3, template='plotly_white')
     return fig
 
+def summarize_users(df):
+    """Resumo por usuário (totais, quantidade de cupons e dados demográficos) das capturas."""
+    return df.groupby('chave_celular', observed=True).agg(
+        total_compras=('valor_compra', 'sum'),
+        total_desconto=('valor_cupom', 'sum'),
+        total_liquido=('valor_liquido', 'sum'),
+        num_cupons=('chave_celular', 'size'),
+        idade=('idade', 'first'),
+        sexo=('sexo', 'first'),
+        cidade_residencial=('cidade_residencial', 'first')
+    ).reset_index()
+
 def plot_age_gender_distribution(df_user_summary):
     """Plota o histograma de distribuição de usuários por idade e sexo."""
-    fig = px.histogram(df_user_summary, x='idade', color='sexo',
-                       title='Distribuição de Usuários por Idade e Sexo',
-                       labels={'idade': 'Idade', 'count': 'Número de Usuários'},
-                       template='plotly_white',
-                       barmode='overlay')
+    # Faixas contadas no servidor: o gráfico recebe uma barra por faixa x sexo, não os usuários
+    df_plot = resumos.histograma(df_user_summary, 'idade', cor='sexo')
+    fig = px.bar(df_plot, x='centro', y='contagem', color='sexo',
+                 hover_data={'faixa': True, 'centro': False},
+                 title='Distribuição de Usuários por Idade e Sexo',
+                 labels={'centro': 'Idade', 'contagem': 'Número de Usuários', 'faixa': 'Faixa'},
+                 template='plotly_white',
+                 barmode='overlay', opacity=0.7)
+    fig.update_layout(bargap=0)
     return fig
 
+def plot_user_age_gender_distribution(df_filtered):
+    """Resume as capturas filtradas por usuário e plota a distribuição por idade e sexo."""
+    return plot_age_gender_distribution(summarize_users(df_filtered))
+
 def plot_top_categories(df_filtered):
     """Plota o gráfico de barras das Top 10 Categorias Frequentadas por Receita Líquida."""
-    df_cat = df_filtered.groupby('categoria_frequentada')['valor_liquido'].sum().nlargest(10).reset_index()
+    df_cat = df_filtered.groupby('categoria_frequentada', observed=True)['valor_liquido'].sum().nlargest(10).reset_index()
     df_cat = df_cat.sort_values('valor_liquido', ascending=True)
 
     fig = px.bar(df_cat, x='valor_liquido', y='categoria_frequentada', orientation='h',
@@ -69,7 +115,7 @@ def plot_top_categories(df_filtered):
 
 def plot_segment_metric(df, segment_col, metric_col, title, sort_ascending=True):
     """Plota gráfico de barras para uma métrica por segmento."""
-    df_plot = df.groupby(segment_col)[metric_col].mean().sort_values(ascending=sort_ascending).reset_index()
+    df_plot = cubo.agregar(df, segment_col, metric_col, 'mean').sort_values(ascending=sort_ascending).reset_index()
     
     # Formatação do eixo Y dependendo da métrica
     if metric_col == 'margem_cupom':
@@ -91,10 +137,10 @@ def plot_segment_metric(df, segment_col, metric_col, title, sort_ascending=True)
 
 def plot_segment_roi(df):
     """Plota o Retorno sobre o Investimento (ROI) por Tipo de Loja."""
-    df_roi = df.groupby('tipo_loja').agg(
-        total_liquido=('valor_liquido', 'sum'),
-        total_cupom=('valor_cupom', 'sum')
-    ).reset_index()
+    df_roi = pd.DataFrame({
+        'total_liquido': cubo.agregar(df, 'tipo_loja', 'valor_liquido'),
+        'total_cupom': cubo.agregar(df, 'tipo_loja', 'valor_cupom')
+    }).reset_index()
     
     # ROI = (Receita Líquida - Custo do Cupom) / Custo do Cupom
     # Simplificando para Receita Líquida / Custo do Cupom (para ver o retorno por R$ gasto)
@@ -107,13 +153,15 @@ def plot_segment_roi(df):
     fig.update_xaxes(tickangle=45)
     return fig
 
-def plot_segment_time_series(df, segment_col, metric_col, title):
+def plot_segment_time_series(df, segment_col, metric_col, title, granularidade=None):
     """Plota série temporal de uma métrica para os top 5 segmentos."""
     # Identificar os top 5 segmentos por valor_liquido
-    top_segments = df.groupby(segment_col)['valor_liquido'].sum().nlargest(5).index.tolist()
+    top_segments = cubo.agregar(df, segment_col, 'valor_liquido').nlargest(5).index.tolist()
     df_filtered = df[df[segment_col].isin(top_segments)]
     
-    df_plot = df_filtered.groupby(['data_captura', segment_col])[metric_col].sum().reset_index()
+    df_filtered = cubo.por_periodo(df_filtered, granularidade)
+    df_plot = cubo.agregar(df_filtered, ['data_captura', segment_col], metric_col).reset_index()
+    df_plot = _reduzir_serie(df_plot, metric_col, segment_col)
     
     fig = px.line(df_plot, x='data_captura', y=metric_col, color=segment_col, title=title,
                   labels={'data_captura': 'Data', metric_col: 'Valor (R$)', segment_col: 'Segmento'},
@@ -123,7 +171,7 @@ def plot_segment_time_series(df, segment_col, metric_col, title):
 
 def plot_concentration_analysis(df):
     """Plota a análise de concentração (Pareto) da Receita Líquida por Tipo de Loja."""
-    df_loja = df.groupby('tipo_loja')['valor_liquido'].sum().sort_values(ascending=False).reset_index()
+    df_loja = cubo.agregar(df, 'tipo_loja', 'valor_liquido').sort_values(ascending=False).reset_index()
     df_loja['receita_acumulada'] = df_loja['valor_liquido'].cumsum()
     df_loja['perc_acumulado'] = (df_loja['receita_acumulada'] / df_loja['valor_liquido'].sum()) * 100
     df_loja['perc_lojas'] = (df_loja.index + 1) / len(df_loja) * 100
@@ -162,7 +210,7 @@ def plot_concentration_analysis(df):
 
 def plot_coupon_type_heatmap(df):
     """Plota um heatmap da Receita Líquida por Tipo de Loja e Tipo de Cupom."""
-    df_pivot = df.groupby(['tipo_loja', 'tipo_cupom'])['valor_liquido'].sum().unstack(fill_value=0)
+    df_pivot = cubo.agregar(df, ['tipo_loja', 'tipo_cupom'], 'valor_liquido').unstack(fill_value=0)
     
     fig = px.imshow(df_pivot, 
                     text_auto=".2s", 
@@ -175,11 +223,11 @@ def plot_coupon_type_heatmap(df):
 
 def plot_ticket_discount_scatter(df):
     """Plota um scatter plot comparando Ticket Médio e Desconto Médio por Tipo de Loja."""
-    df_agg = df.groupby('tipo_loja').agg(
-        ticket_medio=('valor_compra', 'mean'),
-        desconto_medio=('valor_cupom', 'mean'),
-        num_cupons=('valor_cupom', 'count')
-    ).reset_index()
+    df_agg = pd.DataFrame({
+        'ticket_medio': cubo.agregar(df, 'tipo_loja', 'valor_compra', 'mean'),
+        'desconto_medio': cubo.agregar(df, 'tipo_loja', 'valor_cupom', 'mean'),
+        'num_cupons': cubo.agregar(df, 'tipo_loja', 'valor_cupom', 'count')
+    }).reset_index()
 
     fig = px.scatter(df_agg, x='ticket_medio', y='desconto_medio', 
                      size='num_cupons', color='tipo_loja',
@@ -192,9 +240,10 @@ def plot_ticket_discount_scatter(df):
 
 # --- Novas Funções de KPIs e Análise Temporal ---
 
-def plot_average_time_series(df, y_col, title):
+def plot_average_time_series(df, y_col, title, granularidade=None):
     """Plota série temporal da média de uma métrica (Ticket Médio, Desconto Médio)."""
-    df_plot = df.groupby('data_captura')[y_col].mean().reset_index()
+    df = cubo.por_periodo(df, granularidade)
+    df_plot = _reduzir_serie(cubo.agregar(df, 'data_captura', y_col, 'mean').reset_index(), y_col)
     
     # Renomear coluna para clareza no gráfico
     if y_col == 'valor_compra':
@@ -212,21 +261,19 @@ def plot_average_time_series(df, y_col, title):
 
 def plot_day_of_week_analysis(df, y_col, title):
     """Plota a distribuição de uma métrica por dia da semana."""
-    # Definir a ordem correta dos dias da semana
-    dias_ordem = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    dias_pt = ['Segunda-feira', 'Terça-feira', 'Quarta-feira', 'Quinta-feira', 'Sexta-feira', 'Sábado', 'Domingo']
-    
-    df_plot = df.groupby('dia_semana')[y_col].sum().reindex(dias_ordem).reset_index()
-    df_plot['dia_semana_pt'] = df_plot['dia_semana'].map(dict(zip(dias_ordem, dias_pt)))
+    # 'dia_semana' é categórica ordenada (segunda a domingo), então o groupby já sai na ordem correta
+    df_plot = cubo.agregar(df, 'dia_semana', y_col).reset_index()
 
-    fig = px.bar(df_plot, x='dia_semana_pt', y=y_col, title=title,
-                 labels={'dia_semana_pt': 'Dia da Semana', y_col: 'Valor (R$)'},
+    fig = px.bar(df_plot, x='dia_semana', y=y_col, title=title,
+                 labels={'dia_semana': 'Dia da Semana', y_col: 'Valor (R$)'},
                  template='plotly_white')
     return fig
 
-def plot_stacked_area_time_series(df, metric_col, title):
+def plot_stacked_area_time_series(df, metric_col, title, granularidade=None):
     """Plota série temporal de uma métrica, segmentada por tipo de cupom (Stacked Area)."""
-    df_plot = df.groupby(['data_captura', 'tipo_cupom'])[metric_col].sum().reset_index()
+    df = cubo.por_periodo(df, granularidade)
+    df_plot = cubo.agregar(df, ['data_captura', 'tipo_cupom'], metric_col).reset_index()
+    df_plot = _reduzir_empilhada(df_plot, metric_col)
     
     # Renomear coluna para clareza no gráfico
     if metric_col == 'valor_liquido':
@@ -1,6 +1,19 @@
 import plotly.express as px
 import pandas as pd
 
+import cubo
+import resumos
+
+# Colunas usadas por cada gráfico, além da coluna de agrupamento (group_col): as visões
+# filtradas (filtros.Visao) são materializadas só com essas colunas (ver figuras.exibir)
+COLUNAS_GRAFICOS = {
+    "plot_receita_por_categoria": ["valor_liquido"],
+    "plot_desconto_por_categoria": ["valor_cupom"],
+    "plot_evolucao_mensal_receita": ["mes_ano", "data_captura", "valor_liquido"],
+    "plot_margem_por_categoria": ["valor_liquido", "valor_compra"],
+    "plot_ticket_medio_por_categoria": ["valor_compra"],
+}
+
 
 # Função auxiliar para formatar valores em Reais
 def format_brl(value):
@@ -12,7 +25,7 @@ def plot_receita_por_categoria(df: pd.DataFrame, group_col: str = "nome_loja"):
     """Cria um gráfico de barras da Receita Líquida por Loja ou Categoria."""
 
     # Agrupa e soma a receita líquida
-    df_grouped = df.groupby(group_col)["valor_liquido"].sum().reset_index()
+    df_grouped = df.groupby(group_col, observed=True)["valor_liquido"].sum().reset_index()
     df_grouped = df_grouped.sort_values("valor_liquido", ascending=False).head(10)
 
     # Cria o gráfico
@@ -45,7 +58,7 @@ def plot_desconto_por_categoria(df: pd.DataFrame, group_col: str = "nome_loja"):
     """Cria um gráfico de pizza da distribuição do Desconto Concedido por Loja ou Categoria."""
 
     # Agrupa e soma o desconto
-    df_grouped = df.groupby(group_col)["valor_cupom"].sum().reset_index()
+    df_grouped = df.groupby(group_col, observed=True)["valor_cupom"].sum().reset_index()
     df_grouped = df_grouped.sort_values("valor_cupom", ascending=False).head(10)
 
     # Cria o gráfico de pizza
@@ -64,22 +77,48 @@ def plot_desconto_por_categoria(df: pd.DataFrame, group_col: str = "nome_loja"):
     return fig
 
 
-# 3. Gráfico de Evolução Mensal da Receita
-def plot_evolucao_mensal_receita(df: pd.DataFrame):
-    """Cria um gráfico de linha da evolução mensal da Receita Líquida."""
+# Título e rótulo do eixo X de cada granularidade da evolução da receita
+TITULOS_EVOLUCAO = {
+    "dia": ("Evolução Diária da Receita Líquida", "Data"),
+    "semana": ("Evolução Semanal da Receita Líquida", "Semana"),
+    "mes": ("Evolução Mensal da Receita Líquida", "Mês/Ano"),
+}
+
+
+# 3. Gráfico de Evolução da Receita (mensal, semanal ou diária)
+def plot_evolucao_mensal_receita(df: pd.DataFrame, granularidade: str = None):
+    """Cria um gráfico de linha da evolução da Receita Líquida.
+
+    Sem `granularidade`, ela é escolhida pelo período dos dados (cubo.granularidade_para).
+    """
 
     if "data_captura" not in df.columns:
         return px.line(title="Evolução Mensal: Coluna 'data_captura' não encontrada.")
 
-    df["mes_ano"] = df["data_captura"].dt.to_period("M").astype(str)
-    df_grouped = df.groupby("mes_ano")["valor_liquido"].sum().reset_index()
-
+    if granularidade is None:
+        granularidade = cubo.granularidade_para(df["data_captura"].min(), df["data_captura"].max())
+
+    if granularidade == "mes":
+        # 'mes_ano' é calculada no carregamento; o período vira texto só no resultado agrupado
+        meses = df["mes_ano"] if "mes_ano" in df.columns else df["data_captura"].dt.to_period("M")
+        df_grouped = df.groupby(meses, observed=True)["valor_liquido"].sum().reset_index()
+        df_grouped["mes_ano"] = df_grouped["mes_ano"].astype(str)
+        eixo_x = "mes_ano"
+    else:
+        periodos = cubo.por_periodo(df[["data_captura", "valor_liquido"]], granularidade)
+        df_grouped = periodos.groupby("data_captura")["valor_liquido"].sum().reset_index()
+        # Séries diárias longas: pontos escolhidos por LTTB (ver resumos.lttb)
+        df_grouped = df_grouped[resumos.mascara_lttb(df_grouped["data_captura"].astype("int64"),
+                                                     df_grouped["valor_liquido"])]
+        eixo_x = "data_captura"
+
+    titulo, rotulo_x = TITULOS_EVOLUCAO[granularidade]
     fig = px.line(
         df_grouped,
-        x="mes_ano",
+        x=eixo_x,
         y="valor_liquido",
-        title="Evolução Mensal da Receita Líquida",
-        labels={"valor_liquido": "Receita Líquida (R$)", "mes_ano": "Mês/Ano"},
+        title=titulo,
+        labels={"valor_liquido": "Receita Líquida (R$)", eixo_x: rotulo_x},
         markers=True,
         color_discrete_sequence=px.colors.qualitative.Bold,
     )
@@ -87,7 +126,7 @@ def plot_evolucao_mensal_receita(df: pd.DataFrame):
     fig.update_layout(
         yaxis_tickprefix="R$ ",
         yaxis_tickformat=",.0f",
-        xaxis_title="Mês/Ano",
+        xaxis_title=rotulo_x,
         hovermode="x unified",
     )
 
@@ -99,7 +138,7 @@ def plot_margem_por_categoria(df: pd.DataFrame, group_col: str = "nome_loja"):
     """Cria um gráfico de barras da Margem por Loja ou Categoria."""
 
     df_grouped = (
-        df.groupby(group_col)
+        df.groupby(group_col, observed=True)
         .agg(
             total_liquido=("valor_liquido", "sum"), total_compra=("valor_compra", "sum")
         )
@@ -135,7 +174,7 @@ def plot_margem_por_categoria(df: pd.DataFrame, group_col: str = "nome_loja"):
 def plot_ticket_medio_por_categoria(df: pd.DataFrame, group_col: str = "nome_loja"):
     """Cria um gráfico de barras do Ticket Médio por Loja ou Categoria."""
 
-    df_grouped = df.groupby(group_col)["valor_compra"].mean().reset_index()
+    df_grouped = df.groupby(group_col, observed=True)["valor_compra"].mean().reset_index()
     df_grouped = df_grouped.sort_values("valor_compra", ascending=False).head(10)
 
     fig = px.bar(
@@ -159,3 +198,36 @@ def plot_ticket_medio_por_categoria(df: pd.DataFrame, group_col: str = "nome_loj
     )
 
     return fig
+
+
+# 6. Gráfico da Distância até as Lojas (usuário -> local da captura)
+def plot_distancia_por_grupo(df_resumo: pd.DataFrame, group_col: str = "nome_loja"):
+    """Cria um gráfico de barras da distância mediana (com a faixa entre os percentis 25 e 75)
+    por Loja, Tipo de Loja ou Tipo de Cupom, a partir de espacial.resumir_distancias."""
+
+    df_plot = df_resumo.assign(
+        acima=df_resumo["p75"] - df_resumo["mediana"],
+        abaixo=df_resumo["mediana"] - df_resumo["p25"],
+    )
+
+    fig = px.bar(
+        df_plot,
+        x="mediana",
+        y=group_col,
+        orientation="h",
+        error_x="acima",
+        error_x_minus="abaixo",
+        hover_data={"n": True, "p90": ":.0f", "acima": False, "abaixo": False},
+        title=f"Distância Mediana por {group_col.replace('_', ' ').title()}",
+        labels={
+            "mediana": "Distância Mediana (m)",
+            "n": "Capturas",
+            "p90": "Percentil 90 (m)",
+            group_col: group_col.replace("_", " ").title(),
+        },
+        color_discrete_sequence=px.colors.qualitative.Bold,
+    )
+
+    fig.update_layout(yaxis_autorange="reversed")
+
+    return fig
@@ -1,72 +1,29 @@
 import streamlit as st
 import pandas as pd
+import math
 import sys
 import os
-import re
 
 # Adiciona a pasta charts ao path para importar os gráficos
 sys.path.append(os.path.abspath("charts"))
+sys.path.append(os.path.abspath("services"))
 import ceo_charts
+import dados
+import derivacoes
+import figuras
+import filtros
 
 # Configurações da página
 st.set_page_config(page_title="Dashboard - CEO", layout="wide")
 
 
-# Carregando base de dados
-@st.cache_data
-def load_data():
-    df_ceo = pd.read_csv("data/analise-ceo.csv", sep=";")
-    df_teste_em_massa = pd.read_csv(
-        "data/teste_em_massa-limpo.csv", sep=",", engine="python"
-    )
-    df_cfo = pd.read_csv("data/analise-cfo.csv", sep=";")
-
-    df_mapa = pd.DataFrame()
-
-    # coords ceo
-    if {"latitude", "longitude"}.issubset(df_ceo.columns):
-        temp = df_ceo[["latitude", "longitude"]].copy()
-        temp["source"] = "CEO"
-        df_mapa = pd.concat([df_mapa, temp], ignore_index=True)
-
-    # coords cfo
-    if {"latitude", "longitude"}.issubset(df_cfo.columns):
-        temp = df_cfo[["latitude", "longitude"]].copy()
-        temp["source"] = "CFO"
-        df_mapa = pd.concat([df_mapa, temp], ignore_index=True)
-
-    # === Correção das colunas de latitude e longitude ===
-    def limpar_coord(valor):
-        valor = str(valor)
-
-        # Remove tudo que não for número, ponto ou menos
-        valor = re.sub(r"[^0-9\.-]", "", valor)
-
-        # Remove todos os pontos
-        valor = valor.replace(".", "")
-
-        # Garante que comece com "-"
-        if not valor.startswith("-"):
-            valor = "-" + valor
-
-        # Latitude/longitude brasileiras costumam ter 8 ou 9 dígitos após o sinal
-        # Exemplo correto: -235674304  ->  -23.5674304
-        if len(valor) > 3:
-            valor = valor[:3] + "." + valor[3:]
-
-        try:
-            return float(valor)
-        except:
-            return None
+# Carregando base de dados (camada compartilhada com as demais páginas); a versão (chave do
+# cache de figuras) vem das mesmas impressões digitais que chavearam a leitura das bases
+df_ceo, df_teste_em_massa, versao_ceo = dados.bases_ceo()
 
-    if "latitude" in df_ceo.columns and "longitude" in df_ceo.columns:
-        df_ceo["latitude"] = df_ceo["latitude"].apply(limpar_coord)
-        df_ceo["longitude"] = df_ceo["longitude"].apply(limpar_coord)
-
-    return df_ceo, df_teste_em_massa
-
-
-df_ceo, df_teste_em_massa = load_data()
+if df_ceo.empty:
+    st.error("Não foi possível carregar os dados do CEO. Verifique o arquivo Analise-CEO.csv.")
+    st.stop()
 
 
 # FILTROS GLOBAIS DO DASHBOARD
@@ -111,28 +68,42 @@ if coluna_cidade:
 else:
     filtro_cidade = None
 
+# Filtro por área do mapa (retângulo de latitude/longitude), resolvido pelo índice espacial
+indice_espacial = dados.indice_espacial_ceo(df_ceo, versao_ceo)
+filtro_area = None
+if indice_espacial.limites is not None:
+    # Limites arredondados para fora na precisão do slider (4 casas, ~11 m)
+    lat_min, lon_min = (math.floor(limite * 1e4) / 1e4 for limite in indice_espacial.limites[0::2])
+    lat_max, lon_max = (math.ceil(limite * 1e4) / 1e4 for limite in indice_espacial.limites[1::2])
+    with st.sidebar.expander("Área do mapa"):
+        faixa_lat = st.slider("Latitude", lat_min, lat_max, (lat_min, lat_max), step=0.0001, format="%.4f")
+        faixa_lon = st.slider("Longitude", lon_min, lon_max, (lon_min, lon_max), step=0.0001, format="%.4f")
+    if faixa_lat != (lat_min, lat_max) or faixa_lon != (lon_min, lon_max):
+        filtro_area = (faixa_lat, faixa_lon)
+
 
 # Aplicação dos filtros
 # ==============================
-df_ceo_filtrado = df_ceo.copy()
-
-# Aplicar faixa de idade
-df_ceo_filtrado = df_ceo_filtrado[
-    (df_ceo_filtrado["idade"] >= filtro_idade_min)
-    & (df_ceo_filtrado["idade"] <= filtro_idade_max)
-]
-
-# Aplicar filtro de gênero
-if filtro_genero is not None:
-    df_ceo_filtrado = df_ceo_filtrado[
-        df_ceo_filtrado[coluna_genero].isin(filtro_genero)
-    ]
-
-# Aplicar filtro de cidade
-if filtro_cidade is not None:
-    df_ceo_filtrado = df_ceo_filtrado[
-        df_ceo_filtrado[coluna_cidade].isin(filtro_cidade)
-    ]
+# Idade, gênero e cidade são resolvidos juntos pelo índice de filtros (bitmaps por valor)
+colunas_filtro = [coluna for coluna in [coluna_genero, coluna_cidade] if coluna]
+indice_ceo = dados.indice_filtros_ceo(df_ceo, versao_ceo, colunas_filtro)
+
+linhas_filtradas = indice_ceo.selecionar(
+    valores={coluna_genero: filtro_genero, coluna_cidade: filtro_cidade} if colunas_filtro else None,
+    intervalos={"idade": (filtro_idade_min, filtro_idade_max)},
+)
+if filtro_area:
+    linhas_filtradas = filtros.intersectar(linhas_filtradas, indice_espacial.na_area(*filtro_area[0], *filtro_area[1]))
+# Visão das linhas filtradas: cada gráfico extrai só as suas colunas (ceo_charts.COLUNAS_GRAFICOS)
+visao_ceo = filtros.Visao(df_ceo, linhas_filtradas)
+
+# Filtros que afetam cada gráfico (chave do cache de figuras, junto com a versão dos dados)
+filtros_globais = {
+    "idade": (filtro_idade_min, filtro_idade_max),
+    "genero": filtro_genero,
+    "cidade": filtro_cidade,
+    "area": filtro_area,
+}
 
 # Título principal
 st.title("📊 Dashboard Executivo - CEO")
@@ -144,7 +115,59 @@ Use as abas abaixo para navegar entre os indicadores.
 """
 )
 
+# Controles dentro das abas: os valores ficam no session_state e são reatribuídos a cada
+# execução, pois o Streamlit descarta o estado dos widgets que não foram exibidos (abas fechadas).
+categorias = sorted(df_teste_em_massa["categoria_frequentada"].dropna().unique())
+controles_abas = {
+    "inicio1": pd.to_datetime("00:00").time(),
+    "fim1": pd.to_datetime("23:59").time(),
+    "inicio3": pd.to_datetime("00:00").time(),
+    "fim3": pd.to_datetime("23:59").time(),
+    "categorias5": categorias,
+}
+for chave, inicial in controles_abas.items():
+    st.session_state[chave] = st.session_state.get(chave, inicial)
+
+# Controles locais das abas (horário e categoria) como fragmentos: alterar um deles reexecuta
+# só o fragmento (controles + gráfico dependente), sem reaplicar os filtros globais nem
+# redesenhar os outros gráficos da página.
+@st.fragment
+def grafico_filtrado_por_horario(aba, id_grafico, construir, visao, versao, filtros_base):
+    st.markdown("### Filtro por horário do dia")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        horario_inicio = st.time_input("Horário inicial", key=f"inicio{aba}")
+    with col2:
+        horario_fim = st.time_input("Horário final", key=f"fim{aba}")
+
+    # 'minuto_dia' (minutos desde a meia-noite) já vem calculada do carregamento
+    visao_horario = visao.refinar(
+        visao.coluna("minuto_dia").between(derivacoes.minutos_de(horario_inicio), derivacoes.minutos_de(horario_fim))
+    )
+    filtros_horario = {**filtros_base, "horario": (horario_inicio, horario_fim)}
+    figuras.exibir(id_grafico, versao, filtros_horario, construir, visao_horario)
+
+
+@st.fragment
+def grafico_filtrado_por_categoria(df_categorias, categorias, versao):
+    st.markdown("### Filtro por categoria de loja")
+
+    filtro_categoria = st.multiselect(
+        "Selecione categorias:", options=categorias, key="categorias5"
+    )
+    visao_aba5 = filtros.Visao(df_categorias).refinar(
+        df_categorias["categoria_frequentada"].isin(filtro_categoria)
+    )
+    figuras.exibir(
+        "ceo.grafico_categorias_frequentes", versao, {"categoria": filtro_categoria},
+        ceo_charts.grafico_categorias_frequentes, visao_aba5,
+    )
+
+
 # Criação das abas
+# Só a aba aberta é executada (on_change="rerun" + tabs[i].open); as figuras de cada aba
+# ficam no cache de figuras e reabrir uma aba já vista não reconstrói os gráficos.
 tabs = st.tabs(
     [
         "👥 Perfil de Usuários",
@@ -152,136 +175,103 @@ tabs = st.tabs(
         "📍 Localização e Presença",
         "🎯 Engajamento",
         "🏷️ Campanhas e Comportamento",
-    ]
+    ],
+    key="abas_ceo",
+    on_change="rerun",
 )
 
 # === ABA 1: Perfil de Usuários ===
 with tabs[0]:
-    st.subheader("👥 Perfil de Usuários")
-    st.plotly_chart(
-        ceo_charts.grafico_usuarios_por_idade(df_ceo_filtrado), use_container_width=True
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_usuarios_por_genero(df_ceo_filtrado),
-        use_container_width=True,
-    )
-    # --- Filtro por horário ---
-    st.markdown("### Filtro por horário do dia")
-
-    col1, col2 = st.columns(2)
-    with col1:
-        horario_inicio = st.time_input(
-            "Horário inicial", value=pd.to_datetime("00:00").time()
+    if tabs[0].open:
+        st.subheader("👥 Perfil de Usuários")
+        figuras.exibir(
+            "ceo.grafico_usuarios_por_idade", versao_ceo, filtros_globais,
+            ceo_charts.grafico_usuarios_por_idade, visao_ceo,
         )
-    with col2:
-        horario_fim = st.time_input(
-            "Horário final", value=pd.to_datetime("23:59").time()
+        figuras.exibir(
+            "ceo.grafico_usuarios_por_genero", versao_ceo, filtros_globais,
+            ceo_charts.grafico_usuarios_por_genero, visao_ceo,
+        )
+        # --- Filtro por horário (fragmento: muda só o gráfico por horário) ---
+        grafico_filtrado_por_horario(
+            "1", "ceo.grafico_distribuicao_por_horario", ceo_charts.grafico_distribuicao_por_horario,
+            visao_ceo, versao_ceo, filtros_globais,
         )
 
-    # Garantir que a coluna esteja em formato datetime.time
-    df_temp = df_ceo_filtrado.copy()
-    df_temp["horario"] = pd.to_datetime(df_temp["horario"], errors="coerce").dt.time
-
-    df_aba1 = df_temp[
-        (df_temp["horario"] >= horario_inicio) & (df_temp["horario"] <= horario_fim)
-    ]
-    st.plotly_chart(
-        ceo_charts.grafico_distribuicao_por_horario(df_aba1), use_container_width=True
-    )
 
 # === ABA 2: Dispositivos e Tecnologia ===
 with tabs[1]:
-    st.subheader("📱 Dispositivos e Tecnologia")
-    st.plotly_chart(
-        ceo_charts.grafico_usuarios_por_modelo(df_ceo_filtrado),
-        use_container_width=True,
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_tipo_celular(df_ceo_filtrado), use_container_width=True
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_usuarios_com_app(df_ceo_filtrado), use_container_width=True
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_tipo_celular_por_idade(df_ceo_filtrado),
-        use_container_width=True,
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_modelo_vs_engajamento(df_ceo_filtrado),
-        use_container_width=True,
-    )
+    if tabs[1].open:
+        st.subheader("📱 Dispositivos e Tecnologia")
+        figuras.exibir(
+            "ceo.grafico_usuarios_por_modelo", versao_ceo, filtros_globais,
+            ceo_charts.grafico_usuarios_por_modelo, visao_ceo,
+        )
+        figuras.exibir(
+            "ceo.grafico_tipo_celular", versao_ceo, filtros_globais,
+            ceo_charts.grafico_tipo_celular, visao_ceo,
+        )
+        figuras.exibir(
+            "ceo.grafico_usuarios_com_app", versao_ceo, filtros_globais,
+            ceo_charts.grafico_usuarios_com_app, visao_ceo,
+        )
+        figuras.exibir(
+            "ceo.grafico_tipo_celular_por_idade", versao_ceo, filtros_globais,
+            ceo_charts.grafico_tipo_celular_por_idade, visao_ceo,
+        )
+        figuras.exibir(
+            "ceo.grafico_modelo_vs_engajamento", versao_ceo, filtros_globais,
+            ceo_charts.grafico_modelo_vs_engajamento, visao_ceo,
+        )
 
 
 # === ABA 3: Localização e Presença ===
 with tabs[2]:
-    st.subheader("📍 Localização e Presença")
-
-    st.plotly_chart(
-        ceo_charts.grafico_mapa_clusters(df_ceo_filtrado), use_container_width=True
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_locais_frequentes(df_ceo_filtrado), use_container_width=True
-    )
-    # --- Filtro por horário ---
-    st.markdown("### Filtro por horário do dia")
+    if tabs[2].open:
+        st.subheader("📍 Localização e Presença")
 
-    col1, col2 = st.columns(2)
-    with col1:
-        horario_inicio3 = st.time_input(
-            "Horário inicial", key="inicio3", value=pd.to_datetime("00:00").time()
+        figuras.exibir(
+            "ceo.grafico_mapa_clusters", versao_ceo, filtros_globais,
+            ceo_charts.grafico_mapa_clusters, visao_ceo,
         )
-    with col2:
-        horario_fim3 = st.time_input(
-            "Horário final", key="fim3", value=pd.to_datetime("23:59").time()
+        figuras.exibir(
+            "ceo.grafico_locais_frequentes", versao_ceo, filtros_globais,
+            ceo_charts.grafico_locais_frequentes, visao_ceo,
+        )
+        # --- Filtro por horário (fragmento: muda só o gráfico por horário) ---
+        grafico_filtrado_por_horario(
+            "3", "ceo.grafico_horario_por_local", ceo_charts.grafico_horario_por_local,
+            visao_ceo, versao_ceo, filtros_globais,
         )
-
-    df_temp3 = df_ceo_filtrado.copy()
-    df_temp3["horario"] = pd.to_datetime(df_temp3["horario"], errors="coerce").dt.time
-
-    df_aba3 = df_temp3[
-        (df_temp3["horario"] >= horario_inicio3) & (df_temp3["horario"] <= horario_fim3)
-    ]
-    st.plotly_chart(
-        ceo_charts.grafico_horario_por_local(df_aba3), use_container_width=True
-    )
 
 
 # === ABA 4: Engajamento ===
 with tabs[3]:
-    st.subheader("🎯 Engajamento dos Usuários")
-    st.plotly_chart(
-        ceo_charts.grafico_valor_capturado_por_idade(df_ceo_filtrado),
-        use_container_width=True,
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_valor_por_tipo_cupom(df_ceo_filtrado),
-        use_container_width=True,
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_ticket_medio_por_faixa_etaria(df_ceo_filtrado),
-        use_container_width=True,
-    )
+    if tabs[3].open:
+        st.subheader("🎯 Engajamento dos Usuários")
+        figuras.exibir(
+            "ceo.grafico_valor_capturado_por_idade", versao_ceo, filtros_globais,
+            ceo_charts.grafico_valor_capturado_por_idade, visao_ceo,
+        )
+        figuras.exibir(
+            "ceo.grafico_valor_por_tipo_cupom", versao_ceo, filtros_globais,
+            ceo_charts.grafico_valor_por_tipo_cupom, visao_ceo,
+        )
+        figuras.exibir(
+            "ceo.grafico_ticket_medio_por_faixa_etaria", versao_ceo, filtros_globais,
+            ceo_charts.grafico_ticket_medio_por_faixa_etaria, visao_ceo,
+        )
 
 
 # === ABA 5: Campanhas e Comportamento ===
 with tabs[4]:
-    st.subheader("🏷️ Campanhas e Comportamento")
-
-    # --- Filtro por categoria de loja ---
-    st.markdown("### Filtro por categoria de loja")
+    if tabs[4].open:
+        st.subheader("🏷️ Campanhas e Comportamento")
 
-    categorias = sorted(df_teste_em_massa["categoria_frequentada"].dropna().unique())
-    filtro_categoria = st.multiselect(
-        "Selecione categorias:", options=categorias, default=categorias
-    )
+        # --- Filtro por categoria de loja (fragmento: muda só o gráfico de categorias) ---
+        grafico_filtrado_por_categoria(df_teste_em_massa, categorias, versao_ceo)
 
-    df_aba5 = df_teste_em_massa[
-        df_teste_em_massa["categoria_frequentada"].isin(filtro_categoria)
-    ]
-
-    st.plotly_chart(
-        ceo_charts.grafico_categorias_frequentes(df_aba5), use_container_width=True
-    )
-    st.plotly_chart(
-        ceo_charts.grafico_cupom_x_loja(df_ceo_filtrado), use_container_width=True
-    )
+        figuras.exibir(
+            "ceo.grafico_cupom_x_loja", versao_ceo, filtros_globais,
+            ceo_charts.grafico_cupom_x_loja, visao_ceo,
+        )
@@ -13,77 +13,32 @@ import numpy as np
 # └── charts/
 #     └── cfo_charts.py
 sys.path.append(os.path.abspath("charts"))
+sys.path.append(os.path.abspath("services"))
+import acumulados
 import cfo_charts
+import cubo
+import dados
+import figuras
+import filtros
+import indicadores
 
 # Configuração inicial
 st.set_page_config(layout="wide", page_title="Dashboard Financeiro de Cupons - CFO")
 
-# --- Funções de Carregamento e Pré-processamento de Dados ---
-
-@st.cache_data
-def load_data(file_path, sep=';'):
-    """Carrega e pré-processa os dados de análise CFO."""
-    try:
-        df = pd.read_csv(file_path, sep=sep, decimal=',')
-        
-        # Tratamento de colunas numéricas (removendo pontos como separador de milhar e convertendo para float)
-        if 'valor_compra' in df.columns:
-            df['valor_compra'] = df['valor_compra'].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).astype(float)
-        if 'valor_cupom' in df.columns:
-            df['valor_cupom'] = df['valor_cupom'].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False).astype(float)
-        
-        # Tratamento de datas
-        if 'data_captura' in df.columns:
-            df['data_captura'] = pd.to_datetime(df['data_captura'], format='%d/%m/%Y', errors='coerce')
-            df = df.dropna(subset=['data_captura'])
-            df['mes_ano'] = df['data_captura'].dt.to_period('M')
-            df['dia_semana'] = df['data_captura'].dt.day_name(locale='pt_BR')
-            
-        return df
-    except Exception as e:
-        st.error(f"Erro ao carregar ou processar o arquivo {file_path}: {e}")
-        return pd.DataFrame()
-
-@st.cache_data
-def load_demographic_data(file_path, sep=','):
-    """Carrega e pré-processa os dados demográficos."""
-    try:
-        df = pd.read_csv(file_path, sep=sep, decimal='.')
-        
-        # Tratamento de colunas
-        if 'celular' in df.columns:
-            df = df.rename(columns={'celular': 'numero_celular'})
-        
-        # Garantir que a coluna de celular esteja no mesmo formato para merge
-        if 'numero_celular' in df.columns:
-            df['numero_celular'] = df['numero_celular'].astype(str).str.replace(r'[() -]', '', regex=True)
-            
-        return df
-    except Exception as e:
-        st.error(f"Erro ao carregar ou processar o arquivo {file_path}: {e}")
-        return pd.DataFrame()
-
-# --- Carregamento e Combinação de Dados ---
-
-df_cfo = load_data('data/Analise-CFO.csv', sep=';')
-df_dem = load_demographic_data('data/cupons_capturados-limpo.csv', sep=',')
-
-# Padronizar a coluna de celular em df_cfo para o merge
-if 'numero_celular' in df_cfo.columns:
-    df_cfo['numero_celular'] = df_cfo['numero_celular'].astype(str).str.replace(r'[() -]', '', regex=True)
-
-# Merge dos DataFrames
-if not df_cfo.empty and not df_dem.empty:
-    df_merged = pd.merge(df_cfo, df_dem, on='numero_celular', how='left')
-else:
+# --- Carregamento e Combinação de Dados (camada compartilhada com as demais páginas) ---
+
+# Novas linhas nos CSVs de capturas são verificadas periodicamente; o botão força a leitura
+verificar_novos = st.sidebar.button("Verificar novos dados")
+# Linhas, índice de filtros, cubo diário (dia x tipo de loja x tipo de cupom) e versão vêm do
+# mesmo instantâneo do ingestor: a versão é a chave do cache de figuras e precisa ser a dos dados
+df_merged, indice_cfo, cubo_cfo, versao_cfo = dados.carregar_cfo_indexado(forcar=verificar_novos)
+
+if df_merged.empty:
     st.error("Não foi possível carregar os dados. Verifique se os arquivos CSV estão no diretório correto.")
     st.stop()
 
-# --- Cálculo de Métricas Financeiras Chave ---
-
-df_merged['valor_liquido'] = df_merged['valor_compra'] - df_merged['valor_cupom']
-df_merged['margem_cupom'] = (df_merged['valor_cupom'] / df_merged['valor_compra']) * 100
-df_merged['margem_cupom'] = df_merged['margem_cupom'].apply(lambda x: x if x <= 100 else 100) # Limitar a 100%
+# KPIs e gráficos agregados saem do cubo diário, com os filtros da barra lateral aplicados como
+# fatias; as linhas só são usadas nas análises por usuário e por categoria.
 
 # --- Layout do Dashboard ---
 
@@ -94,228 +49,250 @@ st.markdown("Análise do impacto financeiro e demográfico das campanhas de cupo
 st.sidebar.header("Filtros de Análise")
 
 # Filtro de Data
-min_date = df_merged['data_captura'].min().date()
-max_date = df_merged['data_captura'].max().date()
+min_date = cubo_cfo['data_captura'].min().date()
+max_date = cubo_cfo['data_captura'].max().date()
 date_range = st.sidebar.date_input("Selecione o Período", 
                                    value=(min_date, max_date),
                                    min_value=min_date,
                                    max_value=max_date)
 
+# Os filtros são acumulados e resolvidos de uma vez pelo índice (interseção de bitmaps)
+filtros_valores = {}
+filtros_intervalos = {}
+start_date = end_date = None
+
 if len(date_range) == 2:
     start_date = pd.to_datetime(date_range[0])
     end_date = pd.to_datetime(date_range[1])
-    df_filtered = df_merged[(df_merged['data_captura'] >= start_date) & (df_merged['data_captura'] <= end_date)]
+    filtros_intervalos['data_captura'] = (start_date, end_date)
+    cubo_filtrado = cubo.fatiar(cubo_cfo, start_date, end_date)
 else:
-    df_filtered = df_merged.copy()
+    cubo_filtrado = cubo_cfo
+
+# Granularidade das séries temporais pelo período selecionado (dia, semana ou mês)
+granularidade = cubo.granularidade_para(start_date or min_date, end_date or max_date)
 
 # Filtro de Tipo de Cupom
-tipos_cupom = ['Todos'] + list(df_filtered['tipo_cupom'].unique())
+tipos_cupom = ['Todos'] + list(cubo_filtrado['tipo_cupom'].dropna().unique())
 selected_cupom = st.sidebar.multiselect("Tipo de Cupom", tipos_cupom, default=['Todos'])
 if 'Todos' not in selected_cupom:
-    df_filtered = df_filtered[df_filtered['tipo_cupom'].isin(selected_cupom)]
+    filtros_valores['tipo_cupom'] = selected_cupom
+    cubo_filtrado = cubo.fatiar(cubo_filtrado, tipos_cupom=selected_cupom)
 
 # Filtro de Tipo de Loja
-tipos_loja = ['Todas'] + list(df_filtered['tipo_loja'].unique())
+tipos_loja = ['Todas'] + list(cubo_filtrado['tipo_loja'].dropna().unique())
 selected_loja = st.sidebar.multiselect("Tipo de Loja", tipos_loja, default=['Todas'])
 if 'Todas' not in selected_loja:
-    df_filtered = df_filtered[df_filtered['tipo_loja'].isin(selected_loja)]
+    filtros_valores['tipo_loja'] = selected_loja
+    cubo_filtrado = cubo.fatiar(cubo_filtrado, tipos_loja=selected_loja)
+
+linhas_filtradas = indice_cfo.selecionar(filtros_valores, filtros_intervalos)
+# Visão das linhas filtradas: cada gráfico/tabela extrai só as colunas de que precisa
+visao_filtrada = filtros.Visao(df_merged, linhas_filtradas)
+
+# Filtros da página (chave do cache de figuras, junto com a versão dos dados)
+filtros_pagina = {**filtros_valores, **filtros_intervalos}
 
 # Criação das abas
+# Só a aba aberta é executada (on_change="rerun" + tabs[i].open); as figuras de cada aba
+# ficam no cache de figuras e reabrir uma aba já vista não reconstrói os gráficos.
 tabs = st.tabs([
     "📈 KPIs e Análise Temporal",
     "📊 Análise de Segmento",
-])
+], key="abas_cfo", on_change="rerun")
 
 # === ABA 1: KPIs e Análise Temporal ===
 with tabs[0]:
-    st.subheader("Indicadores Chave de Performance (KPIs)")
+    if tabs[0].open:
+        st.subheader("Indicadores Chave de Performance (KPIs)")
 
-    col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4 = st.columns(4)
 
-    # Cálculo de KPIs
-    total_compras = df_filtered['valor_compra'].sum()
-    total_desconto = df_filtered['valor_cupom'].sum()
-    total_liquido = df_filtered['valor_liquido'].sum()
-    num_cupons = df_filtered.shape[0]
+        # Cálculo de KPIs (somas acumuladas por dia: período selecionado e período anterior de mesma duração)
+        acumulado = dados.acumulado_cfo(cubo_cfo, versao_cfo)
+        segmentos = {
+            'tipo_cupom': None if 'Todos' in selected_cupom else selected_cupom,
+            'tipo_loja': None if 'Todas' in selected_loja else selected_loja,
+        }
+        kpis = acumulado.totais(start_date, end_date, segmentos)
+        total_compras = kpis['valor_compra_soma']
+        total_desconto = kpis['valor_cupom_soma']
+        total_liquido = kpis['valor_liquido_soma']
+        num_cupons = int(kpis['n'])
 
-    # Delta (Comparação com o período anterior - simplificado)
-    mid_date = df_merged['data_captura'].max() - (df_merged['data_captura'].max() - df_merged['data_captura'].min()) / 2
-    df_prev = df_merged[df_merged['data_captura'] < mid_date]
-    df_curr = df_merged[df_merged['data_captura'] >= mid_date]
+        # Delta (comparação com o período anterior de mesma duração)
+        kpis_prev = acumulado.anterior(start_date, end_date, segmentos)
+        # (sem delta quando os dados não cobrem o período anterior inteiro)
+        delta_compras = acumulados.variacao(total_compras, kpis_prev, 'valor_compra_soma')
+        delta_desconto = acumulados.variacao(total_desconto, kpis_prev, 'valor_cupom_soma')
+        delta_liquido = acumulados.variacao(total_liquido, kpis_prev, 'valor_liquido_soma')
+        delta_cupons = acumulados.variacao(num_cupons, kpis_prev, 'n')
 
-    total_liquido_prev = df_prev['valor_liquido'].sum()
-    delta_liquido = ((total_liquido - total_liquido_prev) / total_liquido_prev) * 100 if total_liquido_prev != 0 else 0
+        with col1:
+            cfo_charts.create_kpi_card("Valor Total de Compras (GMV)", total_compras, delta=delta_compras, help_text="Soma do valor de todas as compras antes do desconto.")
 
-    with col1:
-        cfo_charts.create_kpi_card("Valor Total de Compras (GMV)", total_compras, help_text="Soma do valor de todas as compras antes do desconto.")
+        with col2:
+            cfo_charts.create_kpi_card("Valor Total de Desconto Concedido", total_desconto, delta=delta_desconto, help_text="Soma do valor de todos os cupões utilizados.")
 
-    with col2:
-        cfo_charts.create_kpi_card("Valor Total de Desconto Concedido", total_desconto, help_text="Soma do valor de todos os cupões utilizados.")
+        with col3:
+            cfo_charts.create_kpi_card("Valor Líquido (Receita)", total_liquido, delta=delta_liquido, help_text="Valor total das compras após a aplicação dos cupões, comparado ao período anterior de mesma duração.")
 
-    with col3:
-        cfo_charts.create_kpi_card("Valor Líquido (Receita)", total_liquido, delta=delta_liquido, help_text="Valor total das compras após a aplicação dos cupões.")
+        with col4:
+            st.metric(label="Total de Cupões Utilizados", value=indicadores.formatar_numero(num_cupons),
+                      delta=indicadores.formatar_variacao(delta_cupons), help="Número total de transações com cupões no período.")
 
-    with col4:
-        st.metric(label="Total de Cupões Utilizados", value=f"{num_cupons:,}".replace(",", "X").replace(".", ",").replace("X", "."), help="Número total de transações com cupões no período.")
+        # --- KPIs Adicionais ---
+        st.subheader("KPIs Adicionais")
 
-    # --- KPIs Adicionais ---
-    st.subheader("KPIs Adicionais")
+        col_add1, col_add2, col_add3, col_add4 = st.columns(4)
 
-    col_add1, col_add2, col_add3, col_add4 = st.columns(4)
+        # Ticket Médio (ATV)
+        ticket_medio = kpis['valor_compra_media']
+        # Desconto Médio
+        desconto_medio = kpis['valor_cupom_media']
+        # Margem Média de Cupóm
+        margem_media = kpis['margem_cupom_media']
+        # Taxa de Utilização Diária (dias do período coberto, a partir das datas do cubo filtrado)
+        datas = cubo_filtrado['data_captura']
+        num_dias = (datas.max() - datas.min()).days + 1 if not datas.empty else 0
+        taxa_diaria = num_cupons / num_dias if num_dias > 0 else 0
 
-    # Ticket Médio (ATV)
-    ticket_medio = df_filtered['valor_compra'].mean()
-    # Desconto Médio
-    desconto_medio = df_filtered['valor_cupom'].mean()
-    # Margem Média de Cupóm
-    margem_media = df_filtered['margem_cupom'].mean()
-    # Taxa de Utilização Diária
-    num_dias = (df_filtered['data_captura'].max() - df_filtered['data_captura'].min()).days + 1
-    taxa_diaria = num_cupons / num_dias if num_dias > 0 else 0
+        with col_add1:
+            cfo_charts.create_kpi_card("Ticket Médio (ATV)", ticket_medio, help_text="Valor médio de compra por cupóm utilizado.")
 
-    with col_add1:
-        cfo_charts.create_kpi_card("Ticket Médio (ATV)", ticket_medio, help_text="Valor médio de compra por cupóm utilizado.")
+        with col_add2:
+            cfo_charts.create_kpi_card("Desconto Médio", desconto_medio, help_text="Valor médio de desconto concedido por cupóm.")
 
-    with col_add2:
-        cfo_charts.create_kpi_card("Desconto Médio", desconto_medio, help_text="Valor médio de desconto concedido por cupóm.")
+        with col_add3:
+            st.metric(label="Margem Média de Cupóm", value=f"{margem_media:.2f}%", help="Percentual médio de desconto em relação ao valor da compra.")
 
-    with col_add3:
-        st.metric(label="Margem Média de Cupóm", value=f"{margem_media:.2f}%", help="Percentual médio de desconto em relação ao valor da compra.")
+        with col_add4:
+            st.metric(label="Taxa de Utilização Diária", value=f"{taxa_diaria:.2f}", help="Média de cupões utilizados por dia.")
 
-    with col_add4:
-        st.metric(label="Taxa de Utilização Diária", value=f"{taxa_diaria:.2f}", help="Média de cupões utilizados por dia.")
+        # --- Análise Temporal Principal ---
+        st.header("Análise Temporal - Receita e Desconto")
 
-    # --- Análise Temporal Principal ---
-    st.header("Análise Temporal - Receita e Desconto")
+        col5, col6 = st.columns(2)
 
-    col5, col6 = st.columns(2)
+        with col5:
+            figuras.exibir("cfo.plot_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_time_series, cubo_filtrado, 'valor_liquido', 'Receita Líquida ao Longo do Tempo', granularidade=granularidade)
 
-    with col5:
-        st.plotly_chart(cfo_charts.plot_time_series(df_filtered, 'valor_liquido', 'Receita Líquida ao Longo do Tempo'), use_container_width=True)
+        with col6:
+            figuras.exibir("cfo.plot_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_time_series, cubo_filtrado, 'valor_cupom', 'Desconto Concedido ao Longo do Tempo', granularidade=granularidade)
 
-    with col6:
-        st.plotly_chart(cfo_charts.plot_time_series(df_filtered, 'valor_cupom', 'Desconto Concedido ao Longo do Tempo'), use_container_width=True)
+        # --- Análise de Médias Temporais ---
+        st.header("Análise Temporal - Médias")
 
-    # --- Análise de Médias Temporais ---
-    st.header("Análise Temporal - Médias")
+        col7, col8 = st.columns(2)
 
-    col7, col8 = st.columns(2)
+        with col7:
+            figuras.exibir("cfo.plot_average_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_average_time_series, cubo_filtrado, 'valor_compra', 'Ticket Médio (ATV) ao Longo do Tempo', granularidade=granularidade)
 
-    with col7:
-        st.plotly_chart(cfo_charts.plot_average_time_series(df_filtered, 'valor_compra', 'Ticket Médio (ATV) ao Longo do Tempo'), use_container_width=True)
+        with col8:
+            figuras.exibir("cfo.plot_average_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_average_time_series, cubo_filtrado, 'valor_cupom', 'Desconto Médio ao Longo do Tempo', granularidade=granularidade)
 
-    with col8:
-        st.plotly_chart(cfo_charts.plot_average_time_series(df_filtered, 'valor_cupom', 'Desconto Médio ao Longo do Tempo'), use_container_width=True)
+        # --- Análise por Dia da Semana ---
+        st.header("Análise por Dia da Semana")
 
-    # --- Análise por Dia da Semana ---
-    st.header("Análise por Dia da Semana")
+        col9, col10 = st.columns(2)
 
-    col9, col10 = st.columns(2)
+        with col9:
+            figuras.exibir("cfo.plot_day_of_week_analysis", versao_cfo, filtros_pagina, cfo_charts.plot_day_of_week_analysis, cubo_filtrado, 'valor_liquido', 'Receita Líquida por Dia da Semana')
 
-    with col9:
-        st.plotly_chart(cfo_charts.plot_day_of_week_analysis(df_filtered, 'valor_liquido', 'Receita Líquida por Dia da Semana'), use_container_width=True)
+        with col10:
+            figuras.exibir("cfo.plot_day_of_week_analysis", versao_cfo, filtros_pagina, cfo_charts.plot_day_of_week_analysis, cubo_filtrado, 'valor_cupom', 'Desconto Concedido por Dia da Semana')
 
-    with col10:
-        st.plotly_chart(cfo_charts.plot_day_of_week_analysis(df_filtered, 'valor_cupom', 'Desconto Concedido por Dia da Semana'), use_container_width=True)
+        # --- Análise de Tipo de Cupóm ao Longo do Tempo ---
+        st.header("Análise Temporal por Tipo de Cupóm")
 
-    # --- Análise de Tipo de Cupóm ao Longo do Tempo ---
-    st.header("Análise Temporal por Tipo de Cupóm")
+        col11, col12 = st.columns(2)
 
-    col11, col12 = st.columns(2)
+        with col11:
+            figuras.exibir("cfo.plot_stacked_area_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_stacked_area_time_series, cubo_filtrado, 'valor_liquido', 'Receita Líquida ao Longo do Tempo por Tipo de Cupóm', granularidade=granularidade)
 
-    with col11:
-        st.plotly_chart(cfo_charts.plot_stacked_area_time_series(df_filtered, 'valor_liquido', 'Receita Líquida ao Longo do Tempo por Tipo de Cupóm'), use_container_width=True)
-
-    with col12:
-        st.plotly_chart(cfo_charts.plot_stacked_area_time_series(df_filtered, 'valor_cupom', 'Desconto Concedido ao Longo do Tempo por Tipo de Cupóm'), use_container_width=True)
+        with col12:
+            figuras.exibir("cfo.plot_stacked_area_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_stacked_area_time_series, cubo_filtrado, 'valor_cupom', 'Desconto Concedido ao Longo do Tempo por Tipo de Cupóm', granularidade=granularidade)
 
 # === ABA 2: Análise de Segmento ===
 with tabs[1]:
-    st.subheader("📊 Análise Profunda de Segmento")
-
-    # --- Receita e Desconto por Tipo de Loja ---
-    col7, col8 = st.columns(2)
+    if tabs[1].open:
+        st.subheader("📊 Análise Profunda de Segmento")
 
-    with col7:
-        st.plotly_chart(cfo_charts.plot_bar_chart(df_filtered, 'tipo_loja', 'valor_liquido', 'Top 10 Tipos de Loja por Receita Líquida'), use_container_width=True)
+        # --- Receita e Desconto por Tipo de Loja ---
+        col7, col8 = st.columns(2)
 
-    with col8:
-        st.plotly_chart(cfo_charts.plot_pie_chart(df_filtered, 'tipo_cupom', 'valor_cupom', 'Distribuição do Desconto por Tipo de Cupom'), use_container_width=True)
+        with col7:
+            figuras.exibir("cfo.plot_bar_chart", versao_cfo, filtros_pagina, cfo_charts.plot_bar_chart, cubo_filtrado, 'tipo_loja', 'valor_liquido', 'Top 10 Tipos de Loja por Receita Líquida')
 
-    # --- Margem de Lucro por Tipo de Loja ---
-    st.subheader("Margem de Cupom por Tipo de Loja")
-    st.plotly_chart(cfo_charts.plot_segment_metric(df_filtered, 'tipo_loja', 'margem_cupom', 'Margem de Cupom (%) por Tipo de Loja'), use_container_width=True)
-    st.markdown("_Quanto maior a margem, maior o custo do cupom em relação ao valor da compra._")
+        with col8:
+            figuras.exibir("cfo.plot_pie_chart", versao_cfo, filtros_pagina, cfo_charts.plot_pie_chart, cubo_filtrado, 'tipo_cupom', 'valor_cupom', 'Distribuição do Desconto por Tipo de Cupom')
 
-    # --- Ticket Médio por Tipo de Loja ---
-    st.subheader("Ticket Médio por Tipo de Loja")
-    st.plotly_chart(cfo_charts.plot_segment_metric(df_filtered, 'tipo_loja', 'valor_compra', 'Ticket Médio (R$) por Tipo de Loja', sort_ascending=False), use_container_width=True)
-    st.markdown("_Identifica quais tipos de loja têm maior poder de compra._")
+        # --- Margem de Lucro por Tipo de Loja ---
+        st.subheader("Margem de Cupom por Tipo de Loja")
+        figuras.exibir("cfo.plot_segment_metric", versao_cfo, filtros_pagina, cfo_charts.plot_segment_metric, cubo_filtrado, 'tipo_loja', 'margem_cupom', 'Margem de Cupom (%) por Tipo de Loja')
+        st.markdown("_Quanto maior a margem, maior o custo do cupom em relação ao valor da compra._")
 
-    # --- ROI por Tipo de Loja ---
-    st.subheader("Retorno sobre Investimento (ROI) por Tipo de Loja")
-    st.plotly_chart(cfo_charts.plot_segment_roi(df_filtered), use_container_width=True)
-    st.markdown("_ROI = Receita Líquida / Desconto Concedido. Quanto maior, melhor o retorno por R$ gasto em cupons._")
+        # --- Ticket Médio por Tipo de Loja ---
+        st.subheader("Ticket Médio por Tipo de Loja")
+        figuras.exibir("cfo.plot_segment_metric", versao_cfo, filtros_pagina, cfo_charts.plot_segment_metric, cubo_filtrado, 'tipo_loja', 'valor_compra', 'Ticket Médio (R$) por Tipo de Loja', sort_ascending=False)
+        st.markdown("_Identifica quais tipos de loja têm maior poder de compra._")
 
-    # --- Análise de Concentração (Pareto) ---
-    st.subheader("Análise de Concentração (Pareto) da Receita Líquida")
-    st.plotly_chart(cfo_charts.plot_concentration_analysis(df_filtered), use_container_width=True)
-    st.markdown("_A linha vermelha mostra qual % da receita é gerada pelos primeiros tipos de loja. Identifica lojas estratégicas vs. periféricas._")
+        # --- ROI por Tipo de Loja ---
+        st.subheader("Retorno sobre Investimento (ROI) por Tipo de Loja")
+        figuras.exibir("cfo.plot_segment_roi", versao_cfo, filtros_pagina, cfo_charts.plot_segment_roi, cubo_filtrado)
+        st.markdown("_ROI = Receita Líquida / Desconto Concedido. Quanto maior, melhor o retorno por R$ gasto em cupons._")
 
-    # --- Série Temporal por Segmento ---
-    st.subheader("Evolução Temporal da Receita Líquida (Top 5 Tipos de Loja)")
-    st.plotly_chart(cfo_charts.plot_segment_time_series(df_filtered, 'tipo_loja', 'valor_liquido', 'Receita Líquida ao Longo do Tempo por Tipo de Loja'), use_container_width=True)
-    st.markdown("_Mostra tendências e sazonalidade por segmento._")
+        # --- Análise de Concentração (Pareto) ---
+        st.subheader("Análise de Concentração (Pareto) da Receita Líquida")
+        figuras.exibir("cfo.plot_concentration_analysis", versao_cfo, filtros_pagina, cfo_charts.plot_concentration_analysis, cubo_filtrado)
+        st.markdown("_A linha vermelha mostra qual % da receita é gerada pelos primeiros tipos de loja. Identifica lojas estratégicas vs. periféricas._")
 
-    # --- Heatmap de Tipo de Loja vs. Tipo de Cupom ---
-    st.subheader("Matriz de Interação: Tipo de Loja vs. Tipo de Cupom")
-    st.plotly_chart(cfo_charts.plot_coupon_type_heatmap(df_filtered), use_container_width=True)
-    st.markdown("_Heatmap mostrando a receita líquida gerada pela combinação de cada tipo de loja com cada tipo de cupom._")
+        # --- Série Temporal por Segmento ---
+        st.subheader("Evolução Temporal da Receita Líquida (Top 5 Tipos de Loja)")
+        figuras.exibir("cfo.plot_segment_time_series", versao_cfo, filtros_pagina, cfo_charts.plot_segment_time_series, cubo_filtrado, 'tipo_loja', 'valor_liquido', 'Receita Líquida ao Longo do Tempo por Tipo de Loja', granularidade=granularidade)
+        st.markdown("_Mostra tendências e sazonalidade por segmento._")
 
-    # --- Scatter Plot: Ticket Médio vs. Desconto Médio ---
-    st.subheader("Ticket Médio vs. Desconto Médio por Tipo de Loja")
-    st.plotly_chart(cfo_charts.plot_ticket_discount_scatter(df_filtered), use_container_width=True)
-    st.markdown("_Scatter plot mostrando a relação entre ticket médio e desconto médio. O tamanho da bolha representa o volume de cupons._")
+        # --- Heatmap de Tipo de Loja vs. Tipo de Cupom ---
+        st.subheader("Matriz de Interação: Tipo de Loja vs. Tipo de Cupom")
+        figuras.exibir("cfo.plot_coupon_type_heatmap", versao_cfo, filtros_pagina, cfo_charts.plot_coupon_type_heatmap, cubo_filtrado)
+        st.markdown("_Heatmap mostrando a receita líquida gerada pela combinação de cada tipo de loja com cada tipo de cupom._")
 
+        # --- Scatter Plot: Ticket Médio vs. Desconto Médio ---
+        st.subheader("Ticket Médio vs. Desconto Médio por Tipo de Loja")
+        figuras.exibir("cfo.plot_ticket_discount_scatter", versao_cfo, filtros_pagina, cfo_charts.plot_ticket_discount_scatter, cubo_filtrado)
+        st.markdown("_Scatter plot mostrando a relação entre ticket médio e desconto médio. O tamanho da bolha representa o volume de cupons._")
 
 
-    # Métrica de Engajamento (Cupons por Usuário)
-    df_user_summary = df_filtered.groupby('numero_celular').agg(
-        total_compras=('valor_compra', 'sum'),
-        total_desconto=('valor_cupom', 'sum'),
-        total_liquido=('valor_liquido', 'sum'),
-        num_cupons=('numero_celular', 'count'),
-        idade=('idade', 'first'),
-        sexo=('sexo', 'first'),
-        cidade_residencial=('cidade_residencial', 'first')
-    ).reset_index()
 
-    # LTV Simplificado (Valor Líquido Médio por Usuário)
-    ltv_simplificado = df_user_summary['total_liquido'].mean()
+        # LTV Simplificado (Valor Líquido Médio por Usuário) e Cupons por Usuário: usuários
+        # distintos só saem das linhas, então a passada é feita apenas com esta aba aberta
+        kpis_linhas = indicadores.calcular(df_merged, linhas_filtradas, medidas=['valor_liquido'],
+                                           coluna_usuario='chave_celular')
+        ltv_simplificado = kpis_linhas.get('valor_liquido_por_usuario', np.nan)
+        cupons_por_usuario = kpis_linhas.get('n_por_usuario', np.nan)
 
-    col9, col10 = st.columns(2)
+        col9, col10 = st.columns(2)
 
-    with col9:
-        cfo_charts.create_kpi_card("LTV Simplificado (Ticket Médio Líquido por Usuário)", 
-                                   ltv_simplificado,
-                                   help_text="Média do valor líquido total gasto por usuário no período.")
+        with col9:
+            cfo_charts.create_kpi_card("LTV Simplificado (Ticket Médio Líquido por Usuário)", 
+                                       ltv_simplificado,
+                                       help_text="Média do valor líquido total gasto por usuário no período.")
 
-    with col10:
-        cupons_por_usuario = df_user_summary['num_cupons'].mean()
-        st.metric(label="Cupons Médios por Usuário", 
-                  value=f"{cupons_por_usuario:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
-                  help="Média de cupons utilizados por usuário no período.")
+        with col10:
+            st.metric(label="Cupons Médios por Usuário", 
+                      value=indicadores.formatar_numero(cupons_por_usuario, 2),
+                      help="Média de cupons utilizados por usuário no período.")
 
-    st.subheader("Distribuição de Usuários por Idade e Sexo")
-    st.plotly_chart(cfo_charts.plot_age_gender_distribution(df_user_summary), use_container_width=True)
+        st.subheader("Distribuição de Usuários por Idade e Sexo")
+        figuras.exibir("cfo.plot_age_gender_distribution", versao_cfo, filtros_pagina, cfo_charts.plot_user_age_gender_distribution, visao_filtrada)
 
-    st.subheader("Top 10 Categorias Frequentadas")
-    st.plotly_chart(cfo_charts.plot_top_categories(df_filtered), use_container_width=True)
+        st.subheader("Top 10 Categorias Frequentadas")
+        figuras.exibir("cfo.plot_top_categories", versao_cfo, filtros_pagina, cfo_charts.plot_top_categories, visao_filtrada)
 
 # --- Tabela de Dados (Opcional) ---
 if st.checkbox("Mostrar Tabela de Dados Brutos"):
     st.subheader("Dados Brutos (Filtrados)")
-    st.dataframe(df_filtered)
+    st.dataframe(visao_filtrada.linhas())
 
 # --- Instruções para Execução ---
 st.sidebar.markdown("---")
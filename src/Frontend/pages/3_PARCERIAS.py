@@ -1,14 +1,21 @@
 import streamlit as st
 import pandas as pd
+import math
 import os
 import sys
-import plotly.io as pio
 
 # Configuração inicial
 st.set_page_config(layout="wide", page_title="Dashboard de Parcerias por Loja")
 
 # Adiciona a pasta charts ao path para importar os gráficos
 sys.path.append(os.path.abspath("charts"))
+sys.path.append(os.path.abspath("services"))
+import acumulados
+import dados
+import figuras
+import filtros
+import indicadores
+
 try:
     import parcerias_charts
 except ImportError:
@@ -17,126 +24,9 @@ except ImportError:
     )
     st.stop()
 
-# Caminho para a pasta de dados
-DATA_DIR = "data"
-
-# Arquivos de base de parcerias (que contêm a categoria)
-ARQUIVOS_BASE = [
-    "base_paulista-limpo.csv",
-    "base_players-limpo.csv",
-    "cupons_capturados-limpo.csv",
-    "teste_em_massa-limpo.csv",
-]
-
-# Arquivo com os dados financeiros e 'nome_loja'
-ARQUIVO_CFO = "Analise-CFO.csv"
-
-# --- Funções de Carregamento e Consolidação ---
-
-
-@st.cache_data
-def load_data():
-    """Carrega e consolida todos os dados em memória, eliminando o arquivo intermediário."""
-
-    # --- 1. Consolidar Bases de Parcerias (Base de 40.000 registros) ---
-    dfs_parcerias = []
-    for arquivo in ARQUIVOS_BASE:
-        caminho = os.path.join(DATA_DIR, arquivo)
-        try:
-            # Carrega com separador padrão (ponto e vírgula)
-            df = pd.read_csv(caminho, sep=";", decimal=",", encoding="latin-1")
-
-            # Adicionar coluna de origem
-            df["origem"] = arquivo.replace("-limpo.csv", "")
-            dfs_parcerias.append(df)
-        except Exception as e:
-            st.warning(
-                f"Aviso: Erro ao carregar base de categoria {arquivo}. Pode estar faltando. Erro: {e}"
-            )
-
-    df_consolidado = pd.concat(dfs_parcerias, ignore_index=True)
-
-    # --- 2. Carregar Dados Financeiros (CFO - 10.000 registros) ---
-    caminho_cfo = os.path.join(DATA_DIR, ARQUIVO_CFO)
-    df_cfo = pd.DataFrame()
-
-    try:
-        # Carrega o CFO com o separador correto (ponto e vírgula)
-        # Assumindo que 'nome_loja' e valores financeiros estão aqui
-        df_cfo = pd.read_csv(caminho_cfo, sep=";", decimal=".", encoding="latin-1")
-    except Exception as e:
-        st.warning(
-            f"Aviso: Não foi possível carregar o arquivo {ARQUIVO_CFO}. Valores financeiros e nome da loja serão zero/vazios. Erro: {e}"
-        )
-
-    # --- 3. Juntar os Dados pelo Índice (Sem Chave Comum) ---
-
-    if df_cfo.empty:
-        # Fallback para valores zero e nome de loja vazio
-        df_consolidado["nome_loja"] = "Loja Desconhecida"
-        df_consolidado["valor_cupom"] = 0.0
-        df_consolidado["valor_liquido"] = 0.0
-        df_consolidado["valor_compra"] = 0.0
-    else:
-        # Calcular valor_liquido no CFO
-        df_cfo["valor_liquido"] = df_cfo["valor_compra"] - df_cfo["valor_cupom"]
-
-        # Colunas a serem extraídas do CFO (incluindo 'nome_loja')
-        colunas_valor = ["nome_loja", "valor_cupom", "valor_liquido", "valor_compra"]
-
-        # Garantir que 'nome_loja' exista no CFO antes de prosseguir
-        if "nome_loja" not in df_cfo.columns:
-            st.error(
-                "Erro: A coluna 'nome_loja' não foi encontrada no arquivo Analise-CFO.csv."
-            )
-            return pd.DataFrame()  # Retorna vazio para parar o dashboard
-
-        df_cfo_valores = df_cfo[colunas_valor].copy()
-
-        # Criar um DataFrame de 40.000 linhas com os valores do CFO (10.000) e o restante vazio/zero
-        df_valores_completos = pd.DataFrame(
-            {
-                "nome_loja": ["Loja Desconhecida"] * len(df_consolidado),
-                "valor_cupom": [0.0] * len(df_consolidado),
-                "valor_liquido": [0.0] * len(df_consolidado),
-                "valor_compra": [0.0] * len(df_consolidado),
-            }
-        )
-
-        # Copiar os 10.000 valores do CFO para o DataFrame completo
-        # Assumimos que os 40.000 registros de categoria e os 10.000 registros de CFO estão na mesma ordem.
-        df_valores_completos.iloc[: len(df_cfo_valores)] = df_cfo_valores.values
-
-        # Adicionar as colunas de valor ao DataFrame consolidado
-        df_consolidado["nome_loja"] = df_valores_completos["nome_loja"]
-        df_consolidado["valor_cupom"] = df_valores_completos["valor_cupom"]
-        df_consolidado["valor_liquido"] = df_valores_completos["valor_liquido"]
-        df_consolidado["valor_compra"] = df_valores_completos["valor_compra"]
-
-    # --- 4. Garantir Colunas Mínimas e Tipos ---
-
-    # Garantir que a coluna 'celular' exista para a contagem de transações (usando 'origem' como fallback)
-    if "celular" not in df_consolidado.columns:
-        df_consolidado["celular"] = df_consolidado[
-            "origem"
-        ]  # Coluna temporária para contagem
-
-    # Garantir que a coluna 'margem_cupom' exista para os gráficos
-    if "margem_cupom" not in df_consolidado.columns:
-        df_consolidado["margem_cupom"] = 0.0
-
-    # Tratamento de datas
-    if "data_captura" in df_consolidado.columns:
-        df_consolidado["data_captura"] = pd.to_datetime(
-            df_consolidado["data_captura"], errors="coerce"
-        )
-        df_consolidado = df_consolidado.dropna(subset=["data_captura"])
-
-    return df_consolidado
-
-
 # --- Carregar Dados ---
-df_parcerias = load_data()
+# A versão (chave do cache de figuras) vem do mesmo instantâneo das capturas usado na consolidação
+df_parcerias, versao_parcerias = dados.carregar_parcerias()
 
 if df_parcerias.empty:
     st.error(
@@ -159,18 +49,42 @@ nomes_loja = ["Todas"] + sorted(df_parcerias["nome_loja"].unique().tolist())
 selected_loja = st.sidebar.multiselect("Nome da Loja", nomes_loja, default=["Todas"])
 
 # --- Aplicação dos Filtros ---
-df_filtered = df_parcerias.copy()
+# Os filtros são resolvidos pelo índice (bitmaps por loja e datas ordenadas) em uma única seleção
+indice_parcerias = dados.indice_filtros_parcerias(df_parcerias, versao_parcerias)
+filtros_valores = {}
+filtros_intervalos = {}
 
-# Filtro de Nome de Loja (Aplica a filtragem no DataFrame)
+# Filtro de Nome de Loja
 if "Todas" not in selected_loja:
-    df_filtered = df_filtered[df_filtered["nome_loja"].isin(selected_loja)]
+    filtros_valores["nome_loja"] = selected_loja
+
+# 2. Filtro por área do mapa: mantém só as lojas localizadas no retângulo de latitude/longitude
+# (consulta pelo índice espacial das lojas, como na página do CEO)
+lojas_mapa = dados.lojas_parcerias()
+indice_lojas = dados.indice_espacial_lojas()
+if indice_lojas.limites is not None:
+    # Limites arredondados para fora na precisão do slider (4 casas, ~11 m)
+    lat_min, lon_min = (math.floor(limite * 1e4) / 1e4 for limite in indice_lojas.limites[0::2])
+    lat_max, lon_max = (math.ceil(limite * 1e4) / 1e4 for limite in indice_lojas.limites[1::2])
+    with st.sidebar.expander("Área do mapa"):
+        faixa_lat = st.slider("Latitude", lat_min, lat_max, (lat_min, lat_max), step=0.0001, format="%.4f")
+        faixa_lon = st.slider("Longitude", lon_min, lon_max, (lon_min, lon_max), step=0.0001, format="%.4f")
+    if faixa_lat != (lat_min, lat_max) or faixa_lon != (lon_min, lon_max):
+        na_area = indice_lojas.na_area(*faixa_lat, *faixa_lon)
+        lojas_area = set(lojas_mapa["nome_loja"].iloc[na_area])
+        filtros_valores["nome_loja"] = [
+            loja for loja in filtros_valores.get("nome_loja", nomes_loja) if loja in lojas_area
+        ]
+
+linhas_loja = indice_parcerias.selecionar(filtros_valores)
 
 # O filtro de Origem foi removido daqui.
 
 # Filtro de Data (Mantido do código original)
-if "data_captura" in df_filtered.columns and not df_filtered.empty:
-    min_date = df_filtered["data_captura"].min().date()
-    max_date = df_filtered["data_captura"].max().date()
+datas_loja = filtros.Visao(df_parcerias, linhas_loja).coluna("data_captura") if "data_captura" in df_parcerias.columns else None
+if datas_loja is not None and not datas_loja.empty:
+    min_date = datas_loja.min().date()
+    max_date = datas_loja.max().date()
     date_range = st.sidebar.date_input(
         "Selecione o Período",
         value=(min_date, max_date),
@@ -181,19 +95,36 @@ if "data_captura" in df_filtered.columns and not df_filtered.empty:
     if len(date_range) == 2:
         start_date = pd.to_datetime(date_range[0])
         end_date = pd.to_datetime(date_range[1])
-        df_filtered = df_filtered[
-            (df_filtered["data_captura"] >= start_date)
-            & (df_filtered["data_captura"] <= end_date)
-        ]
+        filtros_intervalos["data_captura"] = (start_date, end_date)
+
+# Visão das linhas filtradas: cada gráfico/tabela extrai só as colunas de que precisa
+visao_filtrada = filtros.Visao(
+    df_parcerias, indice_parcerias.selecionar(filtros_valores, filtros_intervalos)
+)
+
+# Filtros da página (chave do cache de figuras, junto com a versão dos dados)
+filtros_pagina = {**filtros_valores, **filtros_intervalos}
 
 
 # --- Indicadores Chave de Performance (KPIs) ---
 st.header("Indicadores Chave de Performance (KPIs)")
 
-total_receita_liquida = df_filtered["valor_liquido"].sum()
-total_desconto_concedido = df_filtered["valor_cupom"].sum()
-total_transacoes = len(df_filtered)
-ticket_medio = df_filtered["valor_compra"].mean() if total_transacoes > 0 else 0.0
+# Somas acumuladas por dia x loja: período selecionado e período anterior de mesma duração
+acumulado = dados.acumulado_parcerias(df_parcerias, versao_parcerias)
+lojas = filtros_valores.get("nome_loja")
+inicio, fim = filtros_intervalos.get("data_captura", (None, None))
+kpis = acumulado.totais(inicio, fim, {"nome_loja": lojas})
+kpis_prev = acumulado.anterior(inicio, fim, {"nome_loja": lojas})
+
+total_receita_liquida = kpis["valor_liquido_soma"]
+total_desconto_concedido = kpis["valor_cupom_soma"]
+total_transacoes = int(kpis["n"])
+ticket_medio = kpis["valor_compra_media"] if total_transacoes > 0 else 0.0
+
+# Sem delta quando os dados não cobrem o período anterior inteiro (kpis_prev é None)
+delta_receita = acumulados.variacao(total_receita_liquida, kpis_prev, "valor_liquido_soma")
+delta_desconto = acumulados.variacao(total_desconto_concedido, kpis_prev, "valor_cupom_soma")
+delta_transacoes = acumulados.variacao(total_transacoes, kpis_prev, "n")
 
 col1, col2, col3, col4 = st.columns(4)
 
@@ -203,6 +134,7 @@ with col1:
         value=f"R$ {total_receita_liquida:,.2f}".replace(",", "X")
         .replace(".", ",")
         .replace("X", "."),
+        delta=indicadores.formatar_variacao(delta_receita),
     )
 
 with col2:
@@ -211,11 +143,14 @@ with col2:
         value=f"R$ {total_desconto_concedido:,.2f}".replace(",", "X")
         .replace(".", ",")
         .replace("X", "."),
+        delta=indicadores.formatar_variacao(delta_desconto),
     )
 
 with col3:
     st.metric(
-        label="Total de Transações", value=f"{total_transacoes:,.0f}".replace(",", ".")
+        label="Total de Transações",
+        value=f"{total_transacoes:,.0f}".replace(",", "."),
+        delta=indicadores.formatar_variacao(delta_transacoes),
     )
 
 with col4:
@@ -234,18 +169,86 @@ col5, col6 = st.columns(2)
 # Os gráficos agora agrupam por 'nome_loja'
 with col5:
     st.subheader("Top 10 Lojas por Receita Líquida")
-    st.plotly_chart(
-        parcerias_charts.plot_receita_por_categoria(df_filtered, group_col="nome_loja"),
-        use_container_width=True,
+    figuras.exibir(
+        "parcerias.plot_receita_por_categoria", versao_parcerias, filtros_pagina,
+        parcerias_charts.plot_receita_por_categoria, visao_filtrada, group_col="nome_loja",
     )
 
 with col6:
     st.subheader("Distribuição do Desconto Concedido por Loja")
-    st.plotly_chart(
-        parcerias_charts.plot_desconto_por_categoria(
-            df_filtered, group_col="nome_loja"
-        ),
+    figuras.exibir(
+        "parcerias.plot_desconto_por_categoria", versao_parcerias, filtros_pagina,
+        parcerias_charts.plot_desconto_por_categoria, visao_filtrada, group_col="nome_loja",
+    )
+
+# --- Área de Influência por Loja ---
+st.header("📍 Área de Influência por Loja")
+st.markdown(
+    "Capturas selecionadas pelos filtros registradas a até o raio escolhido de cada loja (localização estimada pelas capturas da própria loja)."
+)
+
+raio = st.slider("Raio (metros)", 100, 2000, 500, step=100)
+# Só as capturas das linhas filtradas entram na contagem (interseção com as capturas no raio)
+influencia = dados.area_de_influencia(raio, visao_filtrada.selecao)
+if "nome_loja" in filtros_valores:
+    influencia = influencia[influencia["nome_loja"].isin(filtros_valores["nome_loja"])]
+
+# A localização de cada loja é a mediana das coordenadas das suas capturas: quando as lojas
+# ficam mais próximas entre si do que o raio, as áreas de influência praticamente coincidem
+dispersao = dados.dispersao_lojas()
+if dispersao < raio:
+    st.warning(
+        f"As localizações das lojas são estimativas e ficam a menos de {dispersao:.0f} m umas das outras; "
+        f"com um raio de {raio} m as áreas de influência se sobrepõem e os totais por loja ficam parecidos."
+    )
+if not influencia.empty and (influencia["usuarios_no_raio"] == influencia["capturas_no_raio"]).all():
+    st.caption("Cada captura no raio é de um celular diferente, por isso os usuários no raio coincidem com as capturas.")
+
+influencia = influencia.sort_values("capturas_no_raio", ascending=False).rename(columns={
+    "nome_loja": "Nome da Loja",
+    "endereco_loja": "Endereço",
+    "capturas_no_raio": "Capturas no Raio",
+    "usuarios_no_raio": "Usuários no Raio",
+    "receita_liquida_no_raio": "Receita Líquida no Raio (R$)",
+})
+influencia["Receita Líquida no Raio (R$)"] = influencia["Receita Líquida no Raio (R$)"].map(indicadores.formatar_moeda)
+st.dataframe(
+    influencia.drop(columns=["latitude", "longitude"]), use_container_width=True, hide_index=True
+)
+
+# --- Distância até as Lojas ---
+st.header("🚶 Distância Percorrida até as Lojas")
+st.markdown(
+    "Distância entre a localização do usuário (base do CEO) e o local de cada captura, para os celulares presentes nas duas bases."
+)
+
+opcoes_distancia = {"Loja": "nome_loja", "Tipo de Loja": "tipo_loja", "Tipo de Cupom": "tipo_cupom"}
+agrupar_distancia = opcoes_distancia[st.selectbox("Agrupar por", list(opcoes_distancia))]
+resumo_distancias, versao_distancias = dados.resumo_distancias(agrupar_distancia)
+filtros_distancia = {}
+if agrupar_distancia == "nome_loja" and "nome_loja" in filtros_valores and not resumo_distancias.empty:
+    filtros_distancia["nome_loja"] = filtros_valores["nome_loja"]
+    resumo_distancias = resumo_distancias[resumo_distancias["nome_loja"].isin(filtros_valores["nome_loja"])]
+
+if resumo_distancias.empty:
+    st.info("Nenhuma captura de usuário presente na base do CEO para calcular as distâncias.")
+else:
+    figuras.exibir(
+        "parcerias.plot_distancia_por_grupo", versao_distancias, filtros_distancia,
+        parcerias_charts.plot_distancia_por_grupo, resumo_distancias, group_col=agrupar_distancia,
+    )
+    st.dataframe(
+        resumo_distancias.rename(columns={
+            agrupar_distancia: "Grupo",
+            "n": "Capturas",
+            "media": "Média (m)",
+            "p25": "Percentil 25 (m)",
+            "mediana": "Mediana (m)",
+            "p75": "Percentil 75 (m)",
+            "p90": "Percentil 90 (m)",
+        }).round(0),
         use_container_width=True,
+        hide_index=True,
     )
 
 # --- Tabela de Dados Detalhados por Loja ---
@@ -253,7 +256,8 @@ st.header("📊 Dados Detalhados por Nome de Loja")
 
 # Criar um resumo por loja
 loja_resumo = (
-    df_filtered.groupby("nome_loja")
+    visao_filtrada.linhas(["nome_loja", "celular", "valor_liquido", "valor_cupom", "valor_compra"])
+    .groupby("nome_loja", observed=True)
     .agg(
         {
             "celular": "count",  # Usamos 'celular' (ou o fallback) para contar o número de transações
@@ -320,11 +324,11 @@ colunas_exibicao = [
 ]
 
 # Filtrar apenas as colunas que existem no dataframe
-colunas_exibicao = [col for col in colunas_exibicao if col in df_filtered.columns]
+colunas_exibicao = [col for col in colunas_exibicao if col in visao_filtrada.columns]
 
-# Exibir tabela com dados detalhados
+# Exibir tabela com dados detalhados (só as 100 primeiras linhas são extraídas)
 st.dataframe(
-    df_filtered[colunas_exibicao].head(100), use_container_width=True, hide_index=True
+    visao_filtrada.primeiras(100).linhas(colunas_exibicao), use_container_width=True, hide_index=True
 )
 
-st.info(f"Mostrando os primeiros 100 registros de {len(df_filtered)} registros totais")
+st.info(f"Mostrando os primeiros 100 registros de {len(visao_filtrada)} registros totais")
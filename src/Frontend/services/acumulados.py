@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+
+# Índice de somas acumuladas por dia e segmento para os cartões de KPI: para cada segmento
+# (ex.: tipo de loja x tipo de cupom) guarda a soma acumulada, dia a dia, de cada coluna aditiva.
+# O total de qualquer período sai da diferença de duas posições do acumulado, sem percorrer
+# as transações, e o período anterior de mesma duração custa o mesmo.
+
+
+def cubo_diario(df, segmentos, medidas):
+    """Agrega as linhas por dia x segmentos com quantidade, soma e contagem de cada medida.
+
+    Gera as mesmas colunas aditivas do cubo do CFO (n, {medida}_soma, {medida}_n).
+    """
+    datas = df["data_captura"].dt.normalize() if "data_captura" in df.columns else pd.Series(
+        pd.NaT, index=df.index, dtype="datetime64[ns]"
+    )
+    chaves = [datas.rename("data_captura")] + [df[segmento] for segmento in segmentos]
+
+    grupos = df[medidas].groupby(chaves, observed=True, dropna=False)
+    somas = grupos.sum().add_suffix("_soma")
+    quantidades = grupos.count().add_suffix("_n")
+    return pd.concat([grupos.size().rename("n"), somas, quantidades], axis=1).reset_index()
+
+
+class IndiceAcumulado:
+    """Somas acumuladas diárias de um cubo (uma linha por dia x segmento, colunas aditivas).
+
+    `segmentos`: colunas que podem ser filtradas por lista de valores;
+    `colunas`: colunas aditivas acumuladas (ex.: n, valor_liquido_soma, valor_liquido_n).
+    Células sem data só entram nos totais sem limite de período.
+    """
+
+    def __init__(self, cubo, segmentos, colunas):
+        self.colunas = list(colunas)
+        datas = pd.to_datetime(cubo["data_captura"]).dt.normalize()
+        valores = cubo[self.colunas].to_numpy(dtype=np.float64)
+
+        # Um código por combinação de segmentos (valores ausentes formam um segmento próprio)
+        combinacoes = cubo[list(segmentos)].astype(object)
+        codigos, self.segmentos = _fatorar(combinacoes)
+
+        self.inicio = datas.min()
+        ndias = 0 if pd.isna(self.inicio) else (datas.max() - self.inicio).days + 1
+        self.ndias = ndias
+
+        com_data = datas.notna().to_numpy()
+        dias = (datas[com_data] - self.inicio).dt.days.to_numpy() if ndias else np.array([], dtype=int)
+
+        # acumulado[s, k] = soma dos dias anteriores ao dia k do segmento s (acumulado[s, 0] = 0)
+        self._acumulado = np.zeros((len(self.segmentos), ndias + 1, len(self.colunas)))
+        np.add.at(self._acumulado, (codigos[com_data], dias + 1), valores[com_data])
+        np.cumsum(self._acumulado, axis=1, out=self._acumulado)
+
+        self._sem_data = np.zeros((len(self.segmentos), len(self.colunas)))
+        np.add.at(self._sem_data, codigos[~com_data], valores[~com_data])
+
+    def _posicao(self, data, deslocamento=0):
+        """Posição da data no acumulado, limitada ao período coberto pelos dados."""
+        dias = (pd.Timestamp(data).normalize() - self.inicio).days + deslocamento
+        return int(np.clip(dias, 0, self.ndias))
+
+    def _mascara(self, filtros):
+        mascara = np.ones(len(self.segmentos), dtype=bool)
+        for coluna, aceitos in (filtros or {}).items():
+            if aceitos is not None:
+                mascara &= self.segmentos[coluna].isin(aceitos).to_numpy()
+        return mascara
+
+    def totais(self, inicio=None, fim=None, filtros=None):
+        """Totais do período [inicio, fim] (inclusivo; None = sem limite) nos segmentos filtrados.
+
+        `filtros`: {coluna de segmento: valores aceitos} (None = todos). Retorna uma Series com
+        as colunas acumuladas e a média de cada medida que tem soma e contagem.
+        """
+        mascara = self._mascara(filtros)
+        soma = np.zeros(len(self.colunas))
+        if self.ndias:
+            a = 0 if inicio is None else self._posicao(inicio)
+            b = self.ndias if fim is None else self._posicao(fim, 1)
+            if b > a:
+                soma = (self._acumulado[mascara, b] - self._acumulado[mascara, a]).sum(axis=0)
+        if inicio is None and fim is None:
+            soma = soma + self._sem_data[mascara].sum(axis=0)
+        return _com_medias(pd.Series(soma, index=self.colunas))
+
+    def anterior(self, inicio, fim, filtros=None):
+        """Totais do período imediatamente anterior a [inicio, fim], com a mesma quantidade de dias.
+
+        Limites None são os extremos dos dados. Retorna None quando os dados não cobrem o período
+        anterior inteiro (ex.: seleção que começa perto do início do histórico): comparar com uma
+        janela truncada distorceria a variação.
+        """
+        if not self.ndias:
+            return None
+        inicio = self.inicio if inicio is None else pd.Timestamp(inicio).normalize()
+        fim = self.inicio + pd.Timedelta(days=self.ndias - 1) if fim is None else pd.Timestamp(fim).normalize()
+        duracao = fim - inicio + pd.Timedelta(days=1)
+        if inicio - duracao < self.inicio:
+            return None
+        return self.totais(inicio - duracao, inicio - pd.Timedelta(days=1), filtros)
+
+
+def _fatorar(combinacoes):
+    """Código de cada linha e tabela das combinações distintas de segmentos."""
+    if combinacoes.shape[1] == 0:
+        return np.zeros(len(combinacoes), dtype=np.intp), pd.DataFrame(index=range(1))
+    codigos, unicos = pd.MultiIndex.from_frame(combinacoes).factorize()
+    return codigos, unicos.to_frame(index=False, name=list(combinacoes.columns))
+
+
+def _com_medias(totais):
+    for coluna in totais.index:
+        if coluna.endswith("_soma") and f"{coluna[:-5]}_n" in totais.index:
+            n = totais[f"{coluna[:-5]}_n"]
+            totais[f"{coluna[:-5]}_media"] = totais[coluna] / n if n else np.nan
+    return totais
+
+
+def variacao(atual, anteriores, coluna):
+    """Variação percentual de `atual` em relação à `coluna` dos totais do período anterior.
+
+    None quando não há base de comparação (período anterior incompleto ou total zero).
+    """
+    anterior = None if anteriores is None else anteriores[coluna]
+    if not anterior:
+        return None
+    return (atual - anterior) / anterior * 100
@@ -0,0 +1,97 @@
+import hashlib
+import os
+
+import pandas as pd
+
+# O cache colunar depende do pyarrow; sem ele os loaders apenas reprocessam o CSV.
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+    feather = None
+
+# Pasta onde ficam os DataFrames já tratados (formato Arrow IPC/Feather sem compressão)
+PASTA_CACHE = os.path.join("data", ".cache")
+
+# Incrementar sempre que a lógica de tratamento dos loaders mudar
+VERSAO_CACHE = 7
+
+
+def impressao_digital(fontes, versao=VERSAO_CACHE):
+    """Gera uma impressão digital dos arquivos de origem (caminho, tamanho e data de modificação)."""
+    h = hashlib.sha1(f"v{versao}".encode())
+    for caminho in fontes:
+        try:
+            info = os.stat(caminho)
+            h.update(f"{os.path.abspath(caminho)}|{info.st_size}|{info.st_mtime_ns}".encode())
+        except OSError:
+            h.update(f"{os.path.abspath(caminho)}|ausente".encode())
+    return h.hexdigest()[:16]
+
+
+def hash_conteudo(caminho, tamanho_bloco=1 << 20):
+    """Calcula o hash do conteúdo do arquivo (usado para detectar arquivos idênticos)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def ler_arrow(caminho):
+    """Lê o arquivo Arrow via memory-map, sem copiar as colunas numéricas."""
+    fonte = pa.memory_map(caminho, "r")
+    tabela = pa.ipc.open_file(fonte).read_all()
+    return tabela.to_pandas(split_blocks=True)
+
+
+def gravar_arrow(df, caminho):
+    """Grava o DataFrame em Arrow sem compressão (para permitir memory-map) de forma atômica."""
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = caminho + ".tmp"
+    feather.write_feather(df, temporario, compression="uncompressed")
+    os.replace(temporario, caminho)
+
+
+def _gravar(df, caminho, nome):
+    """Grava o DataFrame e remove versões antigas do mesmo cache."""
+    gravar_arrow(df, caminho)
+
+    for arquivo in os.listdir(PASTA_CACHE):
+        antigo = os.path.join(PASTA_CACHE, arquivo)
+        if arquivo.rsplit("-", 1)[0] == nome and antigo != caminho and os.path.isfile(antigo):
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+
+def carregar_com_cache(nome, fontes, construir, versao=VERSAO_CACHE):
+    """Retorna o DataFrame produzido por `construir()`, reaproveitando o cache colunar em disco.
+
+    O cache é invalidado automaticamente quando algum arquivo de `fontes` muda.
+    """
+    if pa is None:
+        return construir()
+
+    caminho = os.path.join(PASTA_CACHE, f"{nome}-{impressao_digital(fontes, versao)}.arrow")
+
+    if os.path.exists(caminho):
+        try:
+            return ler_arrow(caminho)
+        except Exception:
+            # Cache corrompido ou de outra versão do pyarrow: reconstrói a partir do CSV
+            pass
+
+    # Feather exige índice padrão; o mesmo índice é devolvido com ou sem cache
+    df = construir().reset_index(drop=True)
+    if df.empty:
+        return df
+
+    try:
+        _gravar(df, caminho, nome)
+    except Exception:
+        # Falha ao gravar (ex.: disco somente leitura) não impede o dashboard de abrir
+        pass
+    return df
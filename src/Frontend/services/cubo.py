@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+import derivacoes
+
+# Cubo diário das capturas: uma linha por dia x tipo de loja x tipo de cupom com a quantidade
+# de cupons e, para cada medida, soma, soma dos quadrados e quantidade de valores não nulos.
+# Todas as colunas são aditivas: cubos de lotes diferentes são combinados somando, e os
+# gráficos do CFO são respondidos agregando o cubo em vez de percorrer as transações.
+
+DIMENSOES = ["data_captura", "tipo_loja", "tipo_cupom"]
+MEDIDAS = ["valor_compra", "valor_cupom", "valor_liquido", "margem_cupom"]
+
+COLUNAS = ["n"] + [f"{medida}_{sufixo}" for medida in MEDIDAS for sufixo in ("soma", "soma2", "n")]
+
+# Como combinar cubos parciais (usado pelas ingestões em blocos e incremental)
+AGREGACAO = {coluna: "sum" for coluna in COLUNAS}
+
+# Granularidades das séries temporais (frequência do período no pandas) e o maior período, em
+# dias, em que cada uma é escolhida automaticamente; acima do último limite a série é mensal
+GRANULARIDADES = {"dia": "D", "semana": "W", "mes": "M"}
+LIMITES_GRANULARIDADE = [(92, "dia"), (731, "semana")]
+
+
+def construir(df):
+    """Agrega as linhas já tratadas no cubo diário (índice = DIMENSOES)."""
+    chaves = [df[dimensao] for dimensao in DIMENSOES]
+    valores = df[MEDIDAS]
+
+    # dropna=False: capturas sem tipo de loja/cupom continuam contando nos totais
+    grupos = valores.groupby(chaves, observed=True, dropna=False)
+    somas = grupos.sum().add_suffix("_soma")
+    quantidades = grupos.count().add_suffix("_n")
+    quadrados = (valores ** 2).groupby(chaves, observed=True, dropna=False).sum().add_suffix("_soma2")
+
+    cubo = pd.concat([grupos.size().rename("n"), somas, quadrados, quantidades], axis=1)
+    return cubo[COLUNAS]
+
+
+def eh_cubo(df):
+    """Indica se o DataFrame é um cubo (em vez das linhas de capturas)."""
+    return set(DIMENSOES).issubset(df.columns) and set(COLUNAS).issubset(df.columns)
+
+
+def fatiar(cubo, inicio=None, fim=None, tipos_cupom=None, tipos_loja=None):
+    """Aplica os filtros da barra lateral ao cubo (período e listas de tipos; None = todos)."""
+    mascara = np.ones(len(cubo), dtype=bool)
+    if inicio is not None:
+        mascara &= (cubo["data_captura"] >= inicio).to_numpy()
+    if fim is not None:
+        mascara &= (cubo["data_captura"] <= fim).to_numpy()
+    if tipos_cupom is not None:
+        mascara &= cubo["tipo_cupom"].isin(tipos_cupom).to_numpy()
+    if tipos_loja is not None:
+        mascara &= cubo["tipo_loja"].isin(tipos_loja).to_numpy()
+    return cubo[mascara]
+
+
+def totais(cubo):
+    """Totais do cubo (ou de uma fatia): quantidade de cupons e soma, média e quantidade de cada medida."""
+    resultado = cubo[COLUNAS].sum()
+    for medida in MEDIDAS:
+        n = resultado[f"{medida}_n"]
+        resultado[f"{medida}_media"] = resultado[f"{medida}_soma"] / n if n else np.nan
+    return resultado
+
+
+def rolar(cubo, chaves):
+    """Agrega o cubo pelas `chaves` e calcula soma, média, desvio padrão e quantidade de cada medida.
+
+    Aceita também 'dia_semana', derivado da data de cada célula.
+    """
+    chaves = [chaves] if isinstance(chaves, str) else list(chaves)
+    if "dia_semana" in chaves and "dia_semana" not in cubo.columns:
+        cubo = cubo.assign(dia_semana=derivacoes.dia_semana(cubo["data_captura"]))
+
+    resultado = cubo.groupby(chaves, observed=True)[COLUNAS].sum()
+    for medida in MEDIDAS:
+        soma = resultado[f"{medida}_soma"]
+        n = resultado[f"{medida}_n"].where(resultado[f"{medida}_n"] > 0)
+        variancia = (resultado[f"{medida}_soma2"] - soma ** 2 / n) / (n - 1)
+        resultado[f"{medida}_media"] = soma / n
+        resultado[f"{medida}_desvio"] = np.sqrt(variancia.clip(lower=0))
+    return resultado
+
+
+def granularidade_para(inicio, fim):
+    """Granularidade das séries para o período [inicio, fim]: dia até ~3 meses, semana até 2 anos, mês acima."""
+    dias = (pd.Timestamp(fim) - pd.Timestamp(inicio)).days + 1
+    return next((nome for limite, nome in LIMITES_GRANULARIDADE if dias <= limite), "mes")
+
+
+def por_periodo(df, granularidade):
+    """Cubo (ou linhas) com data_captura truncada ao início da semana/mês da `granularidade`.
+
+    Como as colunas do cubo são aditivas, agregar o resultado por data_captura dá o rollup
+    semanal/mensal exato; 'dia' (ou None) devolve o próprio df.
+    """
+    if granularidade in (None, "dia"):
+        return df
+    periodos = df["data_captura"].dt.to_period(GRANULARIDADES[granularidade]).dt.start_time
+    return df.assign(data_captura=periodos)
+
+
+def agregar(df, chaves, medida, funcao="sum"):
+    """Agrega `medida` por `chaves` com soma, média ou contagem, a partir do cubo ou das linhas.
+
+    Retorna uma Series indexada pelas chaves com o nome da medida, como um groupby nas linhas.
+    """
+    if not eh_cubo(df):
+        return df.groupby(chaves, observed=True)[medida].agg(funcao)
+
+    coluna = {"sum": "soma", "mean": "media", "count": "n", "std": "desvio"}[funcao]
+    return rolar(df, chaves)[f"{medida}_{coluna}"].rename(medida)
@@ -0,0 +1,645 @@
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+import acumulados
+import cache_colunar
+import cubo
+import derivacoes
+import espacial
+import esquema
+import ingestao_streaming
+from acumulados import IndiceAcumulado
+from espacial import IndiceEspacial
+from filtros import IndiceFiltros, intersectar
+from ingestao_incremental import IngestorIncremental
+from limpeza import CELULAR_AUSENTE, codificar_celular, converter_moeda_br, normalizar_coordenadas
+
+# Camada única de acesso aos dados: todas as páginas importam este módulo, então cada
+# base é lida uma vez por processo e a entrada do st.cache_data é compartilhada.
+
+DATA_DIR = "data"
+
+ARQUIVO_CFO = os.path.join(DATA_DIR, "Analise-CFO.csv")
+# Novas exportações de capturas (ex.: Analise-CFO-2025-11.csv) são incorporadas incrementalmente
+PADRAO_CAPTURAS = os.path.join(DATA_DIR, "Analise-CFO*.csv")
+ARQUIVO_CEO = os.path.join(DATA_DIR, "Analise-CEO.csv")
+ARQUIVO_DEMOGRAFICO = os.path.join(DATA_DIR, "cupons_capturados-limpo.csv")
+ARQUIVO_TESTE_EM_MASSA = os.path.join(DATA_DIR, "teste_em_massa-limpo.csv")
+
+# Colunas monetárias lidas como texto e convertidas pelo parser pt-BR
+COLUNAS_MOEDA_CFO = ['valor_compra', 'valor_cupom']
+COLUNAS_MOEDA_CEO = ['ultimo_valor_capturado']
+
+# Acima deste tamanho a página inicial usa apenas os agregados calculados em blocos
+LIMITE_STREAMING_BYTES = 512 * 1024 ** 2
+
+# Arquivos de base de parcerias (que contêm a categoria)
+ARQUIVOS_BASE = [
+    "base_paulista-limpo.csv",
+    "base_players-limpo.csv",
+    "cupons_capturados-limpo.csv",
+    "teste_em_massa-limpo.csv",
+]
+# As capturas do CFO usadas nas parcerias vêm do ingestor incremental (versão em versao_cfo())
+FONTES_PARCERIAS = [os.path.join(DATA_DIR, arquivo) for arquivo in ARQUIVOS_BASE]
+
+# Colunas indexadas para os filtros da barra lateral de cada página
+FILTROS_CFO = {"valores": ("tipo_cupom", "tipo_loja"), "intervalos": ("data_captura",)}
+FILTROS_PARCERIAS = {"valores": ("nome_loja",), "intervalos": ("data_captura",)}
+
+
+# --- Funções de Tratamento ---
+
+def _converter_colunas_moeda(df, colunas, arquivo):
+    """Converte as colunas monetárias e avisa quantos valores foram rejeitados."""
+    for coluna in colunas:
+        if coluna in df.columns:
+            df[coluna], rejeitados = converter_moeda_br(df[coluna])
+            if len(rejeitados) > 0:
+                exemplos = ", ".join(repr(valor) for valor in rejeitados.head(3))
+                st.warning(
+                    f"Aviso: {len(rejeitados)} valores inválidos em '{coluna}' ({arquivo}) foram ignorados. Exemplos: {exemplos}"
+                )
+    return df
+
+
+def _tratar_cfo(df):
+    """Aplica tipos e colunas derivadas à base de capturas do CFO."""
+    # Tratamento de colunas numéricas
+    df = _converter_colunas_moeda(df, COLUNAS_MOEDA_CFO, ARQUIVO_CFO)
+
+    # Tratamento de datas
+    if 'data_captura' in df.columns:
+        df['data_captura'] = pd.to_datetime(df['data_captura'], format='%d/%m/%Y', errors='coerce')
+        df = df.dropna(subset=['data_captura'])
+
+    # Coordenadas de captura vêm com separadores de milhar (ex.: -23.563.850.985.754.000)
+    for coluna in ['latitude', 'longitude']:
+        if coluna in df.columns:
+            df[coluna] = normalizar_coordenadas(df[coluna])
+
+    # Chave inteira do celular para a junção com a base demográfica
+    if 'numero_celular' in df.columns:
+        df['chave_celular'] = codificar_celular(df['numero_celular'])
+
+    # mes_ano, dia_semana, valor_liquido e margem_cupom
+    df = derivacoes.derivar(df)
+
+    return esquema.aplicar(df)
+
+
+def _ler_base(caminho):
+    """Lê uma base demográfica/categoria (separada por vírgula, UTF-8 com BOM)."""
+    return pd.read_csv(caminho, sep=',', decimal='.', encoding='utf-8-sig')
+
+
+def _agrupar_arquivos_identicos(caminhos):
+    """Agrupa os arquivos pelo hash do conteúdo: {hash: [caminhos com esse conteúdo]}."""
+    grupos = {}
+    for caminho in caminhos:
+        grupos.setdefault(cache_colunar.hash_conteudo(caminho), []).append(caminho)
+    return grupos
+
+
+def _deduplicar_linhas(df, coluna_origem="origem"):
+    """Remove linhas repetidas entre bases diferentes, juntando as origens em uma única linha.
+
+    Repetições dentro de uma mesma base são registros legítimos e são mantidas: a n-ésima
+    ocorrência de uma linha em uma base só é combinada com a n-ésima ocorrência nas outras.
+    """
+    colunas = [coluna for coluna in df.columns if coluna != coluna_origem]
+    hash_linha = pd.util.hash_pandas_object(df[colunas], index=False)
+    ocorrencia = hash_linha.groupby([df[coluna_origem], hash_linha]).cumcount()
+    chave = pd.DataFrame({"hash": hash_linha.to_numpy(), "ocorrencia": ocorrencia.to_numpy()})
+
+    repetida = chave.duplicated(keep=False).to_numpy()
+    if not repetida.any():
+        return df
+
+    # Junta as origens apenas das linhas que aparecem em mais de uma base
+    origens = (
+        df.loc[repetida, coluna_origem]
+        .groupby([chave.loc[repetida, "hash"].to_numpy(), chave.loc[repetida, "ocorrencia"].to_numpy()])
+        .agg(lambda tags: ", ".join(dict.fromkeys(tags)))
+    )
+    primeira = ~chave.duplicated(keep="first").to_numpy()
+    df = df[primeira].copy()
+    indice = pd.MultiIndex.from_frame(chave[primeira])
+    combinada = indice.isin(origens.index)
+    df.loc[combinada, coluna_origem] = origens.reindex(indice[combinada]).to_numpy()
+    return df.reset_index(drop=True)
+
+
+# --- Funções de Carregamento ---
+
+def cfo_excede_memoria():
+    """Indica se o CSV do CFO é grande demais para ser carregado linha a linha na página inicial."""
+    try:
+        return os.path.getsize(ARQUIVO_CFO) > LIMITE_STREAMING_BYTES
+    except OSError:
+        return False
+
+
+@st.cache_data(max_entries=1)
+def _agregados_cfo_em_blocos(versao):
+    calculados = {}
+
+    def construir(nome):
+        if not calculados:
+            calculados.update(ingestao_streaming.agregar_csv_em_blocos(
+                ARQUIVO_CFO, _tratar_cfo, sep=';', encoding='utf-8',
+                dtype={coluna: str for coluna in COLUNAS_MOEDA_CFO}))
+        return calculados[nome]
+
+    try:
+        return {
+            nome: cache_colunar.carregar_com_cache(
+                f"cfo_agregado_{nome}", [ARQUIVO_CFO], lambda nome=nome: construir(nome))
+            for nome in ingestao_streaming.AGREGADOS
+        }
+    except Exception as e:
+        st.error(f"Erro ao agregar o arquivo {ARQUIVO_CFO} em blocos: {e}")
+        return {nome: pd.DataFrame() for nome in ingestao_streaming.AGREGADOS}
+
+
+def carregar_agregados_cfo():
+    """Lê o CSV do CFO em blocos e devolve os agregados diário, por segmento e por usuário,
+    junto com a impressão digital do arquivo que os gerou.
+
+    Cada agregado também fica no cache colunar em disco; o CSV só é percorrido de novo
+    quando muda.
+    """
+    versao = cache_colunar.impressao_digital([ARQUIVO_CFO])
+    return _agregados_cfo_em_blocos(versao), versao
+
+
+@st.cache_data
+def carregar_demografia():
+    """Carrega os dados demográficos com a chave inteira do celular."""
+    def construir():
+        df = _ler_base(ARQUIVO_DEMOGRAFICO)
+        if 'celular' in df.columns:
+            df = df.rename(columns={'celular': 'numero_celular'})
+        if 'numero_celular' in df.columns:
+            df['chave_celular'] = codificar_celular(df['numero_celular'])
+        return esquema.aplicar(df)
+
+    try:
+        return cache_colunar.carregar_com_cache("demografia", [ARQUIVO_DEMOGRAFICO], construir)
+    except Exception as e:
+        st.error(f"Erro ao carregar ou processar o arquivo {ARQUIVO_DEMOGRAFICO}: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_resource(max_entries=1)
+def _dimensao_usuarios(impressao):
+    """Dimensão de usuários: uma linha por celular da base demográfica, indexada pela chave.
+
+    `impressao` identifica a versão do arquivo demográfico (uma nova entrada a cada mudança).
+    Retorna (índice das chaves, atributos na mesma ordem, quantidade de celulares repetidos).
+    """
+    df_dem = carregar_demografia()
+    if df_dem.empty or 'chave_celular' not in df_dem.columns:
+        return pd.Index([], dtype='int64'), pd.DataFrame(), 0
+
+    df_dem = df_dem[df_dem['chave_celular'] != CELULAR_AUSENTE]
+    repetido = df_dem['chave_celular'].duplicated()
+    df_dem = df_dem[~repetido]
+    indice = pd.Index(df_dem['chave_celular'].to_numpy())
+    atributos = df_dem.drop(columns=['chave_celular', 'numero_celular'], errors='ignore').reset_index(drop=True)
+    return indice, atributos, int(repetido.sum())
+
+
+def _dimensao_atual():
+    return _dimensao_usuarios(cache_colunar.impressao_digital([ARQUIVO_DEMOGRAFICO]))
+
+
+def _juntar_demografia(df_fatos):
+    """Anexa os atributos demográficos a cada captura pela chave do celular (junção N:1)."""
+    indice, atributos, repetidos = _dimensao_atual()
+    if repetidos:
+        st.warning(
+            f"Aviso: {repetidos} celulares aparecem mais de uma vez em {ARQUIVO_DEMOGRAFICO}. "
+            "Foi usada a primeira ocorrência de cada um para não multiplicar as capturas."
+        )
+
+    # Posição de cada captura na dimensão (-1 sem correspondência, que vira linha vazia no reindex)
+    posicoes = indice.get_indexer(df_fatos['chave_celular'].to_numpy())
+    df_fatos = df_fatos.reset_index(drop=True)
+    colunas = atributos.columns.difference(df_fatos.columns, sort=False)
+    return pd.concat([df_fatos, atributos[colunas].reindex(posicoes).reset_index(drop=True)], axis=1)
+
+
+def _construir_cfo_merged(df_bruto):
+    """Trata um lote bruto de capturas e o combina com os dados demográficos."""
+    df_merged = _juntar_demografia(_tratar_cfo(df_bruto))
+    # faixa_etaria a partir da idade vinda da base demográfica
+    return esquema.aplicar(derivacoes.derivar(df_merged))
+
+
+@st.cache_resource
+def _ingestor_cfo():
+    """Ingestor único por processo das capturas do CFO combinadas com a demografia."""
+    return IngestorIncremental(
+        "cfo_merged", PADRAO_CAPTURAS, _construir_cfo_merged,
+        dependencias=[ARQUIVO_DEMOGRAFICO],
+        opcoes_csv={"sep": ';', "encoding": 'utf-8', "dtype": {coluna: str for coluna in COLUNAS_MOEDA_CFO}},
+    )
+
+
+def carregar_cfo_merged(forcar=False):
+    """Combina as capturas do CFO com os dados demográficos e calcula as métricas financeiras.
+
+    Linhas acrescentadas aos CSVs de capturas (ou novos arquivos Analise-CFO*.csv) são lidas
+    e anexadas sem reprocessar o restante; `forcar` ignora o intervalo entre verificações.
+    O DataFrame é compartilhado entre as sessões e não deve ser alterado in-place.
+    """
+    if _dimensao_atual()[1].empty:
+        return pd.DataFrame()
+    try:
+        ingestor = _ingestor_cfo()
+        ingestor.atualizar(forcar)
+        return ingestor.df
+    except Exception as e:
+        st.error(f"Erro ao combinar os dados do CFO: {e}")
+        return pd.DataFrame()
+
+
+def capturas_cfo():
+    """Capturas do CFO (o DataFrame do ingestor, sem cópia) e a versão correspondente, lidas juntas.
+
+    Parcerias, distâncias e lojas derivam deste mesmo DataFrame: o CSV é lido uma única vez por
+    processo e as linhas acrescentadas chegam a todos os consumidores com a nova versão.
+    """
+    if carregar_cfo_merged().empty:
+        return pd.DataFrame(), versao_cfo()
+    df, _, versao = _ingestor_cfo().instantaneo()
+    return df, versao
+
+
+def _com_versao_cfo(versao):
+    """Versão do cache colunar em disco para bases derivadas das capturas do ingestor."""
+    return f"{cache_colunar.VERSAO_CACHE}-{versao}"
+
+
+def carregar_cfo_indexado(forcar=False):
+    """Capturas do CFO, índice de filtros, cubo diário (ver cubo.py) e versão, todos do mesmo
+    instantâneo do ingestor.
+
+    A versão é a chave dos gráficos em cache: lida à parte, um lote incorporado por outra
+    sessão entre as leituras guardaria figuras de um lote sob a versão do outro.
+    """
+    if carregar_cfo_merged(forcar).empty:
+        return pd.DataFrame(), None, pd.DataFrame(), versao_cfo()
+    df, agregados, versao = _ingestor_cfo().instantaneo()
+    indice = _indice_filtros("cfo", versao, df, FILTROS_CFO["valores"], FILTROS_CFO["intervalos"])
+    return df, indice, agregados.get("cubo", pd.DataFrame()), versao
+
+
+def versao_cfo():
+    """Identificador dos dados do CFO carregados (muda a cada lote novo incorporado)."""
+    return _ingestor_cfo().versao
+
+
+def cubo_cfo_resumo():
+    """Cubo do CFO usado nos resumos (Home) e sua versão, lidos do mesmo instantâneo.
+
+    Para exportações maiores que a memória o cubo vem da leitura do CSV em blocos.
+    """
+    if cfo_excede_memoria():
+        agregados, versao = carregar_agregados_cfo()
+        return agregados["cubo"], versao
+    if carregar_cfo_merged().empty:
+        return pd.DataFrame(), versao_cfo()
+    _, agregados, versao = _ingestor_cfo().instantaneo()
+    return agregados.get("cubo", pd.DataFrame()), versao
+
+
+def bases_ceo():
+    """Usuários do CEO, categorias (teste em massa) e a versão das duas bases, lidos juntos.
+
+    Cada base é lida pela impressão digital do seu arquivo e a versão é composta dessas mesmas
+    impressões, então os gráficos guardados sob ela correspondem aos DataFrames devolvidos.
+    """
+    versao_usuarios = cache_colunar.impressao_digital([ARQUIVO_CEO])
+    versao_categorias = cache_colunar.impressao_digital([ARQUIVO_TESTE_EM_MASSA])
+    return (
+        _carregar_ceo(versao_usuarios),
+        _carregar_teste_em_massa(versao_categorias),
+        f"{versao_usuarios}-{versao_categorias}",
+    )
+
+
+def carregar_ceo():
+    """Carrega a base de usuários do CEO com as coordenadas corrigidas."""
+    return _carregar_ceo(cache_colunar.impressao_digital([ARQUIVO_CEO]))
+
+
+@st.cache_data(max_entries=1)
+def _carregar_ceo(versao):
+    def construir():
+        df = pd.read_csv(ARQUIVO_CEO, sep=';', dtype={coluna: str for coluna in COLUNAS_MOEDA_CEO})
+        df = _converter_colunas_moeda(df, COLUNAS_MOEDA_CEO, ARQUIVO_CEO)
+        if {'latitude', 'longitude'}.issubset(df.columns):
+            df['latitude'] = normalizar_coordenadas(df['latitude'])
+            df['longitude'] = normalizar_coordenadas(df['longitude'])
+        return esquema.aplicar(derivacoes.derivar(df))
+
+    try:
+        return cache_colunar.carregar_com_cache("ceo", [ARQUIVO_CEO], construir)
+    except Exception as e:
+        st.error(f"Erro ao carregar dados do CEO: {e}")
+        return pd.DataFrame()
+
+
+def carregar_distancias(df_cfo, versao):
+    """Distância (metros) entre a localização do usuário na base do CEO e o local de cada
+    captura do CFO, com nome_loja, tipo_loja e tipo_cupom da captura.
+
+    As linhas são as de `df_cfo` (capturas na `versao` do ingestor; NaN para celulares fora da
+    base do CEO) e ficam no cache colunar, recalculadas só quando uma das bases muda.
+    """
+    def construir():
+        df_ceo = carregar_ceo()
+        distancias = pd.DataFrame({
+            coluna: df_cfo[coluna] for coluna in ["nome_loja", "tipo_loja", "tipo_cupom"] if coluna in df_cfo.columns
+        })
+
+        distancias["distancia_metros"] = np.nan
+        if not ({"celular", "latitude", "longitude"}.issubset(df_ceo.columns)
+                and {"chave_celular", "latitude", "longitude"}.issubset(df_cfo.columns)):
+            return esquema.aplicar(distancias)
+
+        # Localização de cada usuário do CEO (primeira ocorrência de cada celular)
+        chaves_ceo = codificar_celular(df_ceo["celular"]).to_numpy()
+        unicos = ~pd.Index(chaves_ceo).duplicated() & (chaves_ceo != CELULAR_AUSENTE)
+        indice = pd.Index(chaves_ceo[unicos])
+        lat_usuario = df_ceo["latitude"].to_numpy(dtype=float, na_value=np.nan)[unicos]
+        lon_usuario = df_ceo["longitude"].to_numpy(dtype=float, na_value=np.nan)[unicos]
+
+        # Usuário de cada captura (-1 sem correspondência) e distâncias em lote
+        usuarios = indice.get_indexer(df_cfo["chave_celular"].to_numpy())
+        encontrados = usuarios >= 0
+        distancias.loc[encontrados, "distancia_metros"] = espacial.distancias_em_blocos(
+            lat_usuario[usuarios[encontrados]], lon_usuario[usuarios[encontrados]],
+            df_cfo["latitude"].to_numpy(dtype=float, na_value=np.nan)[encontrados],
+            df_cfo["longitude"].to_numpy(dtype=float, na_value=np.nan)[encontrados],
+        )
+        return esquema.aplicar(distancias)
+
+    try:
+        return cache_colunar.carregar_com_cache(
+            "distancias_cfo", [ARQUIVO_CEO], construir, versao=_com_versao_cfo(versao))
+    except Exception as e:
+        st.error(f"Erro ao calcular as distâncias entre usuários e capturas: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(max_entries=8)
+def _resumo_distancias(versao, grupo, versao_capturas, _df_cfo):
+    df = carregar_distancias(_df_cfo, versao_capturas)
+    if df.empty or grupo not in df.columns:
+        return pd.DataFrame()
+    return espacial.resumir_distancias(df, grupo)
+
+
+def resumo_distancias(grupo):
+    """Distribuição das distâncias usuário -> captura por `grupo` (nome_loja, tipo_loja ou tipo_cupom)
+    e a versão das bases usadas (capturas do CFO e usuários do CEO)."""
+    df_cfo, versao_capturas = capturas_cfo()
+    versao = f"{versao_capturas}-{cache_colunar.impressao_digital([ARQUIVO_CEO])}"
+    return _resumo_distancias(versao, grupo, versao_capturas, df_cfo), versao
+
+
+def carregar_teste_em_massa():
+    """Carrega a base de categorias frequentadas (teste em massa)."""
+    return _carregar_teste_em_massa(cache_colunar.impressao_digital([ARQUIVO_TESTE_EM_MASSA]))
+
+
+@st.cache_data(max_entries=1)
+def _carregar_teste_em_massa(versao):
+    try:
+        return cache_colunar.carregar_com_cache(
+            "teste_em_massa", [ARQUIVO_TESTE_EM_MASSA], lambda: esquema.aplicar(_ler_base(ARQUIVO_TESTE_EM_MASSA)))
+    except Exception as e:
+        st.error(f"Erro ao carregar ou processar o arquivo {ARQUIVO_TESTE_EM_MASSA}: {e}")
+        return pd.DataFrame()
+
+
+def carregar_parcerias():
+    """Consolida as bases de parcerias e anexa os valores financeiros e o nome da loja do CFO.
+
+    Devolve também a versão (bases de categoria e capturas do mesmo instantâneo do ingestor).
+    """
+    df_cfo, versao = capturas_cfo()
+    return _parcerias(versao, df_cfo), f"{cache_colunar.impressao_digital(FONTES_PARCERIAS)}-{versao}"
+
+
+@st.cache_data(max_entries=1)
+def _parcerias(versao, _df_cfo):
+    df_cfo = _df_cfo
+
+    def construir():
+        # --- 1. Consolidar Bases de Parcerias ---
+        caminhos = []
+        for arquivo in ARQUIVOS_BASE:
+            caminho = os.path.join(DATA_DIR, arquivo)
+            if os.path.exists(caminho):
+                caminhos.append(caminho)
+            else:
+                st.warning(
+                    f"Aviso: Erro ao carregar base de categoria {arquivo}. Pode estar faltando."
+                )
+
+        # Arquivos com conteúdo idêntico são lidos uma única vez; a coluna 'origem'
+        # registra todas as bases de onde a linha veio.
+        dfs_parcerias = []
+        for grupo in _agrupar_arquivos_identicos(caminhos).values():
+            try:
+                df = _ler_base(grupo[0])
+                df["origem"] = ", ".join(
+                    os.path.basename(caminho).replace("-limpo.csv", "") for caminho in grupo
+                )
+                dfs_parcerias.append(df)
+            except Exception as e:
+                st.warning(
+                    f"Aviso: Erro ao carregar base de categoria {os.path.basename(grupo[0])}. Erro: {e}"
+                )
+
+        if not dfs_parcerias:
+            return pd.DataFrame()
+        df_consolidado = pd.concat(dfs_parcerias, ignore_index=True)
+        if len(dfs_parcerias) > 1:
+            df_consolidado = _deduplicar_linhas(df_consolidado)
+
+        # --- 2. Juntar os Dados Financeiros do CFO pelo Índice (Sem Chave Comum) ---
+        colunas_valor = ["nome_loja", "valor_cupom", "valor_liquido", "valor_compra"]
+
+        if df_cfo.empty:
+            st.warning(
+                f"Aviso: Não foi possível carregar o arquivo {ARQUIVO_CFO}. Valores financeiros e nome da loja serão zero/vazios."
+            )
+            df_cfo_valores = pd.DataFrame(columns=colunas_valor)
+        elif "nome_loja" not in df_cfo.columns:
+            st.error(
+                "Erro: A coluna 'nome_loja' não foi encontrada no arquivo Analise-CFO.csv."
+            )
+            return pd.DataFrame()  # Retorna vazio para parar o dashboard
+        else:
+            df_cfo_valores = df_cfo[colunas_valor]
+
+        # Assumimos que os registros de categoria e os do CFO estão na mesma ordem;
+        # as linhas sem correspondente no CFO ficam com loja desconhecida e valores zerados.
+        df_valores = df_cfo_valores.iloc[: len(df_consolidado)].reset_index(drop=True)
+        df_valores = df_valores.reindex(range(len(df_consolidado)))
+        df_consolidado["nome_loja"] = df_valores["nome_loja"].astype(object).fillna("Loja Desconhecida")
+        for coluna in ["valor_cupom", "valor_liquido", "valor_compra"]:
+            df_consolidado[coluna] = df_valores[coluna].astype(float).fillna(0.0)
+
+        # --- 3. Garantir Colunas Mínimas e Tipos ---
+
+        # Garantir que a coluna 'celular' exista para a contagem de transações (usando 'origem' como fallback)
+        if "celular" not in df_consolidado.columns:
+            df_consolidado["celular"] = df_consolidado["origem"]
+
+        # Garantir que a coluna 'margem_cupom' exista para os gráficos
+        if "margem_cupom" not in df_consolidado.columns:
+            df_consolidado["margem_cupom"] = 0.0
+
+        # Tratamento de datas
+        if "data_captura" in df_consolidado.columns:
+            df_consolidado["data_captura"] = pd.to_datetime(
+                df_consolidado["data_captura"], errors="coerce"
+            )
+            df_consolidado = df_consolidado.dropna(subset=["data_captura"])
+
+        return esquema.aplicar(derivacoes.derivar(df_consolidado))
+
+    return cache_colunar.carregar_com_cache("parcerias", FONTES_PARCERIAS, construir, versao=_com_versao_cfo(versao))
+
+
+# --- Índices de Filtros ---
+
+@st.cache_resource(max_entries=4)
+def _indice_filtros(nome, versao, _df, colunas_valores, colunas_intervalo):
+    """Índice de filtros por base e versão dos dados (o DataFrame não entra na chave do cache)."""
+    return IndiceFiltros(_df, colunas_valores, colunas_intervalo)
+
+
+def indice_filtros_ceo(df_ceo, versao, colunas_valores, colunas_intervalo=("idade",)):
+    """Índice dos filtros da página do CEO (as colunas de gênero/cidade variam conforme a base)."""
+    return _indice_filtros("ceo", versao, df_ceo, tuple(colunas_valores), tuple(colunas_intervalo))
+
+
+def indice_filtros_parcerias(df_parcerias, versao):
+    """Índice dos filtros da página de parcerias."""
+    return _indice_filtros(
+        "parcerias", versao, df_parcerias, FILTROS_PARCERIAS["valores"], FILTROS_PARCERIAS["intervalos"]
+    )
+
+
+# --- Índices Espaciais (filtro de área do mapa e área de influência das lojas) ---
+
+@st.cache_resource(max_entries=4)
+def _indice_espacial(nome, versao, _df):
+    """Índice espacial por base e versão dos dados (o DataFrame não entra na chave do cache)."""
+    return IndiceEspacial(_df)
+
+
+def indice_espacial_ceo(df_ceo, versao):
+    """Índice espacial das coordenadas dos usuários do CEO."""
+    return _indice_espacial("ceo", versao, df_ceo)
+
+
+def versao_capturas():
+    """Identificador das capturas do CFO usadas nas consultas espaciais (versão do ingestor)."""
+    return versao_cfo()
+
+
+@st.cache_data(max_entries=1)
+def _lojas(versao):
+    # O DataFrame é obtido aqui dentro: como argumento, seria lido a cada rerun antes da chave
+    _df_cfo, _ = capturas_cfo()
+    if not {"nome_loja", "latitude", "longitude"}.issubset(_df_cfo.columns):
+        return pd.DataFrame(columns=["nome_loja", "endereco_loja", "latitude", "longitude"])
+    chaves = [coluna for coluna in ["nome_loja", "endereco_loja"] if coluna in _df_cfo.columns]
+    return _df_cfo.groupby(chaves, observed=True)[["latitude", "longitude"]].median().dropna().reset_index()
+
+
+def lojas_parcerias():
+    """Lojas parceiras (nome e endereço) com a localização estimada pela mediana das coordenadas
+    das suas capturas (a base não traz o endereço geocodificado)."""
+    return _lojas(versao_capturas())
+
+
+def indice_espacial_lojas():
+    """Índice espacial das lojas parceiras (mesma ordem de linhas de lojas_parcerias())."""
+    return _indice_espacial("lojas", versao_capturas(), lojas_parcerias())
+
+
+def dispersao_lojas():
+    """Distância (metros) entre os cantos do retângulo que contém as localizações estimadas das lojas."""
+    limites = indice_espacial_lojas().limites
+    if limites is None:
+        return 0.0
+    lat_min, lat_max, lon_min, lon_max = limites
+    return float(espacial.distancia_metros(lat_min, lon_min, lat_max, lon_max))
+
+
+@st.cache_data(max_entries=8)
+def _area_de_influencia(versao, raio_metros, linhas):
+    _df_cfo, _ = capturas_cfo()
+    lojas = _lojas(versao)
+    indice = _indice_espacial("capturas", versao, _df_cfo)
+    usuarios = _df_cfo["chave_celular"].to_numpy() if "chave_celular" in _df_cfo.columns else None
+    receita = _df_cfo["valor_liquido"].to_numpy(dtype=float, na_value=0.0)
+
+    capturas, distintos, receitas = [], [], []
+    for lat, lon in zip(lojas["latitude"], lojas["longitude"]):
+        posicoes = intersectar(indice.no_raio(lat, lon, raio_metros), linhas)
+        capturas.append(len(posicoes))
+        distintos.append(len(pd.unique(usuarios[posicoes])) if usuarios is not None else 0)
+        receitas.append(receita[posicoes].sum())
+    lojas["capturas_no_raio"] = capturas
+    lojas["usuarios_no_raio"] = distintos
+    lojas["receita_liquida_no_raio"] = receitas
+    return lojas
+
+
+def area_de_influencia(raio_metros, linhas=None):
+    """Área de influência de cada loja: capturas, usuários distintos e receita líquida das
+    capturas a até `raio_metros` da loja (consultas pelo índice espacial das capturas).
+
+    `linhas` restringe a contagem às capturas selecionadas pelos filtros da página (posições
+    em ordem; None = todas). As linhas de carregar_parcerias() estão na mesma posição das
+    capturas correspondentes, então a seleção da página de parcerias pode ser passada direto.
+    """
+    return _area_de_influencia(versao_capturas(), raio_metros, linhas)
+
+
+# --- Índices Acumulados (cartões de KPI) ---
+
+@st.cache_resource(max_entries=1)
+def _acumulado_cfo(versao, _cubo_cfo):
+    return IndiceAcumulado(_cubo_cfo, cubo.DIMENSOES[1:], cubo.COLUNAS)
+
+
+def acumulado_cfo(cubo_diario, versao):
+    """Índice acumulado do cubo do CFO (dia x tipo de loja x tipo de cupom); ver acumulados.py."""
+    return _acumulado_cfo(versao, cubo_diario)
+
+
+@st.cache_resource(max_entries=1)
+def _acumulado_parcerias(versao, _df_parcerias):
+    medidas = ["valor_liquido", "valor_cupom", "valor_compra"]
+    colunas = ["n"] + [f"{medida}_{sufixo}" for medida in medidas for sufixo in ("soma", "n")]
+    cubo_diario = acumulados.cubo_diario(_df_parcerias, ["nome_loja"], medidas)
+    return IndiceAcumulado(cubo_diario, ["nome_loja"], colunas)
+
+
+def acumulado_parcerias(df_parcerias, versao):
+    """Índice acumulado das parcerias por dia x loja (receita, desconto, compras e transações)."""
+    return _acumulado_parcerias(versao, df_parcerias)
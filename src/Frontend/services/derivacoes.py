@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+# Colunas derivadas materializadas uma única vez no carregamento (e gravadas no cache colunar),
+# para que páginas e gráficos não repitam conversões de data/hora a cada interação.
+
+# Dias da semana em português, na ordem de dt.dayofweek (0 = segunda-feira)
+DIAS_SEMANA = [
+    "Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado", "Domingo",
+]
+TIPO_DIA_SEMANA = pd.CategoricalDtype(DIAS_SEMANA, ordered=True)
+
+# Faixas etárias (intervalos fechados à esquerda)
+LIMITES_FAIXA_ETARIA = [0, 20, 30, 40, 50, 60, 200]
+FAIXAS_ETARIAS = ["15–20", "21–30", "31–40", "41–50", "51–60", "60+"]
+
+
+def dia_semana(datas):
+    """Nome do dia da semana em português, sem depender do locale do sistema."""
+    codigos = datas.dt.dayofweek.fillna(-1).astype(np.int8)
+    return pd.Series(pd.Categorical.from_codes(codigos, dtype=TIPO_DIA_SEMANA), index=datas.index)
+
+
+def minuto_do_dia(horarios):
+    """Converte horários (HH:MM:SS) em minutos desde a meia-noite; inválidos viram NaN."""
+    horas = pd.to_datetime(horarios, format="%H:%M:%S", errors="coerce")
+    falhou = horas.isna() & horarios.notna()
+    if falhou.any():
+        horas[falhou] = pd.to_datetime(horarios[falhou], errors="coerce")
+    minutos = horas.dt.hour * 60 + horas.dt.minute + horas.dt.second / 60
+    return minutos.astype(np.float32)
+
+
+def minutos_de(horario):
+    """Minutos desde a meia-noite de um datetime.time (mesma escala da coluna minuto_dia)."""
+    return horario.hour * 60 + horario.minute + horario.second / 60
+
+
+def faixa_etaria(idades):
+    """Faixa etária categórica ordenada a partir da idade."""
+    return pd.cut(idades, bins=LIMITES_FAIXA_ETARIA, labels=FAIXAS_ETARIAS, right=False)
+
+
+def margem_cupom(valor_cupom, valor_compra):
+    """Percentual do desconto sobre a compra, limitado a 100% (0/0 também conta como 100%)."""
+    margem = (valor_cupom / valor_compra) * 100
+    return margem.where(margem <= 100, 100.0)
+
+
+def derivar(df):
+    """Acrescenta ao DataFrame as colunas derivadas possíveis a partir das colunas presentes.
+
+    Colunas que já existem (ex.: valor_liquido vindo do CFO nas parcerias) não são recalculadas.
+      - data_captura -> mes_ano (período mensal) e dia_semana (categórico ordenado)
+      - horario -> minuto_dia e hora
+      - idade -> faixa_etaria
+      - valor_compra e valor_cupom -> valor_liquido e margem_cupom
+    """
+    def faltando(coluna, *origens):
+        return coluna not in df.columns and set(origens).issubset(df.columns)
+
+    if faltando("mes_ano", "data_captura"):
+        df["mes_ano"] = df["data_captura"].dt.to_period("M")
+    if faltando("dia_semana", "data_captura"):
+        df["dia_semana"] = dia_semana(df["data_captura"])
+
+    if faltando("minuto_dia", "horario"):
+        df["minuto_dia"] = minuto_do_dia(df["horario"])
+    if faltando("hora", "minuto_dia"):
+        df["hora"] = np.floor(df["minuto_dia"] / 60)
+
+    if faltando("faixa_etaria", "idade"):
+        df["faixa_etaria"] = faixa_etaria(df["idade"])
+
+    if faltando("valor_liquido", "valor_compra", "valor_cupom"):
+        df["valor_liquido"] = df["valor_compra"] - df["valor_cupom"]
+    if faltando("margem_cupom", "valor_compra", "valor_cupom"):
+        df["margem_cupom"] = margem_cupom(df["valor_cupom"], df["valor_compra"])
+
+    return df
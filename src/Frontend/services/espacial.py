@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+# Agregação espacial dos mapas no servidor: acima de LIMITE_PONTOS, em vez de enviar uma
+# coordenada por usuário (e deixar o navegador agrupar os pontos), as coordenadas são
+# encaixadas em uma grade com células do tamanho de alguns pixels no zoom do mapa e o mapa
+# recebe um marcador por célula, com a contagem e a composição por categoria. Os mapas de calor
+# recebem o mesmo tipo de grade, mais fina (raster), com a contagem como peso de cada célula.
+# Consultas por área (filtro de área do mapa) e por raio (área de influência das lojas) usam
+# o IndiceEspacial, uma grade em metros construída uma vez por versão dos dados; as distâncias
+# usuário -> captura são calculadas em lote (distancias_em_blocos).
+
+# Até este número de pontos o mapa recebe os pontos individuais (scattermapbox, em WebGL)
+LIMITE_PONTOS = 20_000
+# Lado das células da grade, em pixels de tela no zoom do mapa
+PIXELS_CELULA = 24
+# Lado das células do raster dos mapas de calor (bem menor que o raio da mancha de calor)
+PIXELS_RASTER = 8
+# Lado de um tile do mapa (Web Mercator) em pixels
+PIXELS_TILE = 256
+
+# Raio médio da Terra (metros), usado nas distâncias haversine
+RAIO_TERRA = 6_371_000.0
+# Lado das células do índice espacial (IndiceEspacial), em metros
+LADO_CELULA_INDICE = 250
+# Pares por bloco no cálculo das distâncias em lote (limita a memória dos arrays temporários)
+BLOCO_DISTANCIAS = 1_000_000
+
+
+def tamanho_celula(zoom, latitude=0.0, pixels=PIXELS_CELULA):
+    """Lados (graus de latitude, graus de longitude) de uma célula de `pixels` no `zoom`.
+
+    Na projeção Web Mercator um grau de latitude ocupa 1/cos(latitude) vezes mais pixels que
+    um de longitude; a célula em latitude é reduzida na mesma proporção para ficar quadrada.
+    """
+    graus_longitude = 360.0 / (PIXELS_TILE * 2.0 ** zoom) * pixels
+    return graus_longitude * np.cos(np.radians(latitude)), graus_longitude
+
+
+def _coordenadas(df, latitude, longitude):
+    """Latitudes, longitudes e máscara das linhas com as duas coordenadas."""
+    lat = pd.to_numeric(df[latitude], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    lon = pd.to_numeric(df[longitude], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    validos = ~(np.isnan(lat) | np.isnan(lon))
+    return lat[validos], lon[validos], validos
+
+
+def _celulas(lat, lon, zoom, pixels, grupos=None):
+    """Código (0..n-1) da célula de cada ponto; com `grupos`, de cada par célula x grupo."""
+    passo_lat, passo_lon = tamanho_celula(zoom, np.median(lat), pixels)
+    linhas = np.floor(lat / passo_lat).astype(np.int64)
+    colunas = np.floor(lon / passo_lon).astype(np.int64)
+    chaves = (linhas - linhas.min()) * (colunas.max() - colunas.min() + 1) + (colunas - colunas.min())
+    if grupos is not None:
+        chaves = chaves * (grupos.max() + 1) + grupos
+    _, celulas = np.unique(chaves, return_inverse=True)
+    return celulas.ravel()
+
+
+def agrupar_em_grade(df, zoom, categoria=None, latitude="latitude", longitude="longitude"):
+    """Um registro por célula da grade com pontos: centro (média das coordenadas) e contagem.
+
+    Com `categoria`, o registro traz também a categoria predominante na célula (coluna com o
+    mesmo nome) e `composicao`, o texto com a contagem de cada categoria presente (para o hover).
+    Pontos sem coordenadas são ignorados.
+    """
+    lat, lon, validos = _coordenadas(df, latitude, longitude)
+    colunas = [latitude, longitude, "contagem"] + ([categoria, "composicao"] if categoria else [])
+    if not len(lat):
+        return pd.DataFrame(columns=colunas)
+
+    celulas = _celulas(lat, lon, zoom, PIXELS_CELULA)
+    contagem = np.bincount(celulas)
+    grade = pd.DataFrame({
+        latitude: np.bincount(celulas, weights=lat) / contagem,
+        longitude: np.bincount(celulas, weights=lon) / contagem,
+        "contagem": contagem,
+    })
+
+    if categoria:
+        grupos, nomes = pd.factorize(df[categoria].to_numpy()[validos])
+        nomes = np.append(np.asarray(nomes, dtype=object), "Sem informação")
+        grupos = np.where(grupos < 0, len(nomes) - 1, grupos)
+        # Matriz células x categorias com as contagens
+        por_categoria = np.bincount(celulas * len(nomes) + grupos, minlength=len(contagem) * len(nomes))
+        por_categoria = por_categoria.reshape(len(contagem), len(nomes))
+        grade[categoria] = nomes[por_categoria.argmax(axis=1)]
+        grade["composicao"] = [
+            "<br>".join(f"{nomes[i]}: {linha[i]}" for i in np.flatnonzero(linha))
+            for linha in por_categoria
+        ]
+    return grade[colunas]
+
+
+def raster(df, zoom, grupo=None, latitude="latitude", longitude="longitude"):
+    """Raster de densidade para os mapas de calor: uma linha por célula de PIXELS_RASTER com pontos.
+
+    Cada linha traz o centroide dos pontos da célula e a contagem (o peso `z` do
+    density_mapbox). Com `grupo`, as células são separadas por grupo (coluna `grupo` no
+    resultado) e linhas sem grupo são ignoradas. O tamanho do resultado depende da área
+    coberta pelos pontos, não da quantidade de pontos.
+    """
+    lat, lon, validos = _coordenadas(df, latitude, longitude)
+    colunas = [latitude, longitude, "contagem"] + ([grupo] if grupo else [])
+    grupos = None
+    if grupo:
+        grupos, nomes = pd.factorize(df[grupo].to_numpy()[validos])
+        lat, lon, grupos = lat[grupos >= 0], lon[grupos >= 0], grupos[grupos >= 0]
+    if not len(lat):
+        return pd.DataFrame(columns=colunas)
+
+    celulas = _celulas(lat, lon, zoom, PIXELS_RASTER, grupos)
+    contagem = np.bincount(celulas)
+    resultado = pd.DataFrame({
+        latitude: np.bincount(celulas, weights=lat) / contagem,
+        longitude: np.bincount(celulas, weights=lon) / contagem,
+        "contagem": contagem,
+    })
+    if grupo:
+        # Grupo de cada célula (todos os pontos de uma célula têm o mesmo grupo)
+        representantes = np.zeros(len(contagem), dtype=np.int64)
+        representantes[celulas] = grupos
+        resultado[grupo] = np.asarray(nomes, dtype=object)[representantes]
+    return resultado[colunas]
+
+
+def centro(grade, latitude="latitude", longitude="longitude"):
+    """Centro do mapa: média das coordenadas das células ponderada pela contagem."""
+    return dict(
+        lat=np.average(grade[latitude], weights=grade["contagem"]),
+        lon=np.average(grade[longitude], weights=grade["contagem"]),
+    )
+
+
+# --- Consultas por área e por raio ---
+
+def distancia_metros(lat1, lon1, lat2, lon2):
+    """Distância haversine em metros (vetorizada; aceita escalares e arrays com broadcasting)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(valor, dtype=np.float64)) for valor in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distancias_em_blocos(lat1, lon1, lat2, lon2, bloco=BLOCO_DISTANCIAS):
+    """Distâncias haversine (metros) entre os pares (lat1[i], lon1[i]) e (lat2[i], lon2[i]).
+
+    Calculadas em blocos vetorizados de `bloco` pares: o custo é o de algumas operações NumPy
+    por bloco, e a memória temporária não cresce com o volume. NaN quando falta coordenada.
+    """
+    lat1, lon1, lat2, lon2 = (np.asarray(valor, dtype=np.float64) for valor in (lat1, lon1, lat2, lon2))
+    distancias = np.empty(len(lat1))
+    for inicio in range(0, len(lat1), bloco):
+        fatia = slice(inicio, inicio + bloco)
+        distancias[fatia] = distancia_metros(lat1[fatia], lon1[fatia], lat2[fatia], lon2[fatia])
+    return distancias
+
+
+def resumir_distancias(df, grupo, coluna="distancia_metros"):
+    """Distribuição das distâncias por grupo: n, média e percentis 25, 50, 75 e 90 (metros).
+
+    Linhas sem distância ou sem grupo são ignoradas; grupos ordenados pela mediana.
+    """
+    grupos = df[coluna].groupby(df[grupo], observed=True)
+    resumo = grupos.quantile([0.25, 0.5, 0.75, 0.9]).unstack()
+    resumo.columns = ["p25", "mediana", "p75", "p90"]
+    resumo.insert(0, "media", grupos.mean())
+    resumo.insert(0, "n", grupos.count())
+    return resumo[resumo["n"] > 0].sort_values("mediana").reset_index()
+
+
+class IndiceEspacial:
+    """Índice em grade das coordenadas de um DataFrame, para consultas por área e por raio.
+
+    Os pontos ficam ordenados pela célula (lado de `lado_metros`) em que caem; uma consulta
+    visita só as células que tocam a área pedida (busca binária por linha da grade) e confere
+    as coordenadas apenas dos pontos dessas células. As consultas devolvem posições de linhas
+    do DataFrame, como o IndiceFiltros.
+    """
+
+    def __init__(self, df, lado_metros=LADO_CELULA_INDICE, latitude="latitude", longitude="longitude"):
+        lat, lon, validos = _coordenadas(df, latitude, longitude)
+        self.n = len(lat)
+        # Retângulo que contém todos os pontos (lat_min, lat_max, lon_min, lon_max)
+        self.limites = (lat.min(), lat.max(), lon.min(), lon.max()) if self.n else None
+        self.lado_lat = np.degrees(lado_metros / RAIO_TERRA)
+        self.lado_lon = self.lado_lat / np.cos(np.radians(np.median(lat) if self.n else 0.0))
+
+        linhas = np.floor(lat / self.lado_lat).astype(np.int64)
+        colunas = np.floor(lon / self.lado_lon).astype(np.int64)
+        self._origem = (linhas.min(), colunas.min()) if self.n else (0, 0)
+        self._dimensoes = (np.ptp(linhas) + 1, np.ptp(colunas) + 1) if self.n else (0, 0)
+        chaves = (linhas - self._origem[0]) * self._dimensoes[1] + (colunas - self._origem[1])
+
+        ordem = np.argsort(chaves, kind="stable")
+        self._chaves = chaves[ordem]
+        self._posicoes = np.flatnonzero(validos)[ordem]
+        self._lat = lat[ordem]
+        self._lon = lon[ordem]
+
+    def __len__(self):
+        return self.n
+
+    def _candidatos(self, lat_min, lat_max, lon_min, lon_max):
+        """Índices internos dos pontos das células que tocam o retângulo."""
+        linha_ini = max(int(np.floor(lat_min / self.lado_lat)) - self._origem[0], 0)
+        linha_fim = min(int(np.floor(lat_max / self.lado_lat)) - self._origem[0], self._dimensoes[0] - 1)
+        coluna_ini = max(int(np.floor(lon_min / self.lado_lon)) - self._origem[1], 0)
+        coluna_fim = min(int(np.floor(lon_max / self.lado_lon)) - self._origem[1], self._dimensoes[1] - 1)
+        if linha_ini > linha_fim or coluna_ini > coluna_fim:
+            return np.empty(0, dtype=np.int64)
+
+        # Em cada linha da grade as células do intervalo de colunas são contíguas na ordem
+        linhas = np.arange(linha_ini, linha_fim + 1) * self._dimensoes[1]
+        inicios = np.searchsorted(self._chaves, linhas + coluna_ini, side="left")
+        fins = np.searchsorted(self._chaves, linhas + coluna_fim, side="right")
+        return np.concatenate([np.arange(inicio, fim) for inicio, fim in zip(inicios, fins)])
+
+    def na_area(self, lat_min, lat_max, lon_min, lon_max):
+        """Posições (em ordem) das linhas com coordenadas dentro do retângulo (inclusivo)."""
+        candidatos = self._candidatos(lat_min, lat_max, lon_min, lon_max)
+        lat, lon = self._lat[candidatos], self._lon[candidatos]
+        dentro = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return np.sort(self._posicoes[candidatos[dentro]])
+
+    def no_raio(self, lat, lon, raio_metros):
+        """Posições (em ordem) das linhas a até `raio_metros` do ponto (lat, lon)."""
+        delta_lat = np.degrees(raio_metros / RAIO_TERRA)
+        delta_lon = delta_lat / max(np.cos(np.radians(lat)), 1e-6)
+        candidatos = self._candidatos(lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon)
+        distancias = distancia_metros(lat, lon, self._lat[candidatos], self._lon[candidatos])
+        return np.sort(self._posicoes[candidatos[distancias <= raio_metros]])
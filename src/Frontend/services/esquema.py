@@ -0,0 +1,89 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Esquema compacto aplicado a todas as bases carregadas: textos de baixa cardinalidade viram
+# categóricos (códigos inteiros + dicionário) e inteiros são reduzidos ao menor tipo que os
+# comporta. Os valores monetários e as coordenadas continuam float64 para não perder
+# precisão nas somas em reais nem nas posições dos mapas.
+
+COLUNAS_CATEGORICAS = [
+    # Capturas (CFO)
+    "tipo_cupom", "tipo_loja", "local_captura", "nome_loja", "endereco_loja", "dia_semana",
+    # Usuários (CEO) e bases demográficas
+    "local", "tipo_celular", "modelo_celular", "ultimo_tipo_cupom", "ultimo_tipo_loja",
+    "possui_app_picmoney", "sexo", "cidade_residencial", "bairro_residencial",
+    "cidade_trabalho", "bairro_trabalho", "cidade_escola", "bairro_escola",
+    "nome_campanha", "categoria_frequentada",
+    # Parcerias
+    "origem",
+]
+
+
+def aplicar(df):
+    """Converte as colunas do esquema para categórico e reduz os inteiros (altera o df).
+
+    As colunas declaradas viram categóricas sempre, qualquer que seja o tamanho do lote, para
+    que lotes incrementais pequenos tenham os mesmos tipos da base já carregada.
+    """
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype("category")
+
+    for coluna in df.select_dtypes(include="integer").columns:
+        df[coluna] = pd.to_numeric(df[coluna], downcast="integer")
+    return df
+
+
+def concatenar(frames):
+    """Concatena DataFrames mantendo categórica toda coluna que é categórica em algum deles.
+
+    O pd.concat converte para object as categóricas com dicionários diferentes (ou misturadas
+    com texto); aqui as demais partes viram categóricas e os dicionários são unidos antes.
+    """
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+
+    frames = [df.copy(deep=False) for df in frames]
+    for coluna in frames[0].columns:
+        if not any(
+            coluna in df.columns and isinstance(df[coluna].dtype, pd.CategoricalDtype) for df in frames
+        ):
+            continue
+        for df in frames:
+            if coluna in df.columns and not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+                df[coluna] = df[coluna].astype("category")
+        categorias = union_categoricals([df[coluna] for df in frames if coluna in df.columns]).categories
+        for df in frames:
+            if coluna in df.columns:
+                df[coluna] = df[coluna].cat.set_categories(categorias)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _memoria_original(serie):
+    """Estima a memória da coluna no tipo lido do CSV (texto como object, inteiros como int64)."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie.astype(object).memory_usage(deep=True, index=False)
+    if pd.api.types.is_integer_dtype(serie):
+        return len(serie) * 8
+    return serie.memory_usage(deep=True, index=False)
+
+
+def relatorio_memoria(bases):
+    """Tabela com a memória de cada base antes e depois do esquema compacto (em MB)."""
+    linhas = []
+    for nome, df in bases.items():
+        if df.empty:
+            continue
+        antes = sum(_memoria_original(df[coluna]) for coluna in df.columns)
+        depois = df.memory_usage(deep=True, index=False).sum()
+        linhas.append({
+            "Base": nome,
+            "Linhas": len(df),
+            "Antes (MB)": antes / 1024 ** 2,
+            "Depois (MB)": depois / 1024 ** 2,
+            "Redução": 1 - depois / antes if antes else 0.0,
+        })
+    return pd.DataFrame(linhas)
@@ -0,0 +1,111 @@
+import datetime
+import hashlib
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from filtros import Visao
+
+# Cache das figuras dos gráficos: a chave é (gráfico, versão dos dados, assinatura dos filtros
+# que afetam o gráfico) e o valor é o go.Figure já construído e validado. Numa interação que
+# não muda os filtros de um gráfico, ele não é reagregado nem reconstruído; o st.plotly_chart
+# ainda converte a figura (to_dict + JSON) a cada exibição, esse custo não é evitado.
+
+# Quantidade máxima de figuras guardadas (as usadas há mais tempo são descartadas)
+MAX_FIGURAS = 256
+
+
+class CacheFiguras:
+    """Cache LRU de figuras, compartilhado entre as sessões (as figuras não são alteradas após guardadas)."""
+
+    def __init__(self, capacidade=MAX_FIGURAS):
+        self.capacidade = capacidade
+        self._figuras = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave):
+        with self._trava:
+            figura = self._figuras.get(chave)
+            if figura is not None:
+                self._figuras.move_to_end(chave)
+            return figura
+
+    def guardar(self, chave, figura):
+        with self._trava:
+            self._figuras[chave] = figura
+            self._figuras.move_to_end(chave)
+            while len(self._figuras) > self.capacidade:
+                self._figuras.popitem(last=False)
+
+
+@st.cache_resource
+def _cache():
+    return CacheFiguras()
+
+
+def _normalizar(valor):
+    """Forma canônica de um valor de filtro (seleções múltiplas sem ordem, datas em ISO)."""
+    if isinstance(valor, dict):
+        return sorted((str(chave), _normalizar(item)) for chave, item in valor.items())
+    if isinstance(valor, (list, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+        # Seleções de multiselect: a ordem em que o usuário marcou os valores não importa
+        return sorted((_normalizar(item) for item in valor), key=repr)
+    if isinstance(valor, tuple):
+        # Intervalos (início, fim): a ordem importa
+        return [_normalizar(item) for item in valor]
+    if isinstance(valor, (pd.Timestamp, datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+def assinatura(filtros):
+    """Assinatura canônica dos filtros: combinações equivalentes geram a mesma assinatura."""
+    texto = json.dumps(_normalizar(filtros or {}), default=str)
+    return hashlib.sha1(texto.encode()).hexdigest()[:16]
+
+
+def _colunas_do_grafico(construir, argumentos):
+    """Colunas declaradas para o gráfico no seu módulo (None = todas) mais as passadas como argumento."""
+    declaradas = getattr(sys.modules.get(construir.__module__), "COLUNAS_GRAFICOS", {}).get(construir.__name__)
+    if declaradas is None:
+        return None
+    return list(declaradas) + [arg for arg in argumentos if isinstance(arg, str)]
+
+
+def _materializar(arg, colunas):
+    return arg.linhas(colunas) if isinstance(arg, Visao) else arg
+
+
+def exibir(id_grafico, versao, filtros, construir, *args, **kwargs):
+    """Exibe o gráfico `construir(*args, **kwargs)` reaproveitando a figura em cache.
+
+    `versao` identifica os dados e `filtros` deve conter todos os filtros que afetam os
+    DataFrames/visões passados ao gráfico; os demais argumentos (colunas, títulos) entram na
+    chave junto com `id_grafico`.
+
+    Visões (filtros.Visao) só são materializadas quando a figura não está em cache, e apenas
+    com as colunas que o gráfico usa (COLUNAS_GRAFICOS do módulo do gráfico, mais as colunas
+    passadas como argumento, ex.: group_col).
+    """
+    parametros = (
+        tuple(arg for arg in args if not isinstance(arg, (pd.DataFrame, Visao))),
+        {nome: arg for nome, arg in kwargs.items() if not isinstance(arg, (pd.DataFrame, Visao))},
+    )
+    chave = (id_grafico, str(versao), assinatura(filtros), assinatura(parametros))
+    figura = _cache().obter(chave)
+    if figura is None:
+        colunas = _colunas_do_grafico(construir, list(args) + list(kwargs.values()))
+        args = [_materializar(arg, colunas) for arg in args]
+        kwargs = {nome: _materializar(arg, colunas) for nome, arg in kwargs.items()}
+        figura = construir(*args, **kwargs)
+        _cache().guardar(chave, figura)
+    # Um go.Figure é passado como está: o st.plotly_chart não o revalida (um dict seria
+    # reconstruído atributo a atributo) e só lê a figura, então ela pode ser compartilhada
+    st.plotly_chart(figura, use_container_width=True)
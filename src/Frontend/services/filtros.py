@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+# Índice dos filtros da barra lateral: calculado uma vez por versão dos dados, transforma cada
+# combinação de filtros em interseções de bitmaps e devolve as posições das linhas
+# selecionadas, sem varrer as colunas nem copiar o DataFrame a cada interação. As posições
+# circulam pelas páginas como uma Visao, materializada só com as colunas de cada uso.
+
+# Acima desta quantidade de valores distintos a coluna guarda a lista de linhas de cada valor
+# (memória proporcional às linhas) em vez de um bitmap por valor (proporcional a linhas x valores)
+LIMITE_BITMAPS = 64
+
+
+class IndiceFiltros:
+    """Índice pré-calculado de um DataFrame para filtros por valor e por intervalo.
+
+    - `colunas_valores` (multiselects): um bitmap compactado (np.packbits) por valor, ou as
+      posições ordenadas das linhas de cada valor nas colunas com muitos valores distintos;
+    - `colunas_intervalo` (datas, idade): valores ordenados com a posição original de cada um,
+      para resolver intervalos com busca binária.
+    """
+
+    def __init__(self, df, colunas_valores=(), colunas_intervalo=()):
+        self.n = len(df)
+        self._bitmaps = {}
+        self._listas = {}
+        self._ordenadas = {}
+        for coluna in colunas_valores:
+            if coluna in df.columns:
+                self._indexar_valores(coluna, df[coluna])
+        for coluna in colunas_intervalo:
+            if coluna in df.columns:
+                self._indexar_intervalo(coluna, df[coluna])
+
+    def _indexar_valores(self, coluna, serie):
+        codigos, valores = pd.factorize(serie)  # valores ausentes ficam com código -1
+        if len(valores) <= LIMITE_BITMAPS:
+            self._bitmaps[coluna] = {
+                valor: np.packbits(codigos == codigo) for codigo, valor in enumerate(valores)
+            }
+            return
+
+        ordem = np.argsort(codigos, kind="stable")
+        limites = np.searchsorted(codigos[ordem], np.arange(len(valores) + 1))
+        self._listas[coluna] = {
+            valor: ordem[limites[codigo]:limites[codigo + 1]] for codigo, valor in enumerate(valores)
+        }
+
+    def _indexar_intervalo(self, coluna, serie):
+        valores = serie.to_numpy()
+        posicoes = np.flatnonzero(~pd.isna(valores))
+        ordem = posicoes[np.argsort(valores[posicoes], kind="stable")]
+        self._ordenadas[coluna] = (valores[ordem], ordem)
+
+    def _bitmap_de_linhas(self, linhas):
+        mascara = np.zeros(self.n, dtype=bool)
+        mascara[linhas] = True
+        return np.packbits(mascara)
+
+    def _bitmap_valores(self, coluna, aceitos):
+        if coluna in self._bitmaps:
+            bitmaps = [self._bitmaps[coluna][valor] for valor in aceitos if valor in self._bitmaps[coluna]]
+            if not bitmaps:
+                return np.zeros((self.n + 7) // 8, dtype=np.uint8)
+            return np.bitwise_or.reduce(bitmaps)
+
+        listas = [self._listas[coluna][valor] for valor in aceitos if valor in self._listas[coluna]]
+        return self._bitmap_de_linhas(np.concatenate(listas) if listas else [])
+
+    def _bitmap_intervalo(self, coluna, inicio, fim):
+        valores, ordem = self._ordenadas[coluna]
+        a = 0 if inicio is None else np.searchsorted(valores, _escalar(inicio, valores.dtype), "left")
+        b = len(valores) if fim is None else np.searchsorted(valores, _escalar(fim, valores.dtype), "right")
+        return self._bitmap_de_linhas(ordem[a:b])
+
+    def selecionar(self, valores=None, intervalos=None):
+        """Posições (em ordem) das linhas que atendem a todos os filtros.
+
+        `valores`: {coluna: valores aceitos} (None = sem filtro na coluna);
+        `intervalos`: {coluna: (início, fim)} inclusivos (None em um dos lados = aberto).
+        Retorna None quando nenhum filtro foi aplicado (todas as linhas).
+        """
+        bitmaps = [
+            self._bitmap_valores(coluna, aceitos)
+            for coluna, aceitos in (valores or {}).items() if aceitos is not None
+        ] + [
+            self._bitmap_intervalo(coluna, inicio, fim)
+            for coluna, (inicio, fim) in (intervalos or {}).items()
+        ]
+        if not bitmaps:
+            return None
+        return np.flatnonzero(np.unpackbits(np.bitwise_and.reduce(bitmaps), count=self.n))
+
+
+def _escalar(limite, dtype):
+    """Converte o limite do filtro para o tipo da coluna ordenada (ex.: date -> datetime64)."""
+    if np.issubdtype(dtype, np.datetime64):
+        return np.datetime64(pd.Timestamp(limite)).astype(dtype)
+    return limite
+
+
+def intersectar(*selecoes):
+    """Interseção de seleções de linhas (posições em ordem; None = todas as linhas)."""
+    resultado = None
+    for selecao in selecoes:
+        if selecao is not None:
+            resultado = selecao if resultado is None else np.intersect1d(resultado, selecao, assume_unique=True)
+    return resultado
+
+
+class Visao:
+    """Linhas selecionadas de um DataFrame sem copiá-lo: guarda só as posições (None = todas).
+
+    As páginas passam a visão adiante e cada consumidor extrai apenas as colunas de que
+    precisa, somente das linhas selecionadas (`coluna`, `linhas`).
+    """
+
+    def __init__(self, df, selecao=None):
+        self.df = df
+        self.selecao = selecao
+
+    def __len__(self):
+        return len(self.df) if self.selecao is None else len(self.selecao)
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    @property
+    def columns(self):
+        return self.df.columns
+
+    def coluna(self, nome):
+        """Uma coluna, só nas linhas selecionadas."""
+        serie = self.df[nome]
+        return serie if self.selecao is None else serie.iloc[self.selecao]
+
+    def linhas(self, colunas=None):
+        """DataFrame das linhas selecionadas, projetado em `colunas` (as ausentes são ignoradas).
+
+        Sem seleção e sem projeção devolve o próprio DataFrame (nenhuma cópia).
+        """
+        if colunas is None:
+            return self.df if self.selecao is None else self.df.iloc[self.selecao]
+        posicoes = [self.df.columns.get_loc(coluna) for coluna in dict.fromkeys(colunas) if coluna in self.df.columns]
+        return self.df.iloc[slice(None) if self.selecao is None else self.selecao, posicoes]
+
+    def refinar(self, mascara):
+        """Sub-visão com as linhas selecionadas em que `mascara` (alinhada à seleção) é verdadeira."""
+        mascara = np.asarray(mascara, dtype=bool)
+        return Visao(self.df, np.flatnonzero(mascara) if self.selecao is None else self.selecao[mascara])
+
+    def primeiras(self, n):
+        """Sub-visão com as `n` primeiras linhas selecionadas."""
+        return Visao(self.df, np.arange(min(n, len(self.df))) if self.selecao is None else self.selecao[:n])
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+# Motor dos indicadores (KPIs) a partir das linhas: recebe a seleção de linhas dos filtros e
+# calcula todos os indicadores da faixa de KPIs de uma vez (somas, contagens e médias das
+# medidas em uma única matriz, usuários distintos e período coberto), sem copiar o DataFrame
+# nem percorrer a tabela uma vez por indicador.
+
+
+def _coluna(df, nome, selecao, **opcoes):
+    valores = df[nome].to_numpy(**opcoes)
+    return valores if selecao is None else valores[selecao]
+
+
+def calcular(df, selecao=None, medidas=(), coluna_usuario=None, coluna_data=None):
+    """Indicadores das linhas selecionadas (`selecao` = posições; None = todas as linhas).
+
+    Retorna um dicionário com:
+      - n: quantidade de linhas;
+      - {medida}_soma, {medida}_n e {medida}_media para cada medida presente no df;
+      - usuarios, n_por_usuario e {medida}_por_usuario, quando `coluna_usuario` existe;
+      - data_min, data_max e dias (quantidade de dias do período), quando `coluna_data` existe.
+    Colunas ausentes são ignoradas (os indicadores correspondentes não aparecem).
+    """
+    n = len(df) if selecao is None else len(selecao)
+    resultado = {"n": n}
+
+    medidas = [medida for medida in medidas if medida in df.columns]
+    if medidas:
+        matriz = np.column_stack([
+            _coluna(df, medida, selecao, dtype=np.float64, na_value=np.nan) for medida in medidas
+        ]) if n else np.empty((0, len(medidas)))
+        validos = ~np.isnan(matriz)
+        somas = np.where(validos, matriz, 0.0).sum(axis=0)
+        contagens = validos.sum(axis=0)
+        for medida, soma, contagem in zip(medidas, somas, contagens):
+            resultado[f"{medida}_soma"] = soma
+            resultado[f"{medida}_n"] = int(contagem)
+            resultado[f"{medida}_media"] = soma / contagem if contagem else np.nan
+
+    if coluna_usuario in df.columns:
+        distintos = pd.unique(_coluna(df, coluna_usuario, selecao))
+        usuarios = int((~pd.isna(distintos)).sum())
+        resultado["usuarios"] = usuarios
+        resultado["n_por_usuario"] = n / usuarios if usuarios else np.nan
+        for medida in medidas:
+            resultado[f"{medida}_por_usuario"] = resultado[f"{medida}_soma"] / usuarios if usuarios else np.nan
+
+    if coluna_data in df.columns:
+        datas = _coluna(df, coluna_data, selecao)
+        datas = datas[~pd.isna(datas)]
+        if len(datas):
+            resultado["data_min"], resultado["data_max"] = pd.Timestamp(datas.min()), pd.Timestamp(datas.max())
+            resultado["dias"] = (resultado["data_max"] - resultado["data_min"]).days + 1
+        else:
+            resultado["data_min"] = resultado["data_max"] = pd.NaT
+            resultado["dias"] = 0
+
+    return resultado
+
+
+# --- Formatação (padrão brasileiro) ---
+
+def formatar_moeda(valor):
+    """R$ 1.234,56"""
+    return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def formatar_numero(valor, casas=0):
+    """1.234 ou 1.234,56"""
+    return f"{valor:,.{casas}f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def formatar_variacao(delta):
+    """Variação percentual (12,34%); None quando não há base de comparação."""
+    return None if delta is None else f"{formatar_numero(delta, 2)}%"
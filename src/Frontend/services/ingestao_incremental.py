@@ -0,0 +1,264 @@
+import glob
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+
+import pandas as pd
+
+import cache_colunar
+import esquema
+import ingestao_streaming
+
+# Ingestão incremental: observa os arquivos de capturas em data/ e, a cada verificação,
+# lê apenas as linhas acrescentadas no fim dos arquivos já conhecidos e os arquivos novos.
+# O delta é tratado, guardado como mais um pedaço em memória, somado aos agregados e gravado
+# como uma nova parte no cache em disco (data/.cache/<nome>/), que sobrevive a reinícios. Os
+# pedaços só são concatenados quando o DataFrame completo é lido (uma vez por versão), de modo
+# que a verificação custa O(delta) e não O(histórico).
+
+# Intervalo mínimo entre duas verificações da pasta (em segundos)
+INTERVALO_VERIFICACAO = 30
+
+# Bytes antes do ponto já lido usados para confirmar que o arquivo só recebeu linhas no fim
+BYTES_ASSINATURA = 4096
+
+# Quantidade de partes no disco a partir da qual elas são compactadas em uma só
+MAX_PARTES = 32
+
+
+class IngestorIncremental:
+    """Mantém um DataFrame atualizado com as linhas novas dos arquivos que casam com `padrao`.
+
+    `tratar` recebe o DataFrame bruto de um delta e devolve o DataFrame tratado.
+    Mudanças em `dependencias` (ex.: a base demográfica usada no merge), arquivos reescritos,
+    truncados ou removidos provocam uma recarga completa.
+    """
+
+    def __init__(self, nome, padrao, tratar, dependencias=(), opcoes_csv=None):
+        self.nome = nome
+        self.padrao = padrao
+        self.tratar = tratar
+        self.dependencias = list(dependencias)
+        self.opcoes_csv = opcoes_csv or {}
+        self.pasta = os.path.join(cache_colunar.PASTA_CACHE, nome)
+        # Reentrante: a leitura de `df` (que consolida os pedaços) também ocorre dentro de instantaneo()
+        self._trava = threading.RLock()
+        self._ultima_verificacao = None
+        self._dependencias_carregadas = None
+        self._reiniciar()
+        self._restaurar()
+
+    # --- Estado ---
+
+    def _reiniciar(self):
+        self._pedacos = []
+        self.agregados = {}
+        self.arquivos = {}
+        self.partes = []
+        self.versao = self._calcular_versao()
+
+    def _calcular_versao(self):
+        """Identificador do conteúdo atual (muda a cada lote novo e quando as dependências mudam)."""
+        estado = [self.arquivos, self._dependencias_carregadas]
+        return hashlib.sha1(json.dumps(estado, sort_keys=True).encode()).hexdigest()[:16]
+
+    def _impressao_dependencias(self):
+        return cache_colunar.impressao_digital(self.dependencias)
+
+    def _caminho_estado(self):
+        return os.path.join(self.pasta, "estado.json")
+
+    def _restaurar(self):
+        """Recarrega as partes gravadas em disco por execuções anteriores."""
+        try:
+            with open(self._caminho_estado(), encoding="utf-8") as arquivo:
+                estado = json.load(arquivo)
+            if estado.get("dependencias") != self._impressao_dependencias():
+                return
+            partes = [cache_colunar.ler_arrow(os.path.join(self.pasta, parte)) for parte in estado["partes"]]
+        except Exception:
+            # Sem estado salvo, parte corrompida ou de outra versão do pyarrow: recomeça do zero
+            return
+
+        self.arquivos = estado["arquivos"]
+        self.partes = estado["partes"]
+        self._pedacos = [df for df in partes if not df.empty]
+        self.agregados = ingestao_streaming.agregar_linhas(self.df) if not self.df.empty else {}
+        self._dependencias_carregadas = estado["dependencias"]
+        self.versao = self._calcular_versao()
+
+    def _persistir(self, delta):
+        """Grava o delta como nova parte (ou compacta tudo) e atualiza o estado em disco."""
+        if cache_colunar.pa is None:
+            return
+        try:
+            if len(self.partes) >= MAX_PARTES:
+                for parte in self.partes:
+                    os.remove(os.path.join(self.pasta, parte))
+                self.partes = []
+                delta = self.df
+
+            parte = f"parte-{time.time_ns()}.arrow"
+            cache_colunar.gravar_arrow(delta.reset_index(drop=True), os.path.join(self.pasta, parte))
+            self.partes.append(parte)
+
+            estado = {
+                "dependencias": self._impressao_dependencias(),
+                "arquivos": self.arquivos,
+                "partes": self.partes,
+            }
+            temporario = self._caminho_estado() + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(estado, arquivo)
+            os.replace(temporario, self._caminho_estado())
+        except Exception:
+            # Falha ao gravar não impede o uso dos dados em memória
+            pass
+
+    def _limpar_disco(self):
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    # --- Leitura dos deltas ---
+
+    def _assinatura(self, caminho, fim):
+        """Hash dos bytes imediatamente anteriores à posição `fim` do arquivo."""
+        with open(caminho, "rb") as arquivo:
+            inicio = max(fim - BYTES_ASSINATURA, 0)
+            arquivo.seek(inicio)
+            return hashlib.blake2b(arquivo.read(fim - inicio), digest_size=16).hexdigest()
+
+    def _ler_delta(self, caminho, estado):
+        """Lê as linhas completas a partir da última posição lida do arquivo."""
+        with open(caminho, "rb") as arquivo:
+            if estado is None:
+                cabecalho = arquivo.readline()
+                inicio = arquivo.tell()
+            else:
+                cabecalho = estado["cabecalho"].encode("latin-1")
+                inicio = estado["posicao"]
+                arquivo.seek(inicio)
+            conteudo = arquivo.read()
+
+        # Uma última linha sem quebra pode estar sendo escrita: fica para a próxima verificação
+        conteudo = conteudo[: conteudo.rfind(b"\n") + 1]
+        posicao = inicio + len(conteudo)
+        novo_estado = {
+            "cabecalho": cabecalho.decode("latin-1"),
+            "posicao": posicao,
+            "tamanho": os.path.getsize(caminho),
+            "mtime_ns": os.stat(caminho).st_mtime_ns,
+            "assinatura": self._assinatura(caminho, posicao),
+        }
+        if not conteudo:
+            return None, novo_estado
+        return pd.read_csv(io.BytesIO(cabecalho + conteudo), **self.opcoes_csv), novo_estado
+
+    def _situacao(self, caminho, estado):
+        """Classifica o arquivo em 'novo', 'inalterado', 'acrescido' ou 'reescrito'."""
+        if estado is None:
+            return "novo"
+        info = os.stat(caminho)
+        if info.st_size == estado["tamanho"] and info.st_mtime_ns == estado["mtime_ns"]:
+            return "inalterado"
+        if info.st_size < estado["posicao"]:
+            return "reescrito"
+        if self._assinatura(caminho, estado["posicao"]) != estado["assinatura"]:
+            return "reescrito"
+        return "acrescido"
+
+    # --- API ---
+
+    @property
+    def df(self):
+        """DataFrame com todas as linhas; os pedaços anexados são concatenados na primeira leitura."""
+        with self._trava:
+            if len(self._pedacos) > 1:
+                self._pedacos = [esquema.concatenar(self._pedacos)]
+            return self._pedacos[0] if self._pedacos else pd.DataFrame()
+
+    def instantaneo(self):
+        """DataFrame, agregados e versão lidos juntos (consistentes mesmo com outra sessão atualizando)."""
+        with self._trava:
+            return self.df, self.agregados, self.versao
+
+    def atualizar(self, forcar=False):
+        """Incorpora as linhas novas; retorna True se o DataFrame mudou.
+
+        Sem `forcar`, a pasta é verificada no máximo uma vez a cada INTERVALO_VERIFICACAO segundos.
+        """
+        with self._trava:
+            agora = time.monotonic()
+            if (
+                not forcar
+                and self._ultima_verificacao is not None
+                and agora - self._ultima_verificacao < INTERVALO_VERIFICACAO
+            ):
+                return False
+            self._ultima_verificacao = agora
+
+            caminhos = sorted(glob.glob(self.padrao))
+            recarregar = bool(set(self.arquivos) - set(caminhos)) or (
+                self._dependencias_carregadas is not None
+                and self._impressao_dependencias() != self._dependencias_carregadas
+            )
+
+            deltas = []
+            arquivos = dict(self.arquivos)
+            for caminho in caminhos:
+                situacao = self._situacao(caminho, arquivos.get(caminho))
+                if situacao == "reescrito":
+                    recarregar = True
+                    break
+                if situacao == "inalterado":
+                    continue
+                delta, arquivos[caminho] = self._ler_delta(caminho, arquivos.get(caminho))
+                if delta is not None:
+                    deltas.append(delta)
+
+            if recarregar:
+                self._reiniciar()
+                self._limpar_disco()
+                return self._recarregar_tudo(caminhos)
+
+            if arquivos == self.arquivos:
+                return False
+            return self._incorporar(deltas, arquivos)
+
+    def _recarregar_tudo(self, caminhos):
+        arquivos = {}
+        deltas = []
+        for caminho in caminhos:
+            delta, arquivos[caminho] = self._ler_delta(caminho, None)
+            if delta is not None:
+                deltas.append(delta)
+        if not self._incorporar(deltas, arquivos):
+            # Nenhuma linha após a recarga: os dados em memória foram descartados, a versão muda
+            self.versao = self._calcular_versao()
+        return True
+
+    def _incorporar(self, deltas, arquivos):
+        """Trata os deltas, anexa ao DataFrame e soma aos agregados; retorna True se havia linhas.
+
+        Sem nenhuma linha completa nova (ex.: só o início de uma linha no fim do arquivo) apenas
+        as posições lidas são registradas: a versão e as partes em disco não mudam.
+        """
+        self._dependencias_carregadas = self._impressao_dependencias()
+        novos = [self.tratar(delta) for delta in deltas]
+        novos = [delta for delta in novos if not delta.empty]
+
+        self.arquivos = arquivos
+        if not novos:
+            return False
+
+        delta = esquema.concatenar(novos)
+        self._pedacos.append(delta)
+        self.agregados = ingestao_streaming.combinar_agregados(
+            self.agregados, ingestao_streaming.agregar_linhas(delta)
+        )
+        self.versao = self._calcular_versao()
+        self._persistir(delta)
+        return True
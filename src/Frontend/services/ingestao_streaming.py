@@ -0,0 +1,133 @@
+import pandas as pd
+
+import cubo
+import esquema
+
+# Ingestão em blocos para exportações de capturas maiores que a memória disponível.
+# Cada bloco do CSV é tratado e dobrado nos agregados que as páginas usam; as linhas
+# individuais só são mantidas se pedido explicitamente.
+
+TAMANHO_BLOCO = 200_000
+
+MEDIDAS = ["valor_compra", "valor_cupom", "valor_liquido"]
+
+# Como combinar os agregados parciais de cada bloco
+AGREGACAO_SOMA = {**{medida: "sum" for medida in MEDIDAS}, "n": "sum"}
+AGREGACAO_USUARIO = {**AGREGACAO_SOMA, "primeira_captura": "min", "ultima_captura": "max"}
+
+# Agregados mantidos pelas ingestões em blocos e incremental: nome -> (chaves, agregação)
+AGREGADOS = {
+    "diario": (["data_captura"], AGREGACAO_SOMA),
+    "segmentos": (["tipo_loja", "tipo_cupom"], AGREGACAO_SOMA),
+    "usuarios": (["chave_celular"], AGREGACAO_USUARIO),
+    "cubo": (cubo.DIMENSOES, cubo.AGREGACAO),
+}
+
+
+class _Acumulador:
+    """Acumula agregados parciais e os compacta quando crescem mais que o resultado atual."""
+
+    def __init__(self, chaves, agregacao):
+        self.chaves = chaves
+        self.agregacao = agregacao
+        self.resultado = None
+        self.parciais = []
+        self.linhas_pendentes = 0
+
+    def adicionar(self, parcial):
+        self.parciais.append(parcial)
+        self.linhas_pendentes += len(parcial)
+        tamanho_atual = 0 if self.resultado is None else len(self.resultado)
+        if self.linhas_pendentes > max(tamanho_atual, TAMANHO_BLOCO):
+            self._compactar()
+
+    def _compactar(self):
+        partes = self.parciais if self.resultado is None else [self.resultado] + self.parciais
+        self.resultado = pd.concat(partes).groupby(level=self.chaves, observed=True, dropna=False).agg(self.agregacao)
+        self.parciais = []
+        self.linhas_pendentes = 0
+
+    def finalizar(self):
+        if self.parciais:
+            self._compactar()
+        if self.resultado is None:
+            return pd.DataFrame(columns=self.chaves + list(self.agregacao))
+        return self.resultado.reset_index()
+
+
+def _agregar_bloco(bloco, nome):
+    """Agrega um bloco já tratado no agregado `nome` (indexado pelas chaves)."""
+    chaves, agregacao = AGREGADOS[nome]
+    if nome == "cubo":
+        return cubo.construir(bloco)
+
+    colunas = {medida: (medida, "sum") for medida in MEDIDAS}
+    colunas["n"] = (MEDIDAS[0], "size")
+    if "primeira_captura" in agregacao:
+        colunas["primeira_captura"] = ("data_captura", "min")
+        colunas["ultima_captura"] = ("data_captura", "max")
+    return bloco.groupby(chaves, observed=True).agg(**colunas)
+
+
+def _colunas_necessarias(nome):
+    chaves, _ = AGREGADOS[nome]
+    return set(chaves) | set(cubo.MEDIDAS if nome == "cubo" else MEDIDAS)
+
+
+def agregar_linhas(df):
+    """Calcula os agregados diário, por segmento, por usuário e o cubo de um DataFrame já tratado."""
+    agregados = {}
+    for nome in AGREGADOS:
+        if _colunas_necessarias(nome).issubset(df.columns):
+            agregados[nome] = _agregar_bloco(df, nome).reset_index()
+    return agregados
+
+
+def combinar_agregados(atuais, novos):
+    """Soma os agregados de linhas novas aos agregados já existentes."""
+    combinados = dict(atuais)
+    for nome, novo in novos.items():
+        chaves, agregacao = AGREGADOS[nome]
+        if nome not in atuais or atuais[nome].empty:
+            combinados[nome] = novo
+            continue
+        combinados[nome] = (
+            esquema.concatenar([atuais[nome], novo])
+            .groupby(chaves, observed=True, dropna=False)
+            .agg(agregacao)
+            .reset_index()
+        )
+    return combinados
+
+
+def agregar_csv_em_blocos(caminho, tratar, tamanho_bloco=TAMANHO_BLOCO, manter_linhas=False, **opcoes_csv):
+    """Lê um CSV de capturas (formato Analise-CFO.csv) em blocos e calcula os agregados.
+
+    `tratar` recebe cada bloco bruto e devolve o bloco tipado (mesmo tratamento do loader
+    completo). Retorna um dicionário com:
+      - "diario": totais por data_captura
+      - "segmentos": totais por tipo_loja x tipo_cupom
+      - "usuarios": totais, quantidade e primeira/última captura por chave_celular
+      - "cubo": cubo diário por tipo de loja x tipo de cupom (ver cubo.py)
+      - "linhas": DataFrame com todas as linhas tratadas (apenas se manter_linhas=True)
+    """
+    acumuladores = {
+        nome: _Acumulador(chaves, agregacao) for nome, (chaves, agregacao) in AGREGADOS.items()
+    }
+    linhas = []
+
+    for bloco in pd.read_csv(caminho, chunksize=tamanho_bloco, **opcoes_csv):
+        bloco = tratar(bloco)
+        if bloco.empty:
+            continue
+
+        for nome, acumulador in acumuladores.items():
+            if _colunas_necessarias(nome).issubset(bloco.columns):
+                acumulador.adicionar(_agregar_bloco(bloco, nome))
+
+        if manter_linhas:
+            linhas.append(bloco)
+
+    resultado = {nome: acumulador.finalizar() for nome, acumulador in acumuladores.items()}
+    resultado["linhas"] = pd.concat(linhas, ignore_index=True) if manter_linhas and linhas else None
+    return resultado
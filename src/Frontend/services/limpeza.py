@@ -0,0 +1,202 @@
+import numpy as np
+import pandas as pd
+
+# Rotinas vetorizadas de limpeza das colunas brutas dos CSVs.
+# Os textos são convertidos em uma matriz de códigos Unicode (linhas x caracteres) e
+# processados coluna de caracteres por coluna de caracteres com NumPy, sem laço por linha.
+
+# Quantidade de linhas processadas por vez (limita a memória temporária da matriz de códigos)
+TAMANHO_BLOCO = 1_000_000
+
+# Dígitos acima deste limite não cabem em int64 e já estão abaixo da precisão do float
+MAX_DIGITOS = 18
+
+_ZERO, _NOVE, _MENOS = ord("0"), ord("9"), ord("-")
+_VIRGULA, _PONTO = ord(","), ord(".")
+_IGNORADOS = np.array([0, ord(" "), ord("\t"), ord("R"), ord("$")], dtype=np.uint8)
+
+# Chave usada para celulares vazios ou sem dígitos suficientes para um número válido
+CELULAR_AUSENTE = -1
+
+
+def _codigos(valores):
+    """Converte um array de textos em uma matriz (caracteres x linhas) de códigos ASCII.
+
+    A matriz é transposta para que cada posição de caractere fique contígua na memória;
+    caracteres fora do ASCII viram 0, que não é dígito nem separador.
+    """
+    texto = np.asarray(valores, dtype=str)
+    codigos = texto.view(np.uint32).reshape(len(texto), texto.dtype.itemsize // 4)
+    return np.ascontiguousarray(np.where(codigos < 128, codigos, 0).astype(np.uint8).T)
+
+
+def _blocos(serie):
+    """Percorre a série em blocos de TAMANHO_BLOCO linhas."""
+    valores = serie.to_numpy(dtype=object)
+    for inicio in range(0, len(valores), TAMANHO_BLOCO):
+        yield inicio, valores[inicio:inicio + TAMANHO_BLOCO]
+
+
+def _coordenadas_bloco(valores):
+    """Aplica a correção de coordenadas a um bloco de valores."""
+    codigos = _codigos(valores)
+    n = codigos.shape[1]
+
+    mantissa = np.zeros(n, dtype=np.int64)
+    num_digitos = np.zeros(n, dtype=np.int64)
+    num_menos = np.zeros(n, dtype=np.int64)
+    menos_antes_dos_digitos = np.zeros(n, dtype=bool)
+
+    for c in codigos:
+        digito = (c >= _ZERO) & (c <= _NOVE)
+        menos = c == _MENOS
+
+        menos_antes_dos_digitos |= menos & (num_digitos == 0)
+        num_menos += menos
+
+        acumula = digito & (num_digitos < MAX_DIGITOS)
+        mantissa *= np.where(acumula, 10, 1)
+        mantissa += acumula * (c - _ZERO)
+        num_digitos += digito
+
+    # Latitude/longitude brasileiras têm dois dígitos antes da vírgula: -235674304 -> -23.5674304
+    casas = np.clip(np.minimum(num_digitos, MAX_DIGITOS) - 2, 0, None)
+    resultado = -(mantissa / np.power(10.0, casas))
+
+    # Um "-" só é aceito se for único e vier antes dos dígitos (como no float() original)
+    invalido = (num_digitos == 0) | (num_menos > 1) | ((num_menos == 1) & ~menos_antes_dos_digitos)
+    resultado[invalido] = np.nan
+    return resultado
+
+
+def normalizar_coordenadas(serie):
+    """Corrige uma coluna inteira de latitudes/longitudes exportadas com separadores de milhar.
+
+    Mantém apenas os dígitos e posiciona a vírgula após os dois primeiros, sempre com sinal
+    negativo (ex.: -23.563.850.985.754.000 -> -23.563850985754 e -4.665.004.147 -> -46.65004147).
+    Valores sem dígitos viram NaN.
+    """
+    resultado = np.empty(len(serie), dtype=np.float64)
+    for inicio, bloco in _blocos(serie):
+        resultado[inicio:inicio + len(bloco)] = _coordenadas_bloco(bloco)
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+
+def _moeda_bloco(valores):
+    """Converte um bloco de textos monetários; devolve (valores, rejeitado)."""
+    codigos = _codigos(valores)
+    n = codigos.shape[1]
+
+    mantissa = np.zeros(n, dtype=np.int64)
+    num_digitos = np.zeros(n, dtype=np.int64)
+    num_virgulas = np.zeros(n, dtype=np.int64)
+    num_pontos = np.zeros(n, dtype=np.int64)
+    num_menos = np.zeros(n, dtype=np.int64)
+    digitos_apos_virgula = np.zeros(n, dtype=np.int64)
+    digitos_apos_ponto = np.zeros(n, dtype=np.int64)
+    ponto_apos_virgula = np.zeros(n, dtype=bool)
+    menos_depois_dos_digitos = np.zeros(n, dtype=bool)
+    caractere_invalido = np.zeros(n, dtype=bool)
+
+    for c in codigos:
+        digito = (c >= _ZERO) & (c <= _NOVE)
+        virgula = c == _VIRGULA
+        ponto = c == _PONTO
+        menos = c == _MENOS
+
+        acumula = digito & (num_digitos < MAX_DIGITOS)
+        mantissa *= np.where(acumula, 10, 1)
+        mantissa += acumula * (c - _ZERO)
+        num_digitos += digito
+
+        digitos_apos_virgula = np.where(virgula, 0, digitos_apos_virgula + digito)
+        digitos_apos_ponto = np.where(ponto, 0, digitos_apos_ponto + digito)
+        ponto_apos_virgula |= ponto & (num_virgulas > 0)
+        num_virgulas += virgula
+        num_pontos += ponto
+
+        menos_depois_dos_digitos |= menos & (num_digitos > 0)
+        num_menos += menos
+
+        # Espaços, "R$" e caracteres fora do ASCII (ex.: espaço não separável) são ignorados
+        caractere_invalido |= ~(digito | virgula | ponto | menos | np.isin(c, _IGNORADOS))
+
+    # Com vírgula, ela é a casa decimal e os pontos são milhar (1.234,56).
+    # Sem vírgula, o último ponto só é decimal se não for seguido de exatamente 3 dígitos
+    # (834.43 -> 834,43; 1.234 -> 1234), o que aceita também exportações com ponto decimal.
+    casas = np.where(
+        num_virgulas > 0,
+        digitos_apos_virgula,
+        np.where((num_pontos > 0) & (digitos_apos_ponto != 3), digitos_apos_ponto, 0),
+    )
+    resultado = mantissa / np.power(10.0, casas)
+    resultado[num_menos == 1] *= -1
+
+    vazio = num_digitos == 0
+    rejeitado = (
+        caractere_invalido
+        | (num_virgulas > 1)
+        | ponto_apos_virgula
+        | (num_menos > 1)
+        | menos_depois_dos_digitos
+        | (num_digitos > MAX_DIGITOS)
+        | (vazio & (num_virgulas + num_pontos + num_menos > 0))
+    )
+    resultado[vazio | rejeitado] = np.nan
+    return resultado, rejeitado & ~pd.isna(valores)
+
+
+def converter_moeda_br(serie):
+    """Converte uma coluna monetária para float em uma única passada.
+
+    Aceita o formato brasileiro (R$ 1.234,56) e também valores com ponto decimal (834.43).
+    Colunas que o pandas já leu como número são mantidas.
+
+    Retorna a série convertida e uma série com os textos originais das linhas rejeitadas
+    (que ficam como NaN na série convertida).
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float), serie.iloc[:0]
+
+    resultado = np.empty(len(serie), dtype=np.float64)
+    rejeitado = np.zeros(len(serie), dtype=bool)
+    for inicio, bloco in _blocos(serie):
+        fim = inicio + len(bloco)
+        resultado[inicio:fim], rejeitado[inicio:fim] = _moeda_bloco(bloco)
+
+    return pd.Series(resultado, index=serie.index, name=serie.name), serie[rejeitado]
+
+
+def _celular_bloco(valores):
+    """Converte um bloco de celulares em chaves inteiras (apenas os dígitos)."""
+    codigos = _codigos(valores)
+    n = codigos.shape[1]
+
+    chave = np.zeros(n, dtype=np.int64)
+    num_digitos = np.zeros(n, dtype=np.int64)
+
+    for c in codigos:
+        digito = (c >= _ZERO) & (c <= _NOVE)
+        acumula = digito & (num_digitos < MAX_DIGITOS)
+        chave *= np.where(acumula, 10, 1)
+        chave += acumula * (c - _ZERO)
+        num_digitos += digito
+
+    chave[(num_digitos == 0) | (num_digitos > MAX_DIGITOS)] = CELULAR_AUSENTE
+    return chave
+
+
+def codificar_celular(serie):
+    """Converte os números de celular em chaves int64 formadas pelos seus dígitos.
+
+    "(11) 91409-5506" e "11914095506" viram a mesma chave 11914095506; valores vazios ou
+    com mais de MAX_DIGITOS dígitos viram CELULAR_AUSENTE. As junções entre bases usam
+    esta chave em vez do texto.
+    """
+    if pd.api.types.is_integer_dtype(serie):
+        return serie.astype(np.int64)
+
+    resultado = np.empty(len(serie), dtype=np.int64)
+    for inicio, bloco in _blocos(serie.fillna("")):
+        resultado[inicio:inicio + len(bloco)] = _celular_bloco(bloco)
+    return pd.Series(resultado, index=serie.index, name=serie.name)
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+# Resumos calculados no servidor para os gráficos: em vez de enviar uma linha por usuário para o
+# navegador (px.histogram serializa todos os valores e o Plotly agrupa no cliente), as faixas
+# são contadas aqui com NumPy e o gráfico recebe uma barra por faixa. O mesmo vale para os box
+# plots (quartis por grupo) e para as séries temporais longas (redução por LTTB).
+
+# Larguras "redondas" de faixa (x 10^k), como as escolhidas pelo Plotly
+LARGURAS = (1, 2, 5, 10)
+
+
+def bordas_histograma(valores, nbins=None):
+    """Bordas das faixas do histograma dos `valores` (sem NaN).
+
+    A largura é a menor largura redonda que cobre os valores em até `nbins` faixas (por padrão,
+    a regra de Sturges). Para valores inteiros as bordas ficam nos meios (17,5; 18,5; ...), de
+    modo que cada inteiro cai inteiro dentro de uma faixa.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    if not len(valores):
+        return np.array([0.0, 1.0])
+    nbins = nbins or int(np.ceil(np.log2(len(valores)))) + 1
+    minimo, maximo = valores.min(), valores.max()
+
+    bruta = (maximo - minimo) / nbins or 1.0
+    base = 10.0 ** np.floor(np.log10(bruta))
+    largura = next(multiplo * base for multiplo in LARGURAS if multiplo * base >= bruta)
+
+    inicio = np.floor(minimo / largura) * largura
+    if largura >= 1 and np.array_equal(valores, np.round(valores)):
+        inicio -= 0.5
+    quantidade = int(np.floor((maximo - inicio) / largura)) + 1
+    return inicio + largura * np.arange(quantidade + 1)
+
+
+def _rotulos(bordas):
+    """Rótulo de cada faixa: '10-19' para faixas de inteiros, '0-5' para as demais."""
+    inicio, fim = bordas[:-1], bordas[1:]
+    if bordas[1] - bordas[0] >= 1 and bordas[0] % 1 == 0.5:
+        inicio, fim = inicio + 0.5, fim - 0.5
+    return [f"{a:g}" if a == b else f"{a:g}-{b:g}" for a, b in zip(inicio, fim)]
+
+
+def histograma(df, coluna, nbins=None, cor=None):
+    """Contagem das linhas de `df` por faixa de `coluna` (e por grupo de `cor`, se informada).
+
+    Retorna um DataFrame com uma linha por faixa (x grupo): inicio, fim, centro, faixa (rótulo),
+    a coluna `cor` quando informada e contagem. Valores ausentes em `coluna` ou `cor` são
+    ignorados, como no px.histogram. Todas as faixas compartilham as mesmas bordas.
+    """
+    valores = pd.to_numeric(df[coluna], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    validos = ~np.isnan(valores)
+    if cor is not None:
+        grupos, nomes = pd.factorize(df[cor])
+        validos &= grupos >= 0
+    valores = valores[validos]
+
+    bordas = bordas_histograma(valores, nbins)
+    faixas = len(bordas) - 1
+    posicoes = np.clip(np.searchsorted(bordas, valores, side="right") - 1, 0, faixas - 1)
+
+    resumo = pd.DataFrame({"inicio": bordas[:-1], "fim": bordas[1:], "faixa": _rotulos(bordas)})
+    if cor is None:
+        resumo["contagem"] = np.bincount(posicoes, minlength=faixas)
+    else:
+        contagens = np.bincount(grupos[validos] * faixas + posicoes, minlength=len(nomes) * faixas)
+        resumo = pd.concat([resumo] * len(nomes), ignore_index=True)
+        resumo.insert(3, cor, np.repeat(np.asarray(nomes), faixas))
+        resumo["contagem"] = contagens
+    resumo.insert(2, "centro", (resumo["inicio"] + resumo["fim"]) / 2)
+    return resumo
+
+
+# --- Séries temporais ---
+
+# Máximo de pontos por linha enviados nas séries temporais (acima disso, redução por LTTB)
+MAX_PONTOS_SERIE = 500
+
+
+def lttb(x, y, limite=MAX_PONTOS_SERIE):
+    """Posições dos pontos mantidos pelo Largest-Triangle-Three-Buckets (x em ordem crescente).
+
+    Divide a série em `limite` - 2 faixas e, em cada uma, fica com o ponto que forma o maior
+    triângulo com o ponto escolhido na faixa anterior e a média da faixa seguinte: picos e
+    vales são preservados. O primeiro e o último ponto são sempre mantidos; séries com até
+    `limite` pontos ficam inteiras.
+    """
+    n = len(x)
+    if n <= limite or limite < 3:
+        return np.arange(n)
+    x = np.asarray(x).astype(np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+
+    bordas = np.linspace(1, n - 1, limite - 1).astype(np.int64)
+    bordas = np.append(bordas, n)
+    escolhidos = np.empty(limite, dtype=np.int64)
+    escolhidos[0], escolhidos[-1] = 0, n - 1
+    anterior = 0
+    for faixa in range(limite - 2):
+        inicio, fim, fim_seguinte = bordas[faixa], bordas[faixa + 1], bordas[faixa + 2]
+        media_x, media_y = x[fim:fim_seguinte].mean(), y[fim:fim_seguinte].mean()
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fim] - y[anterior])
+            - (x[anterior] - x[inicio:fim]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        escolhidos[faixa + 1] = anterior
+    return escolhidos
+
+
+def mascara_lttb(x, y, grupos=None, limite=MAX_PONTOS_SERIE):
+    """Máscara dos pontos mantidos por `lttb`, linha a linha quando há `grupos` (uma por grupo).
+
+    Mantém a ordem original das linhas; dentro de cada grupo os pontos devem estar em ordem de x.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    manter = np.zeros(len(x), dtype=bool)
+    codigos = np.zeros(len(x), dtype=np.int64) if grupos is None else pd.factorize(grupos)[0]
+    for codigo in np.unique(codigos):
+        posicoes = np.flatnonzero(codigos == codigo)
+        manter[posicoes[lttb(x[posicoes], y[posicoes], limite)]] = True
+    return manter
+
+
+# --- Box plots ---
+
+# Máximo de pontos atípicos enviados por grupo (amostra espalhada do menor ao maior)
+MAX_ATIPICOS = 50
+
+
+def _amostra_espalhada(valores, maximo):
+    """Até `maximo` valores ordenados, do menor ao maior, igualmente espaçados na ordem."""
+    valores = np.sort(valores)
+    if len(valores) > maximo:
+        valores = valores[np.linspace(0, len(valores) - 1, maximo).round().astype(int)]
+    return valores
+
+
+def caixas(df, grupo, valor, max_atipicos=MAX_ATIPICOS):
+    """Resumo de box plot de `valor` por `grupo` (grupos na ordem em que aparecem).
+
+    Retorna um DataFrame com uma linha por grupo: o grupo, n, q1, mediana, q3, inferior e
+    superior (bigodes: valores extremos dentro de 1,5 x IQR dos quartis) e atipicos (amostra de
+    até `max_atipicos` valores fora dos bigodes). Quartis, bigodes e atípicos são exatos.
+    Valores ou grupos ausentes são ignorados.
+    """
+    valores = pd.to_numeric(df[valor], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    grupos, nomes = pd.factorize(df[grupo])
+    validos = ~np.isnan(valores) & (grupos >= 0)
+    valores, grupos = valores[validos], grupos[validos]
+
+    # Valores ordenados por grupo e fatiados (uma ordenação para todos os grupos)
+    ordem = np.argsort(grupos, kind="stable")
+    tamanhos = np.bincount(grupos, minlength=len(nomes))
+    fatias = np.split(valores[ordem], np.cumsum(tamanhos)[:-1])
+
+    linhas = []
+    for nome, amostra in zip(np.asarray(nomes), fatias):
+        if not len(amostra):
+            continue
+        q1, mediana, q3 = np.quantile(amostra, [0.25, 0.5, 0.75])
+        amplitude = 1.5 * (q3 - q1)
+        dentro = (amostra >= q1 - amplitude) & (amostra <= q3 + amplitude)
+        linhas.append({
+            grupo: nome,
+            "n": len(amostra),
+            "q1": q1,
+            "mediana": mediana,
+            "q3": q3,
+            "inferior": amostra[dentro].min() if dentro.any() else q1,
+            "superior": amostra[dentro].max() if dentro.any() else q3,
+            "atipicos": _amostra_espalhada(amostra[~dentro], max_atipicos),
+        })
+    return pd.DataFrame(linhas, columns=[grupo, "n", "q1", "mediana", "q3", "inferior", "superior", "atipicos"])